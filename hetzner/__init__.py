@@ -1,3 +1,34 @@
+import importlib
+
+# Classes which are available directly from the package, but whose modules
+# are only imported on first access, so that importing the exceptions below
+# doesn't pull in the whole API along with its dependencies.
+_LAZY_ATTRIBUTES = {
+    'Robot': 'hetzner.robot',
+    'RobotConnection': 'hetzner.robot',
+    'RobotWebInterface': 'hetzner.robot',
+    'RobotWebInterfacePool': 'hetzner.robot',
+    'Server': 'hetzner.server',
+    'ReverseDNS': 'hetzner.rdns',
+    'Failover': 'hetzner.failover',
+    'FailoverController': 'hetzner.failover',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError("module {0!r} has no attribute {1!r}"
+                             .format(__name__, name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_ATTRIBUTES.keys()))
+
+
 class RobotError(Exception):
     def __init__(self, message, status=None):
         if status is not None:
@@ -6,6 +37,48 @@ class RobotError(Exception):
         self.status = status
 
 
+class RateLimitError(RobotError):
+    """
+    Raised if the rate limit of a Robot API endpoint has been exceeded.
+    'max_request' and 'interval' hold the number of requests allowed within
+    'interval' seconds if the Robot told us about it.
+    """
+    def __init__(self, message, status=None, max_request=None,
+                 interval=None):
+        super(RateLimitError, self).__init__(message, status)
+        self.max_request = max_request
+        self.interval = interval
+
+    @property
+    def retry_after(self):
+        """
+        A rough estimate in seconds of how long to wait before retrying.
+        """
+        if self.max_request and self.interval:
+            return float(self.interval) / self.max_request
+        return 60.0
+
+
+class DeadlineExceeded(RobotError):
+    """
+    Raised if a request to the Robot couldn't be completed within its
+    deadline or timeout.
+    """
+
+
+class CircuitOpen(RobotError):
+    """
+    Raised without sending a request if the circuit breaker named
+    'breaker' is open because the endpoint has been failing, see
+    hetzner.util.circuit. 'retry_after' is the number of seconds until the
+    next attempt is allowed.
+    """
+    def __init__(self, message, breaker=None, retry_after=None):
+        super(CircuitOpen, self).__init__(message)
+        self.breaker = breaker
+        self.retry_after = retry_after
+
+
 class ManualReboot(Exception):
     pass
 
@@ -0,0 +1,141 @@
+__all__ = ['BOOT_CONFIGS', 'BootConfig', 'BootManager']
+
+# Boot configurations supported by BootManager, see
+# https://robot.your-server.de/doc/webservice/en.html#boot-configuration
+BOOT_CONFIGS = ('rescue', 'linux', 'vnc')
+
+
+class BootConfig(object):
+    """
+    A single boot configuration (one of BOOT_CONFIGS) of a server, which
+    once activated is used on the next boot of the server.
+    """
+    def __init__(self, server, name, result=None):
+        self.server = server
+        self.conn = server.conn
+        self.name = name
+        self._data = None
+        if result is not None:
+            self.update_info(result)
+
+    @property
+    def path(self):
+        return '/boot/{0}/{1}'.format(self.server.number, self.name)
+
+    def update_info(self, result=None):
+        """
+        Update the status of the boot configuration either by sending a new
+        GET request or by using the response given by 'result'.
+        """
+        if result is None:
+            result = self.conn.get(self.path)
+        self._data = result[self.name]
+
+    @property
+    def data(self):
+        """
+        The raw data of the boot configuration as returned by the Robot.
+        """
+        if self._data is None:
+            self.update_info()
+        return self._data
+
+    @property
+    def active(self):
+        return self.data['active']
+
+    @property
+    def password(self):
+        """
+        The root password of the configuration, which is only available
+        after activation.
+        """
+        return self.data.get('password')
+
+    def choices(self, option):
+        """
+        Return the values which are available for 'option' (for example
+        'dist', 'lang' or 'os') while the configuration is inactive.
+        """
+        value = self.data.get(option)
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    def activate(self, authorized_keys=None, **options):
+        """
+        Activate the configuration using the given options, for example
+        dist='Debian 12 base' and lang='en' for 'linux' and 'vnc' or
+        os='linux' for 'rescue'. 'authorized_keys' is a list of fingerprints
+        of keys which have been added to the Robot already.
+
+        Returns the root password.
+        """
+        if authorized_keys is not None:
+            options['authorized_key'] = list(authorized_keys)
+        self.update_info(self.conn.post(self.path, options))
+        return self.password
+
+    def deactivate(self):
+        """
+        Deactivate the configuration if it is active.
+        """
+        if self.active:
+            self.update_info(self.conn.request('delete', self.path))
+
+    def __repr__(self):
+        if self._data is None:
+            return "<BootConfig {0} of #{1}>".format(self.name,
+                                                     self.server.number)
+        return "<BootConfig {0} of #{1} ({2})>".format(
+            self.name, self.server.number,
+            "active" if self.active else "inactive"
+        )
+
+
+class BootManager(object):
+    """
+    The boot configurations of a server, available as attributes named
+    after the configuration (for example 'linux') or by subscription.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.conn = server.conn
+        for name in BOOT_CONFIGS:
+            setattr(self, name, BootConfig(server, name))
+
+    def __getitem__(self, name):
+        if name not in BOOT_CONFIGS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self):
+        return iter([self[name] for name in BOOT_CONFIGS])
+
+    def update_info(self, result=None):
+        """
+        Update the status of all boot configurations with a single request
+        or by using the response given by 'result'.
+        """
+        if result is None:
+            result = self.conn.get('/boot/{0}'.format(self.server.number))
+        for name in BOOT_CONFIGS:
+            data = result['boot'].get(name)
+            # Servers with several IP addresses get a list of rescue
+            # configurations, one per address, which are all the same.
+            if isinstance(data, list):
+                data = data[0] if len(data) > 0 else None
+            if data is not None:
+                self[name].update_info({name: data})
+
+    @property
+    def active(self):
+        """
+        The active boot configuration or None if there is none.
+        """
+        if any(config._data is None for config in self):
+            self.update_info()
+        for config in self:
+            if config._data is not None and config.active:
+                return config
+        return None
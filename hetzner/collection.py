@@ -0,0 +1,108 @@
+from hetzner import RobotError
+from hetzner.util import addr
+
+__all__ = ['RESOURCES', 'AddressMap', 'fetch', 'fetch_all', 'item_key',
+           'iter_collection']
+
+# Collection endpoints of the Robot API, each mapping to the path of the
+# collection, the key wrapping every item and the field identifying it.
+RESOURCES = {
+    'server': ('/server', 'server', 'server_ip'),
+    'ip': ('/ip', 'ip', 'ip'),
+    'subnet': ('/subnet', 'subnet', 'ip'),
+    'rdns': ('/rdns', 'rdns', 'ip'),
+    'failover': ('/failover', 'failover', 'ip'),
+    'reset': ('/reset', 'reset', 'server_ip'),
+}
+
+
+def item_key(resource, item):
+    """
+    Return the identifying value of a raw 'item' of the given 'resource'.
+
+    >>> item_key('failover', {'failover': {'ip': '1.2.3.4'}})
+    '1.2.3.4'
+    """
+    _, wrapper, field = RESOURCES[resource]
+    return item[wrapper][field]
+
+
+def iter_collection(conn, resource):
+    """
+    Yield the raw items of the collection 'resource' (see RESOURCES) with a
+    single request while they're being received. Collections which are
+    empty, which the Robot signals with a 404, yield nothing.
+    """
+    path = RESOURCES[resource][0]
+    try:
+        for item in conn.get_iter(path):
+            yield item
+    except RobotError as err:
+        if err.status != 404:
+            raise
+
+
+def fetch(conn, resource):
+    """
+    Return a list of all raw items of the collection 'resource'.
+    """
+    return list(iter_collection(conn, resource))
+
+
+def fetch_all(conn, resources=None, jobs=None):
+    """
+    Fetch the given collections (all of RESOURCES by default) concurrently,
+    one request per collection. Returns a tuple of a dictionary mapping the
+    resource names to the lists of raw items and a dictionary mapping the
+    names of the resources which couldn't be fetched to the exception.
+    """
+    from hetzner.util.parallel import run_parallel
+
+    if resources is None:
+        resources = sorted(RESOURCES.keys())
+    if jobs is None:
+        jobs = len(resources)
+
+    results = {}
+    errors = {}
+    for result in run_parallel(lambda r: fetch(conn, r), resources, jobs):
+        if result.error is None:
+            results[result.item] = result.value
+        else:
+            errors[result.item] = result.error
+    return results, errors
+
+
+class AddressMap(object):
+    """
+    Find the main IP of the server an IP address belongs to, given the raw
+    items of the 'ip' and 'subnet' collections.
+
+    >>> amap = AddressMap(
+    ...     [{'ip': {'ip': '1.0.0.1', 'server_ip': '1.0.0.1'}}],
+    ...     [{'subnet': {'ip': '2a01:4f8::', 'mask': 64,
+    ...                  'server_ip': '1.0.0.1'}}],
+    ... )
+    >>> amap.server_ip('2a01:4f8::2'), amap.server_ip('1.0.0.2')
+    ('1.0.0.1', None)
+    """
+    def __init__(self, ips, subnets):
+        self.ips = dict((item['ip']['ip'], item['ip']['server_ip'])
+                        for item in ips)
+        self.ranges = []
+        for item in subnets:
+            subnet = item['subnet']
+            is_ipv6, net = addr.parse_ipaddr(subnet['ip'])
+            getrange = addr.get_ipv6_range if is_ipv6 \
+                else addr.get_ipv4_range
+            self.ranges.append((is_ipv6, getrange(net, int(subnet['mask'])),
+                                subnet['server_ip']))
+
+    def server_ip(self, ip):
+        if ip in self.ips:
+            return self.ips[ip]
+        is_ipv6, numeric = addr.parse_ipaddr(ip)
+        for v6, (start, end), server_ip in self.ranges:
+            if is_ipv6 == v6 and start <= numeric <= end:
+                return server_ip
+        return None
@@ -0,0 +1,306 @@
+import time
+import calendar
+import logging
+import threading
+
+from datetime import datetime
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from hetzner.collection import RESOURCES, fetch_all, item_key
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['MetricsPoller', 'MetricsServer', 'format_sample', 'render']
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# The collections needed for the metrics.
+COLLECTIONS = ['failover', 'ip', 'server', 'subnet']
+
+# Units of the traffic warning thresholds of IP addresses and subnets as
+# given by the Robot, converted into bytes.
+TRAFFIC_UNITS = {
+    'traffic_hourly': ('hourly', 1024 ** 2),
+    'traffic_daily': ('daily', 1024 ** 2),
+    'traffic_monthly': ('monthly', 1024 ** 3),
+}
+
+
+def _escape(value):
+    return (u"{0}".format(value).replace('\\', '\\\\')
+            .replace('"', '\\"').replace('\n', '\\n'))
+
+
+def format_sample(name, labels, value):
+    """
+    Format a single sample in the Prometheus text exposition format.
+
+    >>> format_sample('up', {'ip': '1.2.3.4', 'name': 'a "b"'}, 1)
+    'up{ip="1.2.3.4",name="a \\\\"b\\\\""} 1'
+    >>> format_sample('ratio', {}, 0.5)
+    'ratio 0.5'
+    """
+    if isinstance(value, bool):
+        value = int(value)
+    if len(labels) == 0:
+        return "{0} {1}".format(name, value)
+    pairs = ','.join(u'{0}="{1}"'.format(key, _escape(labels[key]))
+                     for key in sorted(labels))
+    return u"{0}{{{1}}} {2}".format(name, pairs, value)
+
+
+def render(metrics):
+    """
+    Render a list of metrics, each being a tuple of name, type, help text
+    and a list of (labels, value) samples, into the Prometheus text format.
+    Metrics without samples are omitted.
+    """
+    lines = []
+    for name, mtype, helptext, samples in metrics:
+        if len(samples) == 0:
+            continue
+        lines.append(u"# HELP {0} {1}".format(name, helptext))
+        lines.append(u"# TYPE {0} {1}".format(name, mtype))
+        for labels, value in samples:
+            lines.append(format_sample(name, labels, value))
+    return u"\n".join(lines) + u"\n"
+
+
+def _timestamp(date):
+    return calendar.timegm(datetime.strptime(date, '%Y-%m-%d').timetuple())
+
+
+class MetricsPoller(object):
+    """
+    Fetch the state of the account using the RobotConnection 'conn' every
+    'interval' seconds with one request per collection and keep the rendered
+    metrics, so that serving them doesn't cause any requests to the Robot.
+
+    If 'reset_interval' is set, the operating status of every server is
+    fetched as well at that interval, which needs one request per server
+    using up to 'jobs' concurrent requests.
+    """
+    def __init__(self, conn, interval=60, reset_interval=None, jobs=4):
+        self.conn = conn
+        self.interval = interval
+        self.reset_interval = reset_interval
+        self.jobs = jobs
+        self.logger = logging.getLogger("Metrics poller")
+
+        self.items = {}
+        self.operating_status = {}
+        self.last_success = {}
+        self.errors = dict((resource, 0) for resource in COLLECTIONS)
+        self.durations = {}
+        self._last_reset_poll = None
+        self._output = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def poll_collections(self):
+        started = time.time()
+        results, errors = fetch_all(self.conn, COLLECTIONS)
+        duration = time.time() - started
+        for resource in COLLECTIONS:
+            self.durations[resource] = duration
+            if resource in errors:
+                self.errors[resource] += 1
+                self.logger.error("Unable to fetch %s: %s", resource,
+                                  errors[resource])
+                continue
+            wrapper = RESOURCES[resource][1]
+            self.items[resource] = dict(
+                (item_key(resource, item), item[wrapper])
+                for item in results[resource]
+            )
+            self.last_success[resource] = time.time()
+
+    def poll_operating_status(self):
+        def fetch(number):
+            data = self.conn.get('/reset/{0}'.format(number))
+            return data['reset'].get('operating_status')
+
+        numbers = [server['server_number']
+                   for server in self.items.get('server', {}).values()]
+        status = {}
+        for result in run_parallel(fetch, numbers, self.jobs):
+            if result.error is None:
+                status[result.item] = result.value
+            else:
+                self.logger.error("Unable to fetch operating status of"
+                                  " server #%s: %s", result.item,
+                                  result.error)
+        self.operating_status = status
+        self._last_reset_poll = time.monotonic()
+
+    def poll(self):
+        """
+        Fetch the current state from the Robot and update the rendered
+        metrics.
+        """
+        self.poll_collections()
+        if self.reset_interval is not None and (
+            self._last_reset_poll is None or
+            time.monotonic() - self._last_reset_poll >= self.reset_interval
+        ):
+            self.poll_operating_status()
+        output = render(self.metrics()).encode('utf-8')
+        with self._lock:
+            self._output = output
+
+    def metrics(self):
+        """
+        Return the current state as a list of metrics suitable for render().
+        """
+        servers = self.items.get('server', {})
+        info, status, cancelled, paid_until, running = [], [], [], [], []
+        for ip in sorted(servers):
+            server = servers[ip]
+            labels = {'server_ip': ip}
+            info.append((dict(labels, server_number=server['server_number'],
+                              name=server['server_name'],
+                              product=server['product'],
+                              dc=server['dc']), 1))
+            status.append((dict(labels, status=server['status']), 1))
+            cancelled.append((labels, server['cancelled']))
+            if server.get('paid_until'):
+                paid_until.append((labels, _timestamp(server['paid_until'])))
+            opstatus = self.operating_status.get(server['server_number'])
+            if opstatus in ('running', 'shut off'):
+                running.append((labels, opstatus == 'running'))
+
+        failovers = self.items.get('failover', {})
+        failover_info, failover_home = [], []
+        for ip in sorted(failovers):
+            failover = failovers[ip]
+            failover_info.append(({'ip': ip,
+                                   'server_ip': failover['server_ip'],
+                                   'active_server_ip':
+                                   failover['active_server_ip'] or ''}, 1))
+            failover_home.append(({'ip': ip}, failover['active_server_ip'] ==
+                                  failover['server_ip']))
+
+        locked, warnings, thresholds = [], [], []
+        for resource in ('ip', 'subnet'):
+            addresses = self.items.get(resource, {})
+            for ip in sorted(addresses):
+                data = addresses[ip]
+                labels = {'ip': ip, 'server_ip': data['server_ip']}
+                if resource == 'subnet':
+                    labels['mask'] = data['mask']
+                locked.append((labels, data['locked']))
+                warnings.append((labels, data['traffic_warnings']))
+                for field, (period, unit) in sorted(TRAFFIC_UNITS.items()):
+                    if data.get(field) is not None:
+                        thresholds.append((dict(labels, period=period),
+                                           data[field] * unit))
+
+        last_success = [({'resource': resource}, self.last_success[resource])
+                        for resource in sorted(self.last_success)]
+        errors = [({'resource': resource}, self.errors[resource])
+                  for resource in sorted(self.errors)]
+        durations = [({'resource': resource}, self.durations[resource])
+                     for resource in sorted(self.durations)]
+
+        return [
+            ('hetzner_server_info', 'gauge',
+             "Static information about the server.", info),
+            ('hetzner_server_status', 'gauge',
+             "Status of the server, which is given by the label.", status),
+            ('hetzner_server_cancelled', 'gauge',
+             "Whether the server has been cancelled.", cancelled),
+            ('hetzner_server_paid_until_timestamp_seconds', 'gauge',
+             "Date until which the server has been paid.", paid_until),
+            ('hetzner_server_running', 'gauge',
+             "Whether the server is powered on.", running),
+            ('hetzner_failover_info', 'gauge',
+             "Failover IP address and the server it is routed to.",
+             failover_info),
+            ('hetzner_failover_routed_home', 'gauge',
+             "Whether the failover IP is routed to the server owning it.",
+             failover_home),
+            ('hetzner_ip_locked', 'gauge',
+             "Whether the IP address or subnet is locked.", locked),
+            ('hetzner_ip_traffic_warnings_enabled', 'gauge',
+             "Whether traffic warnings are enabled.", warnings),
+            ('hetzner_ip_traffic_warning_threshold_bytes', 'gauge',
+             "Traffic that triggers a warning within the period.",
+             thresholds),
+            ('hetzner_exporter_last_success_timestamp_seconds', 'gauge',
+             "Time of the last successful fetch of the resource.",
+             last_success),
+            ('hetzner_exporter_errors_total', 'counter',
+             "Number of failed fetches of the resource.", errors),
+            ('hetzner_exporter_fetch_duration_seconds', 'gauge',
+             "Duration of the last fetch of the resource.", durations),
+        ]
+
+    @property
+    def output(self):
+        """
+        The most recently rendered metrics or None if there was no poll yet.
+        """
+        with self._lock:
+            return self._output
+
+    def run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll()
+            except Exception:
+                self.logger.exception("Error while polling.")
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(0, self.interval - elapsed))
+
+    def start(self):
+        """
+        Poll in a background thread until stop() is called.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="poller")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        output = self.server.poller.output
+        if output is None:
+            self.send_error(503, "No data has been fetched yet")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def log_message(self, fmt, *args):
+        self.server.poller.logger.debug(fmt, *args)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server answering requests for /metrics with the output of the
+    MetricsPoller 'poller'.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, poller):
+        HTTPServer.__init__(self, address, MetricsHandler)
+        self.poller = poller
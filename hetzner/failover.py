@@ -1,6 +1,14 @@
-from hetzner import RobotError
+import time
+import logging
+import threading
 
-__all__ = ['Failover', 'FailoverManager']
+from concurrent.futures import ThreadPoolExecutor
+
+from hetzner import RobotError, RateLimitError
+from hetzner.util.health import HealthState, FlapDamper
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['Failover', 'FailoverController', 'FailoverManager']
 
 
 class Failover(object):
@@ -24,6 +32,10 @@ class FailoverManager(object):
         self.conn = conn
         self.servers = servers
 
+        self._cached_failovers = None
+        self._cached_server_ips = None
+        self._cache_time = None
+
     def list(self):
         failovers = {}
         try:
@@ -38,8 +50,25 @@ class FailoverManager(object):
             failovers[failover.ip] = failover
         return failovers
 
-    def set(self, ip, new_destination):
-        failovers = self.list()
+    def __iter__(self):
+        """
+        Yield all failover IPs while the list is still being received.
+        """
+        try:
+            for ip in self.conn.get_iter('/failover'):
+                yield Failover(ip.get('failover'))
+        except RobotError as err:
+            if err.status != 404:
+                raise
+
+    def server_ips(self):
+        """
+        Return the set of main IP addresses of all servers, which are the
+        valid failover destinations.
+        """
+        return set(s['server']['server_ip'] for s in self.conn.get('/server'))
+
+    def _validate(self, ip, new_destination, failovers, available_dests):
         if ip not in failovers.keys():
             raise RobotError(
                 "Invalid IP address '%s'. Failover IP addresses are %s"
@@ -49,12 +78,367 @@ class FailoverManager(object):
             raise RobotError(
                 "%s is already the active destination of failover IP %s"
                 % (new_destination, ip))
-        available_dests = [s.ip for s in list(self.servers)]
         if new_destination not in available_dests:
             raise RobotError(
                 "Invalid destination '%s'. "
                 "The destination is not in your server list: %s"
-                % (new_destination, available_dests))
+                % (new_destination, sorted(available_dests)))
+
+    def set(self, ip, new_destination):
+        self._validate(ip, new_destination, self.list(), self.server_ips())
         result = self.conn.post('/failover/%s'
                                 % ip, {'active_server_ip': new_destination})
         return Failover(result.get('failover'))
+
+    def get(self, ip):
+        """
+        Return the Failover for the failover IP 'ip' with a single request.
+        """
+        result = self.conn.get('/failover/%s' % ip)
+        return Failover(result.get('failover'))
+
+    def refresh_cache(self):
+        """
+        Fetch the failover IPs and the server IPs and keep them for validating
+        subsequent calls to switch(). Returns the failover IPs as returned by
+        list().
+        """
+        self._cached_failovers = self.list()
+        self._cached_server_ips = self.server_ips()
+        self._cache_time = time.time()
+        return self._cached_failovers
+
+    def warm(self):
+        """
+        Prepare for a fast switch() by filling the validation cache and making
+        sure the connection to the Robot is established.
+        """
+        self.refresh_cache()
+        self.conn.connect()
+
+    def switch(self, ip, new_destination, validate=True, max_age=None):
+        """
+        Route the failover IP 'ip' to 'new_destination' with as few round
+        trips as possible and return a tuple of the resulting Failover and the
+        number of seconds the switch request took.
+
+        If 'validate' is True, the request is checked against the cached
+        failover and server IPs (see warm()), which are only fetched if they
+        are missing or older than 'max_age' seconds. If 'validate' is False,
+        the request is sent right away and the Robot is left to reject
+        invalid switches.
+        """
+        if validate:
+            expired = max_age is not None and self._cache_time is not None \
+                and time.time() - self._cache_time > max_age
+            if self._cached_failovers is None or expired:
+                self.refresh_cache()
+            self._validate(ip, new_destination, self._cached_failovers,
+                           self._cached_server_ips)
+
+        start = time.monotonic()
+        result = self.conn.post('/failover/%s'
+                                % ip, {'active_server_ip': new_destination})
+        latency = time.monotonic() - start
+
+        failover = Failover(result.get('failover'))
+        if self._cached_failovers is not None:
+            self._cached_failovers[failover.ip] = failover
+        return failover, latency
+
+    def plan_evacuation(self, source_ip, target):
+        """
+        Return a list of (failover_ip, destination) tuples for moving every
+        failover IP currently routed to 'source_ip' away from it, based on a
+        single request for the failover IPs.
+
+        'target' is either the main IP of a single destination server, a list
+        of destination IPs among which the failover IPs are distributed so
+        that every destination ends up with as few failover IPs as possible,
+        or a callable which gets a Failover object and returns the
+        destination IP for it.
+        """
+        failovers = self.list()
+        moving = sorted((f for f in failovers.values()
+                         if f.active_server_ip == source_ip),
+                        key=lambda f: f.ip)
+
+        if callable(target):
+            return [(f.ip, target(f)) for f in moving]
+        elif not isinstance(target, (list, tuple, set)):
+            return [(f.ip, target) for f in moving]
+
+        load = dict((dest, 0) for dest in target if dest != source_ip)
+        if len(load) == 0:
+            raise RobotError("No destination left to evacuate {0} to."
+                             .format(source_ip))
+        for failover in failovers.values():
+            if failover.active_server_ip in load:
+                load[failover.active_server_ip] += 1
+
+        moves = []
+        for failover in moving:
+            dest = min(load, key=lambda d: (load[d], d))
+            load[dest] += 1
+            moves.append((failover.ip, dest))
+        return moves
+
+    def evacuate(self, source_ip, target, jobs=4, callback=None):
+        """
+        Move all failover IPs routed to 'source_ip' to the destinations
+        determined by 'target' (see plan_evacuation()), sending up to 'jobs'
+        switch requests concurrently.
+
+        Returns a tuple consisting of the new mapping of the affected
+        failover IPs to their destination and a list of TaskResult objects,
+        whose 'item' is the (failover_ip, destination) tuple of the move and
+        whose 'value' is the resulting Failover on success. If 'callback' is
+        given, it's called with every TaskResult as soon as it's available.
+        """
+        def move(item):
+            return self.switch(item[0], item[1], validate=False)[0]
+
+        mapping = {}
+        results = []
+        moves = self.plan_evacuation(source_ip, target)
+        for result in run_parallel(move, moves, jobs):
+            ip = result.item[0]
+            if result.error is None:
+                mapping[ip] = result.value.active_server_ip
+            else:
+                mapping[ip] = source_ip
+            results.append(result)
+            if callback is not None:
+                callback(result)
+        return mapping, results
+
+
+class FailoverController(object):
+    """
+    Keep the failover IP 'ip' routed to a healthy server out of
+    'destinations', which is a list of server main IPs in order of
+    preference.
+
+    Every 'interval' seconds, all destinations are checked concurrently by
+    calling 'check' with the destination IP (see hetzner.util.health for
+    TCP and HTTP checks). A destination is considered healthy after 'rise'
+    consecutive successful checks and unhealthy after 'fall' consecutive
+    failures. Destinations which change their health too often are
+    suppressed by a FlapDamper.
+
+    If the active destination becomes unhealthy, the failover IP is switched
+    to the most preferred healthy destination. If 'preempt' is True, the
+    failover IP is also switched back to a more preferred destination once
+    it's healthy again, but not earlier than 'hold_time' seconds after the
+    last switch.
+
+    If 'callback' is given, it's called with the result of status() whenever
+    a destination changes its health or the failover IP has been switched.
+    """
+    def __init__(self, manager, ip, destinations, check, interval=0.5,
+                 rise=3, fall=2, preempt=False, hold_time=30,
+                 refresh_interval=300, damper=None, callback=None):
+        self.manager = manager
+        self.ip = ip
+        self.destinations = list(destinations)
+        self.check = check
+        self.interval = interval
+        self.preempt = preempt
+        self.hold_time = hold_time
+        self.refresh_interval = refresh_interval
+        self.callback = callback
+        self.logger = logging.getLogger("Failover controller for {0}"
+                                        .format(ip))
+
+        self.active = None
+        self.health = dict((dest, HealthState(rise, fall))
+                           for dest in self.destinations)
+        if damper is None:
+            damper = FlapDamper
+        self.dampers = dict((dest, damper()) for dest in self.destinations)
+
+        self.stats = {
+            'rounds': 0,
+            'switches': 0,
+            'errors': 0,
+            'rate_limited': 0,
+            'last_decision_latency': None,
+            'last_switch_latency': None,
+            'last_failover_latency': None,
+        }
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.destinations)
+        )
+        self._last_switch = None
+        self._last_refresh = None
+        self._blocked_until = 0
+        self._failing_since = None
+
+    def refresh(self):
+        """
+        Fetch the current destination of the failover IP, which also makes
+        sure that the connection to the Robot is established.
+        """
+        try:
+            failover = self.manager.get(self.ip)
+        except RobotError as err:
+            if err.status == 404:
+                raise RobotError("{0} is not a failover IP address."
+                                 .format(self.ip), err.status)
+            raise
+        self._last_refresh = time.monotonic()
+
+        active = failover.active_server_ip
+        if active != self.active:
+            self.logger.info("Failover IP is routed to %s.", active)
+            self.active = active
+            # Assume that the current destination is working until the
+            # checks tell us otherwise.
+            if active in self.health:
+                self.health[active].healthy = True
+
+    def is_usable(self, dest, now=None):
+        """
+        Whether 'dest' is healthy and not suppressed because of flapping.
+        """
+        if not self.health[dest].healthy:
+            return False
+        return not self.dampers[dest].is_suppressed(now)
+
+    def _choose(self, now):
+        usable = [dest for dest in self.destinations
+                  if self.is_usable(dest, now)]
+        if len(usable) == 0:
+            return None
+        if self.active in usable:
+            if not self.preempt or usable[0] == self.active:
+                return self.active
+            if self._last_switch is not None and \
+               now - self._last_switch < self.hold_time:
+                return self.active
+        return usable[0]
+
+    def _switch(self, dest, now):
+        if now < self._blocked_until:
+            return False
+
+        self.logger.info("Switching failover IP from %s to %s.",
+                         self.active, dest)
+        try:
+            failover, latency = self.manager.switch(self.ip, dest,
+                                                    validate=False)
+        except RateLimitError as err:
+            self.stats['rate_limited'] += 1
+            self._blocked_until = now + err.retry_after
+            self.logger.warning("Rate limit exceeded, not switching for %.1f"
+                                " seconds.", err.retry_after)
+            return False
+        except (RobotError, IOError) as err:
+            self.stats['errors'] += 1
+            self.logger.error("Unable to switch failover IP: %s", err)
+            return False
+
+        done = time.monotonic()
+        self.active = failover.active_server_ip
+        self._last_switch = done
+        self.stats['switches'] += 1
+        self.stats['last_switch_latency'] = latency
+        if self._failing_since is not None:
+            self.stats['last_failover_latency'] = done - self._failing_since
+        self._failing_since = None
+        self.logger.info("Switched failover IP to %s in %.3f seconds.",
+                         self.active, latency)
+        return True
+
+    def probe(self, dest):
+        """
+        Run the health check for 'dest', where an exception raised by the
+        check counts as a failed check.
+        """
+        try:
+            return bool(self.check(dest))
+        except Exception as err:
+            self.logger.warning("Health check of %s raised %r.", dest, err)
+            return False
+
+    def step(self):
+        """
+        Run one round of health checks and switch the failover IP if
+        necessary. Returns True if the failover IP has been switched.
+        """
+        started = time.monotonic()
+        if self._last_refresh is None or \
+           started - self._last_refresh > self.refresh_interval:
+            try:
+                self.refresh()
+            except (RobotError, IOError) as err:
+                self.stats['errors'] += 1
+                self.logger.error("Unable to refresh failover state: %s", err)
+
+        results = list(self._executor.map(self.probe, self.destinations))
+        now = time.monotonic()
+        changed = False
+
+        for dest, success in zip(self.destinations, results):
+            if dest == self.active:
+                if not success and self._failing_since is None:
+                    self._failing_since = started
+                elif success:
+                    self._failing_since = None
+            state = self.health[dest]
+            was_healthy = state.healthy
+            if state.update(success) != was_healthy:
+                changed = True
+                suppressed = self.dampers[dest].flap(now)
+                self.logger.info("Destination %s is now %s%s.", dest,
+                                 "healthy" if state.healthy else "unhealthy",
+                                 " (suppressed)" if suppressed else "")
+
+        target = self._choose(now)
+        self.stats['rounds'] += 1
+        self.stats['last_decision_latency'] = time.monotonic() - started
+
+        switched = False
+        if target is None:
+            if changed:
+                self.logger.warning("No usable destination available.")
+        elif target != self.active:
+            switched = self._switch(target, now)
+
+        if (changed or switched) and self.callback is not None:
+            self.callback(self.status())
+        return switched
+
+    def status(self):
+        """
+        Return a dictionary describing the current state of the controller.
+        """
+        destinations = {}
+        for dest in self.destinations:
+            destinations[dest] = {
+                'healthy': self.health[dest].healthy,
+                'suppressed': self.dampers[dest].suppressed,
+            }
+        return {
+            'ip': self.ip,
+            'active': self.active,
+            'destinations': destinations,
+            'stats': dict(self.stats),
+        }
+
+    def run(self, stop=None):
+        """
+        Run health checks until the threading.Event 'stop' is set or forever
+        if it's None.
+        """
+        if stop is None:
+            stop = threading.Event()
+        try:
+            while not stop.is_set():
+                started = time.monotonic()
+                self.step()
+                elapsed = time.monotonic() - started
+                stop.wait(max(0, self.interval - elapsed))
+        finally:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,342 @@
+import copy
+import time
+import logging
+
+from collections import namedtuple
+
+from hetzner import RobotError
+from hetzner.model import Model
+from hetzner.util.hedge import percentile
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['Firewall', 'FirewallManager', 'FirewallTemplate', 'Rollout',
+           'RolloutResult', 'diff_config', 'normalize_config']
+
+DIRECTIONS = ('input', 'output')
+RULE_FIELDS = ('ip_version', 'name', 'dst_ip', 'src_ip', 'dst_port',
+               'src_port', 'protocol', 'tcp_flags', 'action')
+
+# Outcomes of the rollout to a single server.
+UNCHANGED = 'unchanged'
+UPDATED = 'updated'
+FAILED = 'failed'
+
+RolloutResult = namedtuple('RolloutResult', ['server', 'outcome', 'changes',
+                                             'error', 'latency'])
+
+
+def normalize_rule(rule):
+    """
+    Return a copy of 'rule' which only contains the fields that are set.
+
+    >>> normalize_rule({'name': 'ssh', 'dst_port': '22', 'src_ip': None})
+    {'name': 'ssh', 'dst_port': '22'}
+    """
+    return dict((key, rule[key]) for key in RULE_FIELDS
+                if rule.get(key) is not None)
+
+
+def normalize_config(data, status='active'):
+    """
+    Return the parts of the firewall configuration 'data' (of a server or a
+    template) which are relevant for comparing and applying it. Templates
+    don't have a status, so 'status' is used for them.
+    """
+    rules = data.get('rules') or {}
+    return {
+        'status': data.get('status', status),
+        'filter_ipv6': bool(data.get('filter_ipv6')),
+        'whitelist_hos': bool(data.get('whitelist_hos')),
+        'rules': dict((direction, [normalize_rule(rule) for rule in
+                                   rules.get(direction) or []])
+                      for direction in DIRECTIONS),
+    }
+
+
+def diff_config(current, desired):
+    """
+    Return a list of human readable differences between the normalized
+    firewall configurations 'current' and 'desired'.
+
+    >>> old = normalize_config({'status': 'disabled', 'rules': {'input': [
+    ...     {'name': 'ssh', 'dst_port': '22', 'action': 'accept'}]}})
+    >>> new = normalize_config({'rules': {'input': [
+    ...     {'name': 'ssh', 'dst_port': '2222', 'action': 'accept'},
+    ...     {'name': 'web', 'dst_port': '443', 'action': 'accept'}]}})
+    >>> for change in diff_config(old, new): print(change)
+    status: 'disabled' -> 'active'
+    input rule 1 ('ssh'): dst_port '22' -> '2222'
+    input rule 2 ('web'): added
+    """
+    changes = []
+    for key in ('status', 'filter_ipv6', 'whitelist_hos'):
+        if current[key] != desired[key]:
+            changes.append("{0}: {1!r} -> {2!r}".format(key, current[key],
+                                                        desired[key]))
+    for direction in DIRECTIONS:
+        old = current['rules'][direction]
+        new = desired['rules'][direction]
+        for index in range(max(len(old), len(new))):
+            prefix = "{0} rule {1}".format(direction, index + 1)
+            if index >= len(old):
+                changes.append("{0} ({1!r}): added".format(
+                    prefix, new[index].get('name')))
+            elif index >= len(new):
+                changes.append("{0} ({1!r}): removed".format(
+                    prefix, old[index].get('name')))
+            elif old[index] != new[index]:
+                fields = ["{0} {1!r} -> {2!r}".format(key, old[index].get(key),
+                                                      new[index].get(key))
+                          for key in RULE_FIELDS
+                          if old[index].get(key) != new[index].get(key)]
+                changes.append("{0} ({1!r}): {2}".format(
+                    prefix, new[index].get('name'), ", ".join(fields)))
+    return changes
+
+
+class Firewall(Model):
+    """
+    The firewall of a single server, identified by its main IP or number.
+    """
+    def __init__(self, conn, server, result=None):
+        self.conn = conn
+        self.server = str(getattr(server, 'ip', server))
+        self.update_info(result)
+
+    def to_dict(self):
+        return copy.deepcopy(self._result)
+
+    def _restore(self, data):
+        self.server = data['firewall']['server_ip']
+        self.update_info(data)
+
+    def update_info(self, result=None):
+        """
+        Update the firewall configuration either by sending a new GET
+        request or by using the response given by 'result'.
+        """
+        if result is None:
+            result = self.conn.get('/firewall/{0}'.format(self.server))
+        self._result = result
+        data = result['firewall']
+        self.server_ip = data['server_ip']
+        self.server_number = data['server_number']
+        self.status = data['status']
+        self.filter_ipv6 = data['filter_ipv6']
+        self.whitelist_hos = data['whitelist_hos']
+        self.port = data.get('port')
+        self.rules = data['rules']
+
+    @property
+    def config(self):
+        """
+        The normalized configuration, see normalize_config().
+        """
+        return normalize_config(self._result['firewall'])
+
+    def apply(self, config):
+        """
+        Replace the firewall configuration by 'config', which is a
+        dictionary in the form returned by normalize_config() or a
+        FirewallTemplate.
+        """
+        if isinstance(config, FirewallTemplate):
+            data = {'template_id': config.id}
+        else:
+            data = normalize_config(config)
+        self.update_info(self.conn.post('/firewall/{0}'.format(self.server),
+                                        data))
+
+    def disable(self):
+        """
+        Keep the rules, but switch off the firewall.
+        """
+        data = dict(self.config, status='disabled')
+        self.update_info(self.conn.post('/firewall/{0}'.format(self.server),
+                                        data))
+
+    def delete(self):
+        """
+        Remove all rules and switch off the firewall.
+        """
+        self.update_info(self.conn.request(
+            'DELETE', '/firewall/{0}'.format(self.server)
+        ))
+
+    def __repr__(self):
+        return "<Firewall of {0} ({1})>".format(self.server, self.status)
+
+
+class FirewallTemplate(Model):
+    def __init__(self, conn, result):
+        self.conn = conn
+        self.update_info(result)
+
+    def to_dict(self):
+        return copy.deepcopy(self._result)
+
+    def _restore(self, data):
+        self.update_info(data)
+
+    def update_info(self, result=None):
+        """
+        Update the template either by sending a new GET request or by using
+        the response given by 'result'. Templates in the list of all
+        templates don't contain any rules, so 'rules' is None until this has
+        been called without 'result'.
+        """
+        if result is None:
+            result = self.conn.get('/firewall/template/{0}'.format(self.id))
+        self._result = result
+        data = result['firewall_template']
+        self.id = data['id']
+        self.name = data['name']
+        self.filter_ipv6 = data['filter_ipv6']
+        self.whitelist_hos = data['whitelist_hos']
+        self.is_default = data['is_default']
+        self.rules = data.get('rules')
+
+    @property
+    def config(self):
+        """
+        The normalized configuration a server gets when the template is
+        applied to it, see normalize_config().
+        """
+        if self.rules is None:
+            self.update_info()
+        return normalize_config(self._result['firewall_template'])
+
+    def delete(self):
+        self.conn.delete('/firewall/template/{0}'.format(self.id))
+
+    def __repr__(self):
+        return "<FirewallTemplate {0} {1!r}>".format(self.id, self.name)
+
+
+class Rollout(object):
+    """
+    Summary of applying a firewall configuration to several servers, with
+    one RolloutResult per server in 'results'.
+    """
+    def __init__(self, results, duration):
+        self.results = results
+        self.duration = duration
+
+    def by_outcome(self, outcome):
+        return [result for result in self.results if result.outcome == outcome]
+
+    @property
+    def updated(self):
+        return self.by_outcome(UPDATED)
+
+    @property
+    def unchanged(self):
+        return self.by_outcome(UNCHANGED)
+
+    @property
+    def failed(self):
+        return self.by_outcome(FAILED)
+
+    def latency(self, pct=50):
+        """
+        Return the 'pct' percentile of the time it took to roll out to a
+        single server or None if there are no results.
+        """
+        latencies = sorted(result.latency for result in self.results)
+        if len(latencies) == 0:
+            return None
+        return percentile(latencies, pct)
+
+    def __repr__(self):
+        return "<Rollout: {0} updated, {1} unchanged, {2} failed>".format(
+            len(self.updated), len(self.unchanged), len(self.failed)
+        )
+
+
+class FirewallManager(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.logger = logging.getLogger("Firewall manager")
+
+    def get(self, server):
+        """
+        Return the Firewall of 'server', which is a Server object, a server
+        number or the main IP of the server.
+        """
+        return Firewall(self.conn, server)
+
+    def templates(self):
+        """
+        Return a list of all firewall templates without their rules.
+        """
+        try:
+            result = self.conn.get('/firewall/template')
+        except RobotError as err:
+            # If there are no templates a 404 is returned rather than just
+            # an empty list.
+            if err.status == 404:
+                return []
+            raise
+        return [FirewallTemplate(self.conn, template) for template in result]
+
+    def template(self, template_id):
+        return FirewallTemplate(self.conn, self.conn.get(
+            '/firewall/template/{0}'.format(template_id)
+        ))
+
+    def create_template(self, name, config, is_default=False):
+        """
+        Create a template called 'name' from the firewall configuration
+        'config' (see normalize_config()).
+        """
+        config = normalize_config(config)
+        data = {'name': name, 'is_default': is_default,
+                'filter_ipv6': config['filter_ipv6'],
+                'whitelist_hos': config['whitelist_hos'],
+                'rules': config['rules']}
+        return FirewallTemplate(self.conn,
+                                self.conn.post('/firewall/template', data))
+
+    def rollout(self, servers, desired, jobs=4, dry_run=False,
+                progress=None):
+        """
+        Apply 'desired', which is either a FirewallTemplate or a firewall
+        configuration (see normalize_config()), to all 'servers' using up to
+        'jobs' threads. The current configuration of every server is fetched
+        first and only servers whose configuration differs are updated,
+        unless 'dry_run' is True, in which case nothing is updated at all.
+
+        If 'progress' is a callable, it's called with the RolloutResult of
+        every server as soon as it is available. Returns a Rollout.
+        """
+        if isinstance(desired, FirewallTemplate):
+            wanted = desired.config
+        else:
+            wanted = normalize_config(desired)
+
+        def roll(server):
+            firewall = self.get(server)
+            changes = diff_config(firewall.config, wanted)
+            if len(changes) == 0:
+                return UNCHANGED, changes
+            if not dry_run:
+                firewall.apply(desired)
+            return UPDATED, changes
+
+        started = time.monotonic()
+        results = []
+        for task in run_parallel(roll, servers, jobs):
+            server = str(getattr(task.item, 'ip', task.item))
+            if task.error is not None:
+                self.logger.warning("Unable to update firewall of %s: %s",
+                                    server, task.error)
+                result = RolloutResult(server, FAILED, None, task.error,
+                                       task.latency)
+            else:
+                outcome, changes = task.value
+                result = RolloutResult(server, outcome, changes, None,
+                                       task.latency)
+            results.append(result)
+            if progress is not None:
+                progress(result)
+        return Rollout(results, time.monotonic() - started)
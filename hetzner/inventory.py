@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import time
+import errno
+import fnmatch
+
+__all__ = ['InventoryCache', 'build_inventory', 'default_inventory_path',
+           'group_name']
+
+# Collections needed for building the inventory.
+COLLECTIONS = ['ip', 'rdns', 'server', 'subnet']
+
+
+def default_inventory_path():
+    """
+    Return the default location of the inventory cache, which is within
+    $XDG_CACHE_HOME or ~/.cache.
+    """
+    cache_dir = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'hetzner', 'inventory.json')
+
+
+def group_name(prefix, value):
+    """
+    Return a group name usable by Ansible for the given value.
+
+    >>> group_name('dc', 'FSN1-DC14')
+    'dc_fsn1_dc14'
+    """
+    return re.sub(r'[^a-z0-9_]', '_', u"{0}_{1}".format(prefix, value).lower())
+
+
+def build_inventory(collections, name_groups=None):
+    """
+    Build an inventory in the JSON format of Ansible's dynamic inventories
+    from the raw items of the 'server', 'ip', 'subnet' and 'rdns'
+    collections as returned by hetzner.collection.fetch_all().
+
+    Servers are grouped by datacenter, product and status, and additionally
+    into the groups of 'name_groups', which maps group names to shell-style
+    patterns matched against the server names. Hosts are named after their
+    server if the name is set and unique, otherwise after their main IP.
+    """
+    from hetzner.collection import AddressMap
+
+    servers = [item['server'] for item in collections.get('server', [])]
+    names = [server['server_name'] for server in servers]
+    amap = AddressMap(collections.get('ip', []),
+                      collections.get('subnet', []))
+
+    hostvars = {}
+    groups = {}
+    hostnames = {}
+    for server in servers:
+        ip, name = server['server_ip'], server['server_name']
+        host = name if name and names.count(name) == 1 else ip
+        hostnames[ip] = host
+        hostvars[host] = {
+            'ansible_host': ip,
+            'hetzner_server_ip': ip,
+            'hetzner_server_number': server['server_number'],
+            'hetzner_name': name,
+            'hetzner_product': server['product'],
+            'hetzner_dc': server['dc'],
+            'hetzner_status': server['status'],
+            'hetzner_ips': [],
+            'hetzner_subnets': [],
+            'hetzner_rdns': {},
+        }
+        matched = [group_name('dc', server['dc']),
+                   group_name('product', server['product']),
+                   group_name('status', server['status'])]
+        for group, pattern in sorted((name_groups or {}).items()):
+            if fnmatch.fnmatch(name or '', pattern):
+                matched.append(group)
+        for group in matched:
+            groups.setdefault(group, []).append(host)
+
+    for item in collections.get('ip', []):
+        host = hostnames.get(item['ip']['server_ip'])
+        if host is not None:
+            hostvars[host]['hetzner_ips'].append(item['ip']['ip'])
+    for item in collections.get('subnet', []):
+        subnet = item['subnet']
+        host = hostnames.get(subnet['server_ip'])
+        if host is not None:
+            hostvars[host]['hetzner_subnets'].append({
+                'ip': subnet['ip'],
+                'mask': subnet['mask'],
+                'gateway': subnet.get('gateway'),
+            })
+    for item in collections.get('rdns', []):
+        rdns = item['rdns']
+        host = hostnames.get(amap.server_ip(rdns['ip']))
+        if host is not None:
+            hostvars[host]['hetzner_rdns'][rdns['ip']] = rdns['ptr']
+
+    inventory = dict((group, {'hosts': sorted(hosts)})
+                     for group, hosts in groups.items())
+    inventory['all'] = {'children': sorted(groups.keys()),
+                        'hosts': sorted(hostvars.keys())}
+    inventory['_meta'] = {'hostvars': hostvars}
+    return inventory
+
+
+class InventoryCache(object):
+    """
+    Keep an inventory in the file at 'path'. An inventory younger than 'ttl'
+    seconds is used as is, an inventory which is at most 'max_stale' seconds
+    older than that is used while a new one is fetched in the background.
+
+    The 'key' describes how the inventory is built, for example the account
+    and groups, and is stored along with it. Cached inventories with another
+    key are not used, so it needs to compare equal to its JSON decoded form.
+    """
+    def __init__(self, path=None, ttl=300, max_stale=3600, lock_timeout=300,
+                 key=None):
+        if path is None:
+            path = default_inventory_path()
+        self.path = path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.lock_timeout = lock_timeout
+        self.lockfile = path + '.lock'
+        self.key = key
+
+    def read(self):
+        """
+        Return a tuple of the cached inventory and its age in seconds or
+        (None, None) if there is no usable cache or it has another key.
+        """
+        try:
+            with open(self.path, 'r') as fp:
+                data = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None, None
+        if data.get('key') != self.key:
+            return None, None
+        return data['inventory'], time.time() - data['fetched_at']
+
+    def write(self, inventory):
+        dirname = os.path.dirname(self.path)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmpfile = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmpfile, 'w') as fp:
+            json.dump({'fetched_at': time.time(), 'key': self.key,
+                       'inventory': inventory}, fp)
+        os.replace(tmpfile, self.path)
+
+    def is_locked(self):
+        """
+        Whether a refresh is in progress, ignoring locks which have been
+        held longer than 'lock_timeout' seconds.
+        """
+        try:
+            age = time.time() - os.stat(self.lockfile).st_mtime
+        except OSError:
+            return False
+        return age < self.lock_timeout
+
+    def lock(self):
+        """
+        Mark a refresh as in progress and return True, or return False if
+        another refresh is already running.
+        """
+        if not self.is_locked() and os.path.exists(self.lockfile):
+            os.unlink(self.lockfile)
+        dirname = os.path.dirname(self.lockfile)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        try:
+            os.close(os.open(self.lockfile,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+        except OSError as err:
+            if err.errno == errno.EEXIST:
+                return False
+            raise
+        return True
+
+    def unlock(self):
+        if os.path.exists(self.lockfile):
+            os.unlink(self.lockfile)
+
+    def refresh(self, fetch):
+        """
+        Build a new inventory using the callable 'fetch', which returns it,
+        and store it in the cache.
+        """
+        locked = self.lock()
+        try:
+            inventory = fetch()
+            self.write(inventory)
+        finally:
+            if locked:
+                self.unlock()
+        return inventory
+
+    def get(self, fetch, revalidate=None):
+        """
+        Return the inventory, either from the cache or by calling 'fetch'.
+        If the cached inventory is stale but still usable, the callable
+        'revalidate' is invoked to refresh the cache in the background
+        unless a refresh is already in progress.
+        """
+        inventory, age = self.read()
+        if inventory is not None:
+            if age < self.ttl:
+                return inventory
+            if age < self.ttl + self.max_stale:
+                if revalidate is not None and not self.is_locked():
+                    revalidate()
+                return inventory
+        return self.refresh(fetch)
@@ -0,0 +1,106 @@
+from hetzner import RobotError
+
+__all__ = ['DETACHED', 'DetachedConnection', 'Model', 'connection_of']
+
+
+class DetachedConnection(object):
+    """
+    Stands in for the connection of detached model objects, so that they
+    can be pickled or sent to other processes. Every attempt to talk to the
+    Robot fails with a RobotError until the object has been attached again,
+    while other attributes are missing as usual.
+    """
+    # Methods of RobotConnection and RobotWebInterface sending requests.
+    REQUEST_METHODS = frozenset(['connect', 'delete', 'get', 'get_iter',
+                                 'login', 'post', 'put', 'request',
+                                 'request_iter', 'session'])
+    # Attributes of RobotConnection holding web interface connections.
+    SCRAPERS = frozenset(['scraper', 'scrapers'])
+
+    def _detached(self, *args, **kwargs):
+        raise RobotError("Object is detached, use attach() to attach it to"
+                         " a Robot first.")
+
+    def __getattr__(self, name):
+        if name in self.SCRAPERS:
+            return self
+        if name in self.REQUEST_METHODS:
+            return self._detached
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return "<DetachedConnection>"
+
+
+DETACHED = DetachedConnection()
+
+
+def connection_of(robot):
+    """
+    Return the connection of 'robot', which can either be a Robot or a
+    connection object such as RobotConnection.
+    """
+    return getattr(robot, 'conn', robot)
+
+
+class Model(object):
+    """
+    Base class for model objects which can be detached from their
+    connection, so that they can be pickled or sent to the worker processes
+    of a multiprocessing pool, and attached to another Robot later on:
+
+    >>> from hetzner.rdns import ReverseDNS
+    >>> rdns = ReverseDNS.from_dict({'rdns': {'ip': '1.2.3.4', 'ptr': 'a'}})
+    >>> rdns.detached, rdns.to_dict()
+    (True, {'rdns': {'ip': '1.2.3.4', 'ptr': 'a'}})
+
+    Subclasses implement to_dict(), which returns a JSON serializable
+    dictionary, and _restore(), which initializes the object from it again.
+    Only to_dict() is pickled, so the pickled form is as compact as the
+    JSON form.
+    """
+    def to_dict(self):
+        raise NotImplementedError
+
+    def _restore(self, data):
+        raise NotImplementedError
+
+    def _attach(self, conn):
+        self.conn = conn
+
+    @classmethod
+    def from_dict(cls, data, robot=None):
+        """
+        Create an object from the result of to_dict(), attached to 'robot'
+        (a Robot or a connection) or detached if 'robot' is None.
+        """
+        obj = cls.__new__(cls)
+        obj._attach(DETACHED if robot is None else connection_of(robot))
+        obj._restore(data)
+        return obj
+
+    def detach(self):
+        """
+        Return a detached copy of this object.
+        """
+        return self.from_dict(self.to_dict())
+
+    def attach(self, robot):
+        """
+        Attach this object to 'robot', which can either be a Robot or a
+        connection, and return the object.
+        """
+        self._attach(connection_of(robot))
+        self._restore(self.to_dict())
+        return self
+
+    @property
+    def detached(self):
+        return self.conn is DETACHED
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._attach(DETACHED)
+        self._restore(state)
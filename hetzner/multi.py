@@ -0,0 +1,334 @@
+import time
+import logging
+import threading
+
+from collections import OrderedDict, deque
+
+from hetzner import RateLimitError, RobotError
+from hetzner.collection import RESOURCES, AddressMap, fetch, item_key
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['ACCOUNT_PREFIX', 'FLEET_RESOURCES', 'Budget', 'Fleet',
+           'MultiRobot', 'accounts_from_config']
+
+# Configuration sections describing additional accounts are named like
+# "account:<name>" and contain a username and a password just like the
+# "login" section, which is the account named "default".
+ACCOUNT_PREFIX = 'account:'
+DEFAULT_ACCOUNT = 'default'
+
+FLEET_RESOURCES = ('failover', 'ip', 'rdns', 'server', 'subnet')
+
+
+def accounts_from_config(config):
+    """
+    Return an ordered dictionary mapping account names to (username,
+    password) tuples from the RawConfigParser 'config'.
+
+    >>> from configparser import RawConfigParser
+    >>> config = RawConfigParser()
+    >>> config.read_string('''
+    ... [login]
+    ... username = main
+    ... password = secret
+    ... [account:backup]
+    ... username = other
+    ... password = secret2
+    ... ''')
+    >>> list(accounts_from_config(config).items())
+    [('default', ('main', 'secret')), ('backup', ('other', 'secret2'))]
+    """
+    accounts = OrderedDict()
+    sections = [(DEFAULT_ACCOUNT, 'login')]
+    sections += [(section[len(ACCOUNT_PREFIX):], section)
+                 for section in config.sections()
+                 if section.startswith(ACCOUNT_PREFIX)]
+    for name, section in sections:
+        if config.has_option(section, 'username') and \
+           config.has_option(section, 'password'):
+            accounts[name] = (config.get(section, 'username'),
+                              config.get(section, 'password'))
+    return accounts
+
+
+class Budget(object):
+    """
+    Allow at most 'max_requests' requests within a sliding window of
+    'window' seconds.
+
+    >>> budget = Budget(2, 60)
+    >>> budget.acquire(now=0), budget.acquire(now=1), budget.acquire(now=2)
+    (True, True, False)
+    >>> budget.acquire(now=61)
+    True
+    """
+    def __init__(self, max_requests=200, window=3600):
+        self.max_requests = max_requests
+        self.window = window
+        self.blocked_until = 0
+        self._requests = deque()
+        self._lock = threading.Lock()
+
+    def _remaining(self, now):
+        while self._requests and self._requests[0] <= now - self.window:
+            self._requests.popleft()
+        if now < self.blocked_until:
+            return 0
+        return max(self.max_requests - len(self._requests), 0)
+
+    def remaining(self, now=None):
+        """
+        Return the number of requests left within the current window.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            return self._remaining(now)
+
+    def acquire(self, count=1, now=None):
+        """
+        Use up 'count' requests if they're left within the current window
+        and return whether that was the case.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if self._remaining(now) < count:
+                return False
+            self._requests.extend([now] * count)
+            return True
+
+    def block(self, seconds, now=None):
+        """
+        Don't allow any requests within the next 'seconds' seconds, for
+        example because the Robot has reported that the rate limit has been
+        exceeded.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class Fleet(object):
+    """
+    Merged view of the collections of several accounts. 'items' maps the
+    resource names to lists of (account, raw item) tuples, 'errors' maps
+    (account, resource) tuples to the exception which occurred while
+    fetching and 'stale' is the set of (account, resource) tuples whose
+    items are left over from an earlier fetch.
+
+    An item listed by more than one account, like an IP address which has
+    been moved between accounts, is recorded as a RobotError in 'errors'
+    for each of these accounts, unless there is an error already.
+    """
+    def __init__(self, robots, items, errors=None, stale=None):
+        self.robots = robots
+        self.items = items
+        self.errors = {} if errors is None else errors
+        self.stale = set() if stale is None else stale
+        self._index = {}
+        for resource, entries in items.items():
+            for account, item in entries:
+                key = (resource, item_key(resource, item))
+                self._index.setdefault(key, []).append((account, item))
+        for (resource, key), entries in sorted(self._index.items()):
+            if len(entries) < 2:
+                continue
+            accounts = [account for account, item in entries]
+            error = RobotError("{0} {1} is listed by the accounts {2}."
+                               .format(resource, key, ", ".join(accounts)))
+            for account in accounts:
+                self.errors.setdefault((account, resource), error)
+        self._addresses = dict(
+            (account, AddressMap(
+                [item for acc, item in items.get('ip', []) if acc == account],
+                [item for acc, item in items.get('subnet', [])
+                 if acc == account]
+            )) for account in robots
+        )
+
+    @property
+    def complete(self):
+        """
+        Whether the collections of all accounts are current.
+        """
+        return len(self.errors) == 0 and len(self.stale) == 0
+
+    def get(self, resource, key, account=None):
+        """
+        Return an (account, raw item) tuple of the item identified by 'key'
+        in the collection 'resource' or None if there is no such item. If
+        several accounts list the item, None is returned as well unless the
+        'account' to look in is given.
+        """
+        entries = [entry for entry in self._index.get((resource, key), [])
+                   if account is None or entry[0] == account]
+        if len(entries) != 1:
+            return None
+        return entries[0]
+
+    def account_of(self, ip):
+        """
+        Return the name of the account the server, failover IP or any other
+        address 'ip' belongs to or None if it's unknown.
+        """
+        for resource in ('server', 'failover'):
+            entry = self.get(resource, ip)
+            if entry is not None:
+                return entry[0]
+        for account, addresses in self._addresses.items():
+            if addresses.server_ip(ip) is not None:
+                return account
+        return None
+
+    def servers(self):
+        """
+        Yield (account, Server) tuples of all servers, which are attached to
+        the Robot of their account.
+        """
+        from hetzner.server import Server
+        for account, item in self.items.get('server', []):
+            yield account, Server(self.robots[account].conn, item)
+
+    def server(self, ip):
+        """
+        Return the Server with the main IP 'ip', attached to the Robot of
+        its account, or None if there is no such server.
+        """
+        from hetzner.server import Server
+        entry = self.get('server', ip)
+        if entry is None:
+            return None
+        account, item = entry
+        return Server(self.robots[account].conn, item)
+
+    def failovers(self):
+        """
+        Yield (account, Failover) tuples of all failover IPs.
+        """
+        from hetzner.failover import Failover
+        for account, item in self.items.get('failover', []):
+            yield account, Failover(item['failover'])
+
+
+class MultiRobot(object):
+    """
+    Facade for several Robot accounts, given as a mapping from account names
+    to Robot instances. The collections of all accounts are fetched
+    concurrently using up to 'jobs' threads, but only as long as the
+    request budget of an account, which is 'max_requests' per 'window'
+    seconds, allows for it.
+
+    Accounts which fail or are out of budget don't prevent the others from
+    being fetched. Their items from the last successful fetch are used
+    instead, if there are any.
+    """
+    def __init__(self, robots, jobs=8, max_requests=200, window=3600):
+        self.robots = OrderedDict(robots)
+        self.jobs = jobs
+        self.budgets = dict((name, Budget(max_requests, window))
+                            for name in self.robots)
+        self.logger = logging.getLogger("Robot accounts")
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, timeout=None, **kwargs):
+        """
+        Create a MultiRobot for all accounts of the RawConfigParser 'config',
+        see accounts_from_config(). Further keyword arguments are passed to
+        the constructor.
+        """
+        from hetzner.robot import Robot
+        robots = [(name, Robot(user, passwd, timeout=timeout))
+                  for name, (user, passwd)
+                  in accounts_from_config(config).items()]
+        return cls(robots, **kwargs)
+
+    def __getitem__(self, name):
+        return self.robots[name]
+
+    def __iter__(self):
+        return iter(self.robots.items())
+
+    def _fetch(self, task):
+        account, resource = task
+        items = fetch(self.robots[account].conn, resource)
+        with self._lock:
+            self._cache[task] = (time.monotonic(), items)
+        return len(items)
+
+    def _is_fresh(self, task, max_age, now):
+        cached = self._cache.get(task)
+        return max_age is not None and cached is not None and \
+            now - cached[0] < max_age
+
+    def fetch(self, resources=FLEET_RESOURCES, accounts=None, max_age=None):
+        """
+        Fetch the collections 'resources' of the given 'accounts' (all by
+        default) concurrently, one request per account and collection, and
+        return a Fleet. Collections fetched less than 'max_age' seconds ago
+        are not fetched again.
+        """
+        for resource in resources:
+            if resource not in RESOURCES:
+                raise ValueError("Unknown resource {0!r}.".format(resource))
+        if accounts is None:
+            accounts = list(self.robots)
+
+        now = time.monotonic()
+        tasks = []
+        errors = {}
+        for account in accounts:
+            for resource in resources:
+                task = (account, resource)
+                if self._is_fresh(task, max_age, now):
+                    continue
+                if self.budgets[account].acquire(now=now):
+                    tasks.append(task)
+                else:
+                    errors[task] = RateLimitError(
+                        "Request budget of account {0} exhausted."
+                        .format(account)
+                    )
+
+        for result in run_parallel(self._fetch, tasks, self.jobs):
+            if result.error is None:
+                continue
+            account, resource = result.item
+            if isinstance(result.error, RateLimitError):
+                self.budgets[account].block(result.error.retry_after)
+            self.logger.warning("Unable to fetch %s of account %s: %s",
+                                resource, account, result.error)
+            errors[result.item] = result.error
+
+        return self._build(resources, accounts, errors)
+
+    def _build(self, resources, accounts, errors):
+        items = dict((resource, []) for resource in resources)
+        stale = set()
+        with self._lock:
+            for account in accounts:
+                for resource in resources:
+                    task = (account, resource)
+                    cached = self._cache.get(task)
+                    if cached is None:
+                        continue
+                    if task in errors:
+                        stale.add(task)
+                    items[resource] += [(account, item)
+                                        for item in cached[1]]
+        robots = OrderedDict((name, self.robots[name]) for name in accounts)
+        return Fleet(robots, items, errors, stale)
+
+    def server(self, ip, max_age=None):
+        """
+        Return the Server with the main IP 'ip' from whichever account it
+        belongs to.
+        """
+        server = self.fetch(['server'], max_age=max_age).server(ip)
+        if server is None:
+            raise RobotError("Server {0} not found in any account."
+                             .format(ip), 404)
+        return server
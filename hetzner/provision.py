@@ -0,0 +1,167 @@
+import time
+import logging
+
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from hetzner import ConnectError
+from hetzner.util import deadline
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['Progress', 'Provisioner']
+
+# Stages a server passes through during provisioning. A server which fails
+# at any point ends up in FAILED with the exception in Progress.error.
+ACTIVATED = 'activated'
+RESET = 'reset'
+READY = 'ready'
+FAILED = 'failed'
+
+# A progress event of a single server. 'elapsed' is the number of seconds
+# since provisioning has started and 'detail' depends on the stage: the root
+# password for ACTIVATED and the number of the wave for RESET.
+Progress = namedtuple('Progress', ['server', 'stage', 'elapsed', 'detail',
+                                   'error'])
+
+
+class _Host(object):
+    def __init__(self, server):
+        self.server = server
+        self.reset_at = None
+        self.seen_down = False
+        self.timings = {}
+
+
+class Provisioner(object):
+    """
+    Activate the boot configuration 'boot' (see hetzner.boot) with the given
+    'options' on all 'servers' and reboot them into it, so that for example
+    a new operating system is installed on all of them at once.
+
+    Activation happens concurrently for up to 'jobs' servers. Servers are
+    reset in waves of 'wave_size' servers using the reset 'mode', starting
+    a new wave at most every 'wave_interval' seconds, while the activation
+    of the remaining servers is still in progress.
+
+    After the reset, the readiness of all servers is checked in parallel
+    every 'poll_interval' seconds using 'ready', a function which gets the
+    server and returns whether it is up. By default this checks whether the
+    SSH port is open. A server only counts as ready once the check
+    succeeds after having failed at least once since the reset, so that
+    the old system isn't mistaken for the new one. Servers which aren't
+    ready 'patience' seconds after their reset have failed.
+    """
+    def __init__(self, servers, boot='linux', options=None, wave_size=5,
+                 wave_interval=0, mode='hard', jobs=8, ready=None,
+                 patience=1800, poll_interval=10):
+        self.servers = list(servers)
+        self.boot = boot
+        self.options = {} if options is None else options
+        self.wave_size = wave_size
+        self.wave_interval = wave_interval
+        self.mode = mode
+        self.jobs = jobs
+        self.ready = ready if ready is not None else self._check_ssh
+        self.patience = patience
+        self.poll_interval = poll_interval
+        self.timings = {}
+        self.logger = logging.getLogger("Provisioner")
+
+    def _check_ssh(self, server):
+        return server.reset.check_ssh(timeout=min(5, self.poll_interval))
+
+    def _activate(self, host):
+        return host.server.boot[self.boot].activate(**self.options)
+
+    def _reset(self, host):
+        host.server.reset.reboot(self.mode)
+
+    def _is_ready(self, host):
+        if self.ready(host.server):
+            return host.seen_down
+        host.seen_down = True
+        return False
+
+    def run(self):
+        """
+        Provision all servers and yield a Progress event whenever one of
+        them has reached the next stage.
+        """
+        started = time.monotonic()
+        hosts = [_Host(server) for server in self.servers]
+        pending_reset = deque()
+        waiting = []
+        wave = 0
+        next_wave = started
+        next_poll = started
+
+        def event(host, stage, detail=None, error=None):
+            elapsed = time.monotonic() - started
+            host.timings[stage] = elapsed
+            self.timings[host.server.ip] = host.timings
+            if error is not None:
+                self.logger.warning("Provisioning of %s failed: %s",
+                                    host.server.ip, error)
+            return Progress(host.server, stage, elapsed, detail, error)
+
+        activate = deadline.bind(self._activate)
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            activations = dict((executor.submit(activate, host), host)
+                               for host in hosts)
+
+            while activations or pending_reset or waiting:
+                for future in [f for f in activations if f.done()]:
+                    host = activations.pop(future)
+                    if future.exception() is not None:
+                        yield event(host, FAILED, error=future.exception())
+                    else:
+                        yield event(host, ACTIVATED, future.result())
+                        pending_reset.append(host)
+
+                now = time.monotonic()
+                if pending_reset and now >= next_wave and \
+                   (len(pending_reset) >= self.wave_size or not activations):
+                    wave += 1
+                    batch = [pending_reset.popleft() for _ in
+                             range(min(self.wave_size, len(pending_reset)))]
+                    for result in run_parallel(self._reset, batch, self.jobs):
+                        host = result.item
+                        if result.error is not None:
+                            yield event(host, FAILED, error=result.error)
+                        else:
+                            host.reset_at = time.monotonic()
+                            waiting.append(host)
+                            yield event(host, RESET, wave)
+                    next_wave = time.monotonic() + self.wave_interval
+
+                now = time.monotonic()
+                if waiting and now >= next_poll:
+                    next_poll = now + self.poll_interval
+                    for result in run_parallel(self._is_ready, list(waiting),
+                                               self.jobs, ordered=True):
+                        host = result.item
+                        if result.error is None and result.value:
+                            waiting.remove(host)
+                            yield event(host, READY)
+                        elif time.monotonic() - host.reset_at > \
+                                self.patience:
+                            waiting.remove(host)
+                            error = result.error or ConnectError(
+                                "Server {0} isn't ready {1} seconds after"
+                                " the reset.".format(host.server.ip,
+                                                     self.patience))
+                            yield event(host, FAILED, error=error)
+
+                timeouts = []
+                if waiting:
+                    timeouts.append(next_poll - time.monotonic())
+                # An incomplete wave waits for further activations instead.
+                if pending_reset and (len(pending_reset) >= self.wave_size or
+                                      not activations):
+                    timeouts.append(next_wave - time.monotonic())
+                timeout = max(min(timeouts), 0) if timeouts else None
+                if activations:
+                    wait(activations, timeout=timeout,
+                         return_when=FIRST_COMPLETED)
+                elif timeout:
+                    time.sleep(timeout)
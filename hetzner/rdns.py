@@ -1,19 +1,35 @@
+import os
+import csv
+import json
+import hashlib
+import itertools
+
 try:
     from urllib import urlencode
 except ImportError:
     from urllib.parse import urlencode
 
 from hetzner import RobotError
+from hetzner.model import Model
+
+__all__ = ['ReverseDNS', 'ReverseDNSManager', 'read_records', 'write_records']
 
-__all__ = ['ReverseDNS', 'ReverseDNSManager']
+FORMATS = ('jsonl', 'csv')
 
 
-class ReverseDNS(object):
+class ReverseDNS(Model):
     def __init__(self, conn, ip=None, result=None):
         self.conn = conn
         self.ip = ip
         self.update_info(result)
 
+    def to_dict(self):
+        return {'rdns': {'ip': self.ip, 'ptr': self.ptr}}
+
+    def _restore(self, data):
+        self.ip = data['rdns']['ip']
+        self.ptr = data['rdns']['ptr']
+
     def update_info(self, result=None):
         if result is None:
             try:
@@ -41,6 +57,77 @@ class ReverseDNS(object):
         return "<ReverseDNS PTR: {0}>".format(self.ptr)
 
 
+def write_records(records, fp, fmt='jsonl'):
+    """
+    Write (ip, ptr) tuples from the iterable 'records' to the file object 'fp'
+    either as JSON lines or as CSV with a header, depending on 'fmt'. Every
+    record is written as soon as it is available and the number of written
+    records is returned.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(fp)
+        writer.writerow(['ip', 'ptr'])
+        write = writer.writerow
+    elif fmt == 'jsonl':
+        def write(record):
+            ip, ptr = record
+            fp.write(json.dumps({'ip': ip, 'ptr': ptr}) + "\n")
+    else:
+        raise ValueError("Unknown record format {0!r}.".format(fmt))
+
+    count = 0
+    for record in records:
+        write(record)
+        count += 1
+    return count
+
+
+def read_records(fp, fmt='jsonl'):
+    """
+    Yield (ip, ptr) tuples from the file object 'fp', which is either in JSON
+    lines or CSV format as written by write_records(). An empty PTR is yielded
+    as None.
+
+    >>> list(read_records(['{"ip": "1.2.3.4", "ptr": "a.example"}', '',
+    ...                    '{"ip": "1.2.3.5", "ptr": null}']))
+    [('1.2.3.4', 'a.example'), ('1.2.3.5', None)]
+    >>> list(read_records(['ip,ptr', '1.2.3.4,b.example', '1.2.3.5,'], 'csv'))
+    [('1.2.3.4', 'b.example'), ('1.2.3.5', None)]
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(fp):
+            yield row['ip'], row.get('ptr') or None
+    elif fmt == 'jsonl':
+        for line in fp:
+            if line.strip() == '':
+                continue
+            record = json.loads(line)
+            yield record['ip'], record.get('ptr') or None
+    else:
+        raise ValueError("Unknown record format {0!r}.".format(fmt))
+
+
+def input_path(fp):
+    """
+    Return the absolute path of the file the file object 'fp' has been
+    opened from or its name if it's not a regular file, like '<stdin>'.
+    """
+    name = getattr(fp, 'name', None)
+    if not isinstance(name, str):
+        return None
+    if name.startswith('<') and name.endswith('>'):
+        return name
+    return os.path.abspath(name)
+
+
+def record_digest(record):
+    """
+    Return the bytes representing the (ip, ptr) tuple 'record' in the hash
+    of imported records, which is independent of the input format.
+    """
+    return (json.dumps(list(record)) + "\n").encode('utf-8')
+
+
 class ReverseDNSManager(object):
     def __init__(self, conn, main_ip=None):
         self.conn = conn
@@ -49,17 +136,131 @@ class ReverseDNSManager(object):
     def get(self, ip):
         return ReverseDNS(self.conn, ip)
 
-    def __iter__(self):
+    def _url(self):
         if self.main_ip is None:
-            url = '/rdns'
-        else:
-            data = urlencode({'server_ip': self.main_ip})
-            url = '/rdns?{0}'.format(data)
+            return '/rdns'
+        data = urlencode({'server_ip': self.main_ip})
+        return '/rdns?{0}'.format(data)
+
+    def __iter__(self):
         try:
-            result = self.conn.get(url)
+            result = self.conn.get(self._url())
         except RobotError as err:
             if err.status == 404:
                 result = []
             else:
                 raise
         return iter([ReverseDNS(self.conn, result=rdns) for rdns in result])
+
+    def iter_records(self):
+        """
+        Yield (ip, ptr) tuples of all reverse DNS entries while they are
+        received, without creating ReverseDNS objects.
+        """
+        try:
+            for rdns in self.conn.get_iter(self._url()):
+                yield rdns['rdns']['ip'], rdns['rdns']['ptr']
+        except RobotError as err:
+            if err.status != 404:
+                raise
+
+    def export_records(self, fp, fmt='jsonl'):
+        """
+        Stream all reverse DNS entries into the file object 'fp' in the given
+        format ('jsonl' or 'csv') and return the number of exported entries.
+        """
+        return write_records(self.iter_records(), fp, fmt)
+
+    def _read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint, 'r') as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_checkpoint(self, checkpoint, done, path, digest):
+        tmpfile = checkpoint + '.tmp'
+        with open(tmpfile, 'w') as fp:
+            json.dump({'done': done,
+                       'input': {'path': path, 'sha256': digest}}, fp)
+        os.replace(tmpfile, checkpoint)
+
+    def import_records(self, fp, fmt='jsonl', batch_size=100,
+                       checkpoint=None, progress=None):
+        """
+        Read (ip, ptr) records from the file object 'fp' and apply them, one
+        batch of 'batch_size' records at a time. Records with an empty PTR
+        remove the reverse DNS entry.
+
+        If 'checkpoint' is the path of a file, the number of applied records
+        is stored there after every batch and already applied records are
+        skipped on the next run, so an interrupted import can be resumed. The
+        checkpoint file is removed once the import has finished.
+
+        The checkpoint also records the path of the input and a hash of the
+        applied records, and resuming from it with a different input raises
+        a ValueError before any record is applied.
+
+        If 'progress' is a callable, it's called with the number of applied
+        records after every batch. Returns the total number of applied
+        records.
+        """
+        path = input_path(fp)
+        state = None if checkpoint is None else \
+            self._read_checkpoint(checkpoint)
+        done = 0 if state is None else state.get('done', 0)
+        digest = hashlib.sha256()
+        records = read_records(fp, fmt)
+
+        if done > 0:
+            expected = state.get('input') or {}
+            if expected.get('path') != path:
+                raise ValueError(
+                    "Checkpoint {0} belongs to the import of {1} rather than"
+                    " {2}, remove it to start over."
+                    .format(checkpoint, expected.get('path'), path)
+                )
+            skipped = 0
+            for record in itertools.islice(records, done):
+                digest.update(record_digest(record))
+                skipped += 1
+            if skipped < done or digest.hexdigest() != expected.get('sha256'):
+                raise ValueError(
+                    "The first {0} records of {1} differ from the ones"
+                    " imported according to checkpoint {2}, remove it to"
+                    " start over.".format(done, path, checkpoint)
+                )
+
+        batch = []
+
+        def flush():
+            for ip, ptr in batch:
+                if ptr is None:
+                    try:
+                        self.conn.delete('/rdns/{0}'.format(ip))
+                    except RobotError as err:
+                        if err.status != 404:
+                            raise
+                else:
+                    self.conn.post('/rdns/{0}'.format(ip), {'ptr': ptr})
+            del batch[:]
+            if checkpoint is not None:
+                self._write_checkpoint(checkpoint, done, path,
+                                       digest.hexdigest())
+            if progress is not None:
+                progress(done)
+
+        for record in records:
+            digest.update(record_digest(record))
+            batch.append(record)
+            if len(batch) >= batch_size:
+                done += len(batch)
+                flush()
+
+        if len(batch) > 0:
+            done += len(batch)
+            flush()
+
+        if checkpoint is not None and os.path.exists(checkpoint):
+            os.unlink(checkpoint)
+        return done
@@ -2,6 +2,7 @@ import socket
 import time
 
 from hetzner import ConnectError, ManualReboot
+from hetzner.util import deadline
 
 
 class Reset(object):
@@ -49,19 +50,14 @@ class Reset(object):
         Check if the current server has an open SSH port. Return True if port
         is reachable, otherwise false. Time out after 'timeout' seconds.
         """
-        success = True
-        old_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(5)
-
+        # Don't touch the global default timeout, because other servers
+        # might be checked concurrently.
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((self.server.ip, port))
+            s = socket.create_connection((self.server.ip, port), timeout)
             s.close()
         except socket.error:
-            success = False
-
-        socket.setdefaulttimeout(old_timeout)
-        return success
+            return False
+        return True
 
     def observed_reboot(self, patience=300, tries=None, manual=False):
         """
@@ -73,6 +69,9 @@ class Reset(object):
         up again. Raises a ManualReboot exception if that is the case.
 
         Return True on success and False if the system didn't come up.
+
+        Waiting is aborted with DeadlineExceeded once the deadline of the
+        current thread (see hetzner.util.deadline) has passed.
         """
         is_down = False
 
@@ -95,8 +94,10 @@ class Reset(object):
                     )
                     break
 
-                is_up = self.check_ssh()
-                time.sleep(1)
+                left = deadline.check(what="Observed reboot")
+                is_up = self.check_ssh(timeout=5 if left is None
+                                       else max(min(5, left), 0.1))
+                time.sleep(1 if left is None else max(min(1, left), 0))
 
                 if is_up and is_down:
                     self.server.logger.info("Machine just became available.")
@@ -1,35 +1,52 @@
-import re
 import json
+import time
+import socket
 import logging
 import functools
+import threading
+
+from contextlib import contextmanager
 
 from base64 import b64encode
 
 try:
-    from httplib import BadStatusLine, ResponseNotReady
+    from httplib import BadStatusLine, HTTPException, ResponseNotReady
 except ImportError:
-    from http.client import BadStatusLine, ResponseNotReady
+    from http.client import BadStatusLine, HTTPException, ResponseNotReady
 
 try:
     from urllib import urlencode
 except ImportError:
     from urllib.parse import urlencode
 
-from hetzner import WebRobotError, RobotError
+try:
+    from Queue import LifoQueue, Empty
+except ImportError:
+    from queue import LifoQueue, Empty
+
+from hetzner import (WebRobotError, RobotError, RateLimitError,
+                     DeadlineExceeded)
 from hetzner.server import Server
 from hetzner.rdns import ReverseDNSManager
 from hetzner.failover import FailoverManager
-from hetzner.util.http import ValidatedHTTPSConnection
+from hetzner.firewall import FirewallManager
+from hetzner.vswitch import VSwitchManager
+from hetzner.util import compression, deadline, jsonstream, scraping
+from hetzner.util.circuit import CircuitBreakers, is_outage
+from hetzner.util.http import ValidatedHTTPSConnection, ConnectionPool
+from hetzner.util.parallel import run_parallel
+from hetzner.util.singleflight import SingleFlight
 
 ROBOT_HOST = "robot-ws.your-server.de"
 ROBOT_WEBHOST = "robot.hetzner.com"
 ROBOT_LOGINHOST = "accounts.hetzner.com"
 
-RE_CSRF_TOKEN = re.compile(
-    r'<input[^>]*?name="_csrf_token"[^>]*?value="([^">]+)"'
-)
+# Methods which may be sent again if it's unclear whether the Robot has
+# received the request.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
 
-__all__ = ['Robot', 'RobotConnection', 'RobotWebInterface', 'ServerManager']
+__all__ = ['Robot', 'RobotConnection', 'RobotWebInterface',
+           'RobotWebInterfacePool', 'ServerManager']
 
 
 class RobotWebInterface(object):
@@ -37,11 +54,13 @@ class RobotWebInterface(object):
     This is for scraping the web interface and can be used to implement
     features that are not yet available in the official API.
     """
-    def __init__(self, user=None, passwd=None):
+    def __init__(self, user=None, passwd=None, breakers=None):
         self.conn = None
         self.session_cookie = None
         self.user = user
         self.passwd = passwd
+        # Circuit breakers for the web interface, see hetzner.util.circuit.
+        self.breakers = CircuitBreakers() if breakers is None else breakers
         self.logged_in = False
         self.logger = logging.getLogger("Robot scraper for {0}".format(user))
 
@@ -129,6 +148,7 @@ class RobotWebInterface(object):
 
         # This is primarily for getting a first session cookie.
         login_conn = ValidatedHTTPSConnection(ROBOT_LOGINHOST)
+        deadline.apply(login_conn)
         login_conn.request('GET', auth_url[len(ROBOT_LOGINHOST) + 8:], None)
 
         response = login_conn.getresponse()
@@ -162,14 +182,16 @@ class RobotWebInterface(object):
             raise WebRobotError("Invalid status code {0} while visiting login"
                                 " page".format(response.status))
 
-        # Find the CSRF token
-        haystack = response.read()
-        token = RE_CSRF_TOKEN.search(str(haystack))
+        # Find the CSRF token, we don't need the rest of the page.
+        extractor = scraping.StreamingExtractor(
+            token=scraping.InputValue('_csrf_token')
+        )
+        token = extractor.extract(response, drain=False)['token']
         if token is None:
             raise WebRobotError("Unable to find CSRF token for login form")
 
         data = urlencode({'_username': self.user, '_password': self.passwd,
-                          '_csrf_token': token.group(1)})
+                          '_csrf_token': token})
         self.logger.debug("Logging in to auth site with user %s.", self.user)
 
         # Again, we need to reconnect here.
@@ -234,7 +256,22 @@ class RobotWebInterface(object):
 
         self.logged_in = True
 
-    def request(self, path, data=None, xhr=True, method=None, log=True):
+    def _session_expired(self, response):
+        """
+        Check whether the given response indicates that we have been logged
+        out, which is the case if we get redirected to the login site.
+        """
+        if not self.logged_in:
+            return False
+        if response.status == 401:
+            return True
+        if response.status in (301, 302, 303):
+            location = response.getheader('location') or ''
+            return location.startswith('https://' + ROBOT_LOGINHOST + '/')
+        return False
+
+    def request(self, path, data=None, xhr=True, method=None, log=True,
+                relogin=True):
         """
         Send a request to the web interface, using 'data' for urlencoded POST
         data. If 'data' is None (which it is by default), a GET request is sent
@@ -245,8 +282,17 @@ class RobotWebInterface(object):
 
         If 'log' is set to False, don't log anything containing data. This is
         useful to prevent logging sensible information such as passwords.
+
+        If the session has expired in the meantime, we log in again and retry
+        the request, unless 'relogin' is False.
+
+        The request is subject to the deadline of the current thread, see
+        hetzner.util.deadline, and fails with CircuitOpen right away while
+        the web interface is considered unavailable, see
+        hetzner.util.circuit.
         """
         self.connect()
+        deadline.apply(self.conn)
 
         headers = {'Connection': 'keep-alive'}
         if self.session_cookie is not None:
@@ -268,49 +314,211 @@ class RobotWebInterface(object):
             self.logger.debug("Sending %s request to Robot web frontend "
                               "at %s with data %r.",
                               ("XHR " if xhr else "") + method, path, encoded)
-        self.conn.request(method, path, encoded, headers)
-
+        # Only take part in the circuit breaker right before sending, so
+        # that a failure to set up the connection can't leave a half-open
+        # breaker waiting for the outcome of its probe forever.
+        breaker = self.breakers.for_request(ROBOT_WEBHOST, path)
+        breaker.before()
+        started = time.monotonic()
         try:
+            self.conn.request(method, path, encoded, headers)
             response = self.conn.getresponse()
+        except socket.timeout:
+            breaker.failure()
+            self.connect(force=True)
+            raise DeadlineExceeded("Request to web interface at {0} timed"
+                                   " out.".format(path))
         except ResponseNotReady:
+            breaker.release()
             self.logger.debug("Connection closed by Robot web frontend,"
                               " retrying.")
             # Connection closed, so we need to reconnect.
             # FIXME: Try to avoid endless loops here!
             self.connect(force=True)
-            return self.request(path, data=data, xhr=xhr, log=log)
+            return self.request(path, data=data, xhr=xhr, method=method,
+                                log=log, relogin=relogin)
+
+        except (socket.error, HTTPException):
+            breaker.failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+
+        if response.status >= 500:
+            breaker.failure()
+        else:
+            breaker.success(time.monotonic() - started)
 
         if log:
             self.logger.debug("Got response from web frontend with status %d.",
                               response.status)
 
+        if relogin and self._session_expired(response):
+            self.logger.debug("Session has expired, logging in again.")
+            response.read()
+            self.session_cookie = None
+            self.logged_in = False
+            self.login(force=True)
+            return self.request(path, data=data, xhr=xhr, method=method,
+                                log=log, relogin=False)
+
         self.update_session(response)
         return response
 
 
+class RobotWebInterfacePool(object):
+    """
+    A pool of up to 'size' independently logged in RobotWebInterface
+    sessions, which allows running scraping operations concurrently.
+    Sessions are created and logged in lazily on first use.
+    """
+    # Class of the sessions created by the pool.
+    session_class = RobotWebInterface
+
+    def __init__(self, user=None, passwd=None, size=4, breakers=None):
+        self.user = user
+        self.passwd = passwd
+        self.size = size
+        self.breakers = CircuitBreakers() if breakers is None else breakers
+        self._sessions = LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Return an idle session, creating a new one if there are less than
+        'size' sessions, and otherwise wait until one becomes available.
+        """
+        try:
+            return self._sessions.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            return self.session_class(self.user, self.passwd,
+                                      self.breakers)
+        return self._sessions.get()
+
+    def release(self, session):
+        self._sessions.put(session)
+
+    def add(self, session):
+        """
+        Add an existing session to the pool, which counts towards 'size'.
+        """
+        with self._lock:
+            self._created += 1
+        self.release(session)
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager for acquiring a logged in session.
+        """
+        session = self.acquire()
+        try:
+            session.login()
+            yield session
+        finally:
+            self.release(session)
+
+    def map(self, func, items, ordered=False):
+        """
+        Call 'func' with a logged in session and every element of 'items'
+        concurrently, using as many sessions as the pool allows. Yields
+        TaskResult objects as returned by hetzner.util.parallel.run_parallel.
+        """
+        def run(item):
+            with self.session() as session:
+                return func(session, item)
+        return run_parallel(run, items, self.size, ordered)
+
+
 class RobotConnection(object):
-    def __init__(self, user, passwd):
+    def __init__(self, user, passwd, pool_size=8, coalesce=True,
+                 timeout=None, hedger=None, breakers=None, compress=True):
         self.user = user
         self.passwd = passwd
-        self.conn = ValidatedHTTPSConnection(ROBOT_HOST)
+
+        # Whether to ask for compressed responses, which are decompressed
+        # while being read. Byte counts are kept in 'compression_stats'.
+        self.compress = compress
+        self.compression_stats = {
+            'responses': 0,
+            'compressed': 0,
+            'wire_bytes': 0,
+            'decoded_bytes': 0,
+        }
+        self._stats_lock = threading.Lock()
+
+        # Timeout in seconds for every single request, which applies in
+        # addition to deadlines (see hetzner.util.deadline).
+        self.timeout = timeout
+        self.pool = ConnectionPool(
+            lambda: ValidatedHTTPSConnection(ROBOT_HOST), pool_size
+        )
+
+        # Concurrent GET requests for the same path share one request to the
+        # Robot, see SingleFlight.stats for how many have been collapsed.
+        self.singleflight = SingleFlight() if coalesce else None
+
+        # If set to a hetzner.util.hedge.Hedger, slow GET requests are sent
+        # a second time on another connection.
+        self.hedger = hedger
+
+        # Circuit breakers per host and endpoint class, which are shared with
+        # the web interface sessions, see hetzner.util.circuit.
+        if breakers is None:
+            breakers = CircuitBreakers()
+        self.breakers = breakers
         self.logger = logging.getLogger("Robot of {0}".format(user))
 
         # Provide this as a way to easily add unsupported API features.
-        self.scraper = RobotWebInterface(user, passwd)
+        self.scraper = RobotWebInterface(user, passwd, breakers)
+
+        # Sessions for scraping from multiple threads, the first one being
+        # the session above.
+        self.scrapers = RobotWebInterfacePool(user, passwd, breakers=breakers)
+        self.scrapers.add(self.scraper)
+
+    def scraper_pool(self, size=4):
+        """
+        Return a new pool of web interface sessions using the credentials of
+        this connection, see RobotWebInterfacePool.
+        """
+        return RobotWebInterfacePool(self.user, self.passwd, size,
+                                     self.breakers)
+
+    def connect(self):
+        """
+        Make sure there is an established connection to the Robot in the
+        pool, so that the next request doesn't need to wait for the TLS
+        handshake.
+        """
+        with self.pool.connection() as conn:
+            if conn.sock is None:
+                conn.connect()
 
-    def _request(self, method, path, data, headers, retry=1):
-        self.conn.request(method.upper(), path, data, headers)
+    def _request(self, conn, method, path, data, headers, retry=1):
         try:
-            return self.conn.getresponse()
-        except BadStatusLine:
+            conn.request(method.upper(), path, data, headers)
+            return conn.getresponse()
+        except (BadStatusLine, ConnectionError):
             # XXX: Sometimes, the API server seems to have a problem with
-            # keepalives.
-            if retry <= 0:
+            # keepalives. We can't tell whether the request has been
+            # processed anyway, so only retry if doing so is harmless.
+            if retry <= 0 or method.upper() not in IDEMPOTENT_METHODS:
                 raise
 
-            self.conn.close()
-            self.conn.connect()
-            return self._request(method, path, data, headers, retry - 1)
+            conn.close()
+            deadline.apply(conn, self.timeout)
+            conn.connect()
+            return self._request(conn, method, path, data, headers,
+                                 retry - 1)
 
     def _encode_phpargs(self, node, path=[]):
         """
@@ -333,7 +541,13 @@ class RobotConnection(object):
         []
         >>> enc({'a': [1, 2, 3], 'b': {'c': 4}})
         [('a[0]', 1), ('a[1]', 2), ('a[2]', 3), ('b[c]', 4)]
+        >>> enc({'a': True, 'b': [False]})
+        [('a', 'true'), ('b[0]', 'false')]
         """
+        if isinstance(node, bool):
+            # The Robot only understands booleans spelled in lowercase.
+            node = 'true' if node else 'false'
+
         if isinstance(node, list):
             enum = enumerate(node)
         elif isinstance(node, dict):
@@ -348,7 +562,11 @@ class RobotConnection(object):
         encoded = [self._encode_phpargs(v, path + [k]) for k, v in enum]
         return functools.reduce(lambda a, b: a.update(b) or a, encoded, {})
 
-    def request(self, method, path, data=None, allow_empty=False):
+    def _prepare(self, method, path, data):
+        """
+        Return a tuple of the encoded request body and the request headers
+        for the given 'data'.
+        """
         if data is not None:
             data = urlencode(self._encode_phpargs(data))
 
@@ -357,14 +575,88 @@ class RobotConnection(object):
         ).decode('ascii'))
 
         headers = {'Authorization': auth}
+        if self.compress:
+            headers['Accept-Encoding'] = compression.ACCEPT_ENCODING
 
         if data is not None:
             headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
         self.logger.debug("Sending %s request to Robot at %s with data %r.",
                           method, path, data)
-        response = self._request(method, path, data, headers)
-        raw_data = response.read().decode('utf-8')
+        return data, headers
+
+    def _raise_for_status(self, response, data):
+        """
+        Raise a RobotError if the given 'response' doesn't have a successful
+        status code, using the error information from the decoded 'data'.
+        """
+        if 200 <= response.status < 300:
+            return
+
+        error = data.get('error', None)
+        if error is None:
+            raise RobotError("Unknown error: {0}".format(data),
+                             response.status)
+        else:
+            err = "{0} - {1}".format(error['status'], error['message'])
+            missing = error.get('missing', [])
+            invalid = error.get('invalid', [])
+            fields = []
+            if missing is not None:
+                fields += missing
+            if invalid is not None:
+                fields += invalid
+            if len(fields) > 0:
+                err += ", fields: {0}".format(', '.join(fields))
+            if error.get('code') == 'RATE_LIMIT_EXCEEDED':
+                raise RateLimitError(err, response.status,
+                                     error.get('max_request'),
+                                     error.get('interval'))
+            raise RobotError(err, response.status)
+
+    def _record_compression(self, body):
+        """
+        Add the byte counts of the DecodingReader 'body' to the compression
+        statistics of this connection.
+        """
+        with self._stats_lock:
+            stats = self.compression_stats
+            stats['responses'] += 1
+            if body.encoding != 'identity':
+                stats['compressed'] += 1
+            stats['wire_bytes'] += body.wire_bytes
+            stats['decoded_bytes'] += body.decoded_bytes
+        if body.encoding != 'identity' and body.ratio is not None:
+            self.logger.debug("Received %d bytes of %s data, decoded to %d"
+                              " bytes (ratio %.2f).", body.wire_bytes,
+                              body.encoding, body.decoded_bytes, body.ratio)
+
+    def _read_body(self, body, conn, until=None):
+        """
+        Read the whole DecodingReader 'body' of a response received on
+        'conn' in chunks and limit every further read to the time left until
+        the deadline 'until' (the current one by default), so that a slowly
+        trickling response can't take longer than the deadline.
+        """
+        chunks = []
+        while True:
+            chunk = body.read1(16384)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+            deadline.apply(conn, self.timeout, until)
+
+    def _decode(self, response, conn, allow_empty=False, until=None):
+        try:
+            body = compression.decoding_reader(response)
+            try:
+                raw_data = self._read_body(body, conn, until).decode('utf-8')
+            finally:
+                self._record_compression(body)
+        except ValueError as err:
+            msg = "Unable to decode response (status {0}): {1}"
+            raise RobotError(msg.format(response.status, err),
+                             response.status)
         if len(raw_data) == 0 and not allow_empty:
             msg = "Empty response, status {0}."
             raise RobotError(msg.format(response.status), response.status)
@@ -380,29 +672,124 @@ class RobotConnection(object):
             "Got response from Robot with status %d and data %r.",
             response.status, data
         )
+        return data
+
+    def _send(self, method, path, data, allow_empty):
+        data, headers = self._prepare(method, path, data)
+        breaker = self.breakers.for_request(ROBOT_HOST, path)
+        with breaker.guard(is_outage):
+            with self.pool.connection() as conn:
+                deadline.apply(conn, self.timeout)
+                response = self._request(conn, method, path, data, headers)
+                data = self._decode(response, conn, allow_empty)
+            self._raise_for_status(response, data)
+        return data
+
+    def _request_timeout(self, timeout):
+        """
+        Return the shorter one of 'timeout' and the timeout of this
+        connection, either of which may be None.
+        """
+        if timeout is None or (self.timeout is not None and
+                               self.timeout < timeout):
+            return self.timeout
+        return timeout
 
-        if 200 <= response.status < 300:
-            return data
-        else:
-            error = data.get('error', None)
-            if error is None:
-                raise RobotError("Unknown error: {0}".format(data),
-                                 response.status)
-            else:
-                err = "{0} - {1}".format(error['status'], error['message'])
-                missing = error.get('missing', [])
-                invalid = error.get('invalid', [])
-                fields = []
-                if missing is not None:
-                    fields += missing
-                if invalid is not None:
-                    fields += invalid
-                if len(fields) > 0:
-                    err += ", fields: {0}".format(', '.join(fields))
-                raise RobotError(err, response.status)
-
-    def get(self, path):
-        return self.request('GET', path)
+    def request(self, method, path, data=None, allow_empty=False,
+                timeout=None):
+        """
+        Send a request to the Robot and return the decoded response.
+
+        Connecting, the TLS handshake, sending the request and reading the
+        response must not take longer than 'timeout' seconds, the timeout of
+        this connection or the deadline of the current thread (see
+        hetzner.util.deadline), whichever ends first. Otherwise a
+        DeadlineExceeded exception is raised.
+
+        While the circuit breaker for the endpoint is open, because requests
+        to it have been failing, CircuitOpen is raised without sending the
+        request, see hetzner.util.circuit.
+
+        GET requests are coalesced with identical ones in progress and
+        hedged if a Hedger has been set.
+        """
+        def send():
+            return self._send(method, path, data, allow_empty)
+
+        with deadline.deadline(self._request_timeout(timeout)):
+            try:
+                if method.upper() != 'GET' or data is not None:
+                    return send()
+                if self.hedger is not None:
+                    send = functools.partial(self.hedger.call, send)
+                if self.singleflight is not None:
+                    return self.singleflight.do((path, allow_empty), send,
+                                                deadline.check())
+                return send()
+            except socket.timeout:
+                raise DeadlineExceeded("{0} request for {1} timed out."
+                                       .format(method.upper(), path))
+
+    def request_iter(self, method, path, data=None, timeout=None):
+        """
+        Send a request just like request(), but expect the response to be a
+        JSON array and yield its elements while the response body is still
+        being received instead of decoding the whole response at once.
+
+        The connection used for the request is taken out of the pool until
+        the returned generator has been exhausted or closed. The deadline
+        (see request()) is determined when iteration starts and covers the
+        whole response.
+        """
+        until = deadline.expiry(self._request_timeout(timeout))
+        data, headers = self._prepare(method, path, data)
+
+        def chunks(body, conn):
+            try:
+                for chunk in jsonstream.iter_chunks(body):
+                    yield chunk
+                    deadline.apply(conn, self.timeout, until)
+            finally:
+                self._record_compression(body)
+
+        breaker = self.breakers.for_request(ROBOT_HOST, path)
+        with breaker.guard(is_outage), self.pool.connection() as conn:
+            try:
+                deadline.apply(conn, self.timeout, until)
+                response = self._request(conn, method, path, data, headers)
+                if not 200 <= response.status < 300:
+                    data = self._decode(response, conn, until=until)
+                    self._raise_for_status(response, data)
+            except socket.timeout:
+                raise DeadlineExceeded("{0} request for {1} timed out."
+                                       .format(method.upper(), path))
+
+            self.logger.debug("Streaming response from Robot with status %d.",
+                              response.status)
+            try:
+                body = compression.decoding_reader(response)
+                for item in jsonstream.iter_json_array(chunks(body, conn)):
+                    yield item
+            except ValueError as err:
+                msg = "Response is not a JSON array (status {0}): {1}"
+                raise RobotError(msg.format(response.status, err))
+            except socket.timeout:
+                raise DeadlineExceeded("Streaming response for {0} timed"
+                                       " out.".format(path))
+            finally:
+                # Drain whatever is left so the keep-alive connection is
+                # usable again even if the consumer has stopped early.
+                try:
+                    while response.read(16384):
+                        pass
+                except (socket.error, DeadlineExceeded):
+                    conn.close()
+
+    def get(self, path, timeout=None):
+        return self.request('GET', path, timeout=timeout)
+
+    def get_iter(self, path, timeout=None):
+        return self.request_iter('GET', path, timeout=timeout)
 
     def post(self, path, data):
         return self.request('POST', path, data)
@@ -425,12 +812,42 @@ class ServerManager(object):
         return Server(self.conn, self.conn.get('/server/{0}'.format(ip)))
 
     def __iter__(self):
-        return iter([Server(self.conn, s) for s in self.conn.get('/server')])
+        for server in self.conn.get_iter('/server'):
+            yield Server(self.conn, server)
 
 
 class Robot(object):
-    def __init__(self, user, passwd):
-        self.conn = RobotConnection(user, passwd)
+    def __init__(self, user, passwd, timeout=None):
+        self._attach(RobotConnection(user, passwd, timeout=timeout))
+
+    @classmethod
+    def from_connection(cls, conn):
+        """
+        Create a Robot using an existing connection object, for example a
+        SnapshotConnection answering requests offline.
+        """
+        robot = cls.__new__(cls)
+        robot._attach(conn)
+        return robot
+
+    def deadline(self, timeout):
+        """
+        Context manager limiting all requests within to a total of 'timeout'
+        seconds, including nested calls of model objects and retries:
+
+        >>> robot = Robot('user', 'passwd')
+        >>> with robot.deadline(0):
+        ...     robot.servers.get('1.2.3.4')
+        Traceback (most recent call last):
+          ...
+        hetzner.DeadlineExceeded: Request exceeded its deadline.
+        """
+        return deadline.deadline(timeout)
+
+    def _attach(self, conn):
+        self.conn = conn
         self.servers = ServerManager(self.conn)
         self.rdns = ReverseDNSManager(self.conn)
         self.failover = FailoverManager(self.conn, self.servers)
+        self.vswitch = VSwitchManager(self.conn)
+        self.firewall = FirewallManager(self.conn)
@@ -1,12 +1,8 @@
 import os
-import re
-import random
-import string
-import subprocess
+import copy
 import warnings
 import logging
 
-from tempfile import mkdtemp
 from datetime import datetime
 from functools import reduce
 
@@ -16,6 +12,8 @@ except ImportError:
     from urllib.parse import urlencode
 
 from hetzner import RobotError, WebRobotError
+from hetzner.boot import BootManager
+from hetzner.model import DETACHED, Model
 from hetzner.rdns import ReverseDNS, ReverseDNSManager
 from hetzner.reset import Reset
 from hetzner.util import addr, scraping
@@ -35,6 +33,7 @@ class SSHAskPassHelper(object):
         self.script = None
 
     def __enter__(self):
+        from tempfile import mkdtemp
         self.tempdir = mkdtemp()
         script = os.path.join(self.tempdir, "askpass")
         fd = os.open(script, os.O_WRONLY | os.O_CREAT | os.O_NOFOLLOW, 0o700)
@@ -151,6 +150,7 @@ class RescueSystem(object):
         warnings.warn(msg, FutureWarning)
         self.observed_activate(*args, **kwargs)
 
+        import subprocess
         with SSHAskPassHelper(self.password) as askpass:
             ssh_options = [
                 'CheckHostIP=no',
@@ -170,36 +170,73 @@ class RescueSystem(object):
         self.observed_deactivate(*args, **kwargs)
 
 
-class AdminAccount(object):
-    def __init__(self, server):
+class AdminAccount(Model):
+    def __init__(self, server, scraper=None):
+        """
+        Manage the admin account of 'server' by scraping the web interface,
+        either using the default session of the server's connection or the
+        RobotWebInterface session given by 'scraper', for example one that
+        has been acquired from a RobotWebInterfacePool.
+        """
         # XXX: This is preliminary, because we don't have such functionality in
         #      the official API yet.
-        self._scraper = server.conn.scraper
+        if scraper is None:
+            scraper = server.conn.scraper
+        self._scraper = scraper
         self._serverid = server.number
         self.exists = False
         self.login = None
         self.passwd = None
         self.update_info()
 
+    def _attach(self, conn):
+        self._scraper = conn if conn is DETACHED else conn.scraper
+
+    @property
+    def detached(self):
+        return self._scraper is DETACHED
+
+    def to_dict(self, include_passwd=False):
+        """
+        Return the account as a dictionary, which only contains the password
+        if 'include_passwd' is True. Pickled accounts never contain it.
+        """
+        data = {'server_number': self._serverid, 'exists': self.exists,
+                'login': self.login}
+        if include_passwd:
+            data['passwd'] = self.passwd
+        return {'admin': data}
+
+    def _restore(self, data):
+        data = data['admin']
+        self._serverid = data['server_number']
+        self.exists = data['exists']
+        self.login = data['login']
+        # Keep a password we know already, e.g. when being attached again.
+        self.passwd = data.get('passwd', getattr(self, 'passwd', None))
+
     def update_info(self):
         """
         Get information about currently active admin login.
         """
         self._scraper.login()
-        login_re = re.compile(r'"label_req">Login.*?"element">([^<]+)',
-                              re.DOTALL)
 
         path = '/server/admin/id/{0}'.format(self._serverid)
         response = self._scraper.request(path)
         assert response.status == 200
-        match = login_re.search(response.read().decode('utf-8'))
-        if match is None:
+        extractor = scraping.StreamingExtractor(
+            login=scraping.LabelledValue('Login')
+        )
+        login = extractor.extract(response)['login']
+        if login is None:
             self.exists = False
         else:
             self.exists = True
-            self.login = match.group(1)
+            self.login = login
 
     def _genpasswd(self):
+        import random
+        import string
         random.seed(os.urandom(512))
         chars = string.ascii_letters + string.digits + "/()-=+_,;.^~#*@"
         length = random.randint(20, 40)
@@ -216,14 +253,16 @@ class AdminAccount(object):
         form_path = '/server/admin/id/{0}'.format(self._serverid)
         form_response = self._scraper.request(form_path, method='POST')
 
-        parser = scraping.CSRFParser('password[_csrf_token]')
-        parser.feed(form_response.read().decode('utf-8'))
-        assert parser.csrf_token is not None
+        extractor = scraping.StreamingExtractor(
+            token=scraping.InputValue('password[_csrf_token]')
+        )
+        csrf_token = extractor.extract(form_response)['token']
+        assert csrf_token is not None
 
         data = {
             'password[new_password]': passwd,
             'password[new_password_repeat]': passwd,
-            'password[_csrf_token]': parser.csrf_token,
+            'password[_csrf_token]': csrf_token,
         }
 
         if not self.exists:
@@ -235,16 +274,16 @@ class AdminAccount(object):
             data['id'] = self._serverid
 
         response = self._scraper.request(path, data)
-        data = response.read().decode('utf-8')
-        if "msgbox_success" not in data:
-            ul_re = re.compile(r'<ul\s+class="error_list">(.*?)</ul>',
-                               re.DOTALL)
-            li_re = re.compile(r'<li>\s*([^<]*?)\s*</li>')
-            ul_match = ul_re.search(data)
-            if ul_match is not None:
-                errors = [error.group(1)
-                          for error in li_re.finditer(ul_match.group(0))]
-                msg = failmsg + ': ' + ', '.join(errors)
+        extractor = scraping.StreamingExtractor(
+            success=scraping.ClassPresent('msgbox_success'),
+            errors=scraping.ListItems('error_list'),
+        )
+        result = extractor.extract(
+            response, until=lambda e: any(f.found for f in e.fields.values())
+        )
+        if not result['success']:
+            if result['errors'] is not None:
+                msg = failmsg + ': ' + ', '.join(result['errors'])
                 raise WebRobotError(msg)
             raise WebRobotError(failmsg)
         self.update_info()
@@ -258,8 +297,10 @@ class AdminAccount(object):
         if not self.exists:
             return
         path = '/server/adminDelete/id/{0}'.format(self._serverid)
-        assert "msgbox_success" in \
-            self._scraper.request(path).read().decode('utf-8')
+        extractor = scraping.StreamingExtractor(
+            success=scraping.ClassPresent('msgbox_success')
+        )
+        assert extractor.extract(self._scraper.request(path))['success']
         self.update_info()
 
     def __repr__(self):
@@ -269,7 +310,7 @@ class AdminAccount(object):
             return "<AdminAccount missing>"
 
 
-class IpAddress(object):
+class IpAddress(Model):
     def __init__(self, conn, result, subnet_ip=None):
         self.conn = conn
         self.subnet_ip = subnet_ip
@@ -285,6 +326,18 @@ class IpAddress(object):
             self._rdns = ReverseDNS(self.conn, self.ip)
         return self._rdns
 
+    def to_dict(self):
+        data = copy.deepcopy(self._result)
+        if self.subnet_ip is not None:
+            data['subnet_ip'] = self.subnet_ip
+        return data
+
+    def _restore(self, data):
+        data = dict(data)
+        self.subnet_ip = data.pop('subnet_ip', None)
+        self.update_info(data)
+        self._rdns = None
+
     def update_info(self, result=None):
         """
         Update the information of the current IP address and all related
@@ -294,7 +347,7 @@ class IpAddress(object):
         if self.subnet_ip is not None:
             if result is None:
                 result = self.conn.get('/subnet/{0}'.format(self._subnet_addr))
-            data = result['subnet']
+            data = dict(result['subnet'])
             self._subnet_addr = data['ip']
             data['ip'] = self.subnet_ip
             # Does not exist in subnets
@@ -304,6 +357,7 @@ class IpAddress(object):
                 result = self.conn.get('/ip/{0}'.format(self.ip))
             data = result['ip']
 
+        self._result = result
         self.ip = data['ip']
         self.server_ip = data['server_ip']
         self.locked = data['locked']
@@ -334,11 +388,17 @@ class IpManager(object):
         return iter([IpAddress(self.conn, ip) for ip in result])
 
 
-class Subnet(object):
+class Subnet(Model):
     def __init__(self, conn, result):
         self.conn = conn
         self.update_info(result)
 
+    def to_dict(self):
+        return copy.deepcopy(self._result)
+
+    def _restore(self, data):
+        self.update_info(data)
+
     def update_info(self, result=None):
         """
         Update the information of the subnet. If result is omitted, a new
@@ -349,6 +409,7 @@ class Subnet(object):
 
         data = result['subnet']
 
+        self._result = result
         self.net_ip = data['ip']
         self.mask = data['mask']
         self.gateway = data['gateway']
@@ -419,11 +480,18 @@ class SubnetManager(object):
         return iter([Subnet(self.conn, net) for net in result])
 
 
-class Server(object):
+class Server(Model):
     def __init__(self, conn, result):
         self.conn = conn
-        self.update_info(result)
+        self._restore(result)
+
+    def to_dict(self):
+        return copy.deepcopy(self._result)
+
+    def _restore(self, data):
+        self.update_info(data)
         self.rescue = RescueSystem(self)
+        self.boot = BootManager(self)
         self.reset = Reset(self)
         self.ips = IpManager(self.conn, self.ip)
         self.subnets = SubnetManager(self.conn, self.ip)
@@ -450,6 +518,7 @@ class Server(object):
 
         data = result['server']
 
+        self._result = result
         self.ip = data['server_ip']
         self.number = data['server_number']
         self.name = data['server_name']
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+try:
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:
+    from urlparse import urlsplit, parse_qs
+
+from hetzner import RobotError
+from hetzner.collection import RESOURCES, AddressMap, iter_collection
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['Snapshot', 'SnapshotConnection', 'default_snapshot_path']
+
+# Table and indexed columns for every resource, the first column being the
+# primary key. The raw item as returned by the Robot is stored as JSON in an
+# additional 'data' column.
+TABLES = {
+    'server': ('servers', ['server_ip', 'server_number', 'server_name',
+                           'product', 'dc', 'status']),
+    'ip': ('ips', ['ip', 'server_ip']),
+    'subnet': ('subnets', ['ip', 'server_ip']),
+    'rdns': ('rdns', ['ip', 'ptr']),
+    'failover': ('failovers', ['ip', 'server_ip', 'active_server_ip']),
+    'reset': ('resets', ['server_ip', 'server_number']),
+}
+
+SCHEMA_VERSION = 1
+
+
+def default_snapshot_path():
+    """
+    Return the default location of the snapshot database, which is within
+    $XDG_CACHE_HOME or ~/.cache.
+    """
+    cache_dir = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'hetzner', 'snapshot.sqlite')
+
+
+class Snapshot(object):
+    """
+    Local copy of the state of a Robot account in an SQLite database at
+    'path', which is filled using as few collection requests as possible.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = default_snapshot_path()
+        dirname = os.path.dirname(path)
+        if dirname != '' and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger("Snapshot at {0}".format(path))
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.lock, self.db:
+            version = self.db.execute('PRAGMA user_version').fetchone()[0]
+            if version == SCHEMA_VERSION:
+                return
+            for table, columns in TABLES.values():
+                self.db.execute('DROP TABLE IF EXISTS {0}'.format(table))
+                coldefs = [columns[0] + ' TEXT PRIMARY KEY']
+                coldefs += [col + ' TEXT' for col in columns[1:]]
+                coldefs.append('data TEXT NOT NULL')
+                self.db.execute('CREATE TABLE {0} ({1})'
+                                .format(table, ', '.join(coldefs)))
+                for col in columns[1:]:
+                    self.db.execute('CREATE INDEX {0}_{1} ON {0} ({1})'
+                                    .format(table, col))
+            self.db.execute('DROP TABLE IF EXISTS fetches')
+            self.db.execute('CREATE TABLE fetches (resource TEXT PRIMARY KEY,'
+                            ' fetched_at REAL NOT NULL,'
+                            ' count INTEGER NOT NULL)')
+            self.db.execute('PRAGMA user_version = {0}'
+                            .format(SCHEMA_VERSION))
+
+    def store(self, resource, items):
+        """
+        Replace all stored items of 'resource' with the raw items from the
+        iterable 'items' and record the current time as the time of the
+        fetch. Returns the number of stored items.
+        """
+        table, columns = TABLES[resource]
+        wrapper = RESOURCES[resource][1]
+        query = 'INSERT OR REPLACE INTO {0} ({1}, data) VALUES ({2})'.format(
+            table, ', '.join(columns), ', '.join(['?'] * (len(columns) + 1))
+        )
+
+        # Fetch the items before taking the lock, so concurrent refreshes
+        # of other resources don't need to wait for the network.
+        rows = [[item[wrapper].get(col) for col in columns] +
+                [json.dumps(item)] for item in items]
+
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM {0}'.format(table))
+            self.db.executemany(query, rows)
+            self.db.execute('INSERT OR REPLACE INTO fetches VALUES (?, ?, ?)',
+                            (resource, time.time(), len(rows)))
+        return len(rows)
+
+    def fetched_at(self, resource=None):
+        """
+        Return the time of the last fetch of 'resource' as a UNIX timestamp
+        or None if it hasn't been fetched yet. If 'resource' is None, return
+        a dictionary of all fetch times.
+        """
+        with self.lock:
+            rows = self.db.execute('SELECT resource, fetched_at'
+                                   ' FROM fetches').fetchall()
+        fetches = dict(rows)
+        if resource is None:
+            return fetches
+        return fetches.get(resource)
+
+    def stale_resources(self, max_age=None, resources=None):
+        """
+        Return the resources which have never been fetched or whose last
+        fetch is older than 'max_age' seconds.
+        """
+        if resources is None:
+            resources = sorted(TABLES.keys())
+        fetches = self.fetched_at()
+        now = time.time()
+        return [resource for resource in resources
+                if resource not in fetches or
+                (max_age is not None and now - fetches[resource] > max_age)]
+
+    def refresh(self, conn, resources=None, max_age=None, jobs=None):
+        """
+        Fetch the given resources (all by default) from the Robot using the
+        RobotConnection 'conn', with one request per resource, sent
+        concurrently. If 'max_age' is given, only resources which are older
+        than 'max_age' seconds are refreshed.
+
+        Returns a dictionary mapping the refreshed resources to either the
+        number of stored items or the exception that occured while fetching
+        them.
+        """
+        if resources is None:
+            resources = sorted(TABLES.keys())
+        if max_age is not None:
+            resources = self.stale_resources(max_age, resources)
+        if len(resources) == 0:
+            return {}
+
+        def refresh_resource(resource):
+            count = self.store(resource, iter_collection(conn, resource))
+            self.logger.debug("Stored %d items of %s.", count, resource)
+            return count
+
+        result = {}
+        for task in run_parallel(refresh_resource, resources,
+                                 jobs or len(resources)):
+            result[task.item] = task.value if task.error is None \
+                else task.error
+        return result
+
+    def query(self, resource, where=None, params=()):
+        """
+        Return the raw items of 'resource', optionally restricted by an SQL
+        'where' clause on the indexed columns (see TABLES).
+        """
+        table = TABLES[resource][0]
+        sql = 'SELECT data FROM {0}'.format(table)
+        if where is not None:
+            sql += ' WHERE ' + where
+        sql += ' ORDER BY ' + TABLES[resource][1][0]
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def connection(self):
+        """
+        Return a read-only connection answering requests from the snapshot,
+        which can be used in place of a RobotConnection.
+        """
+        return SnapshotConnection(self)
+
+    def robot(self):
+        """
+        Return a Robot instance answering all reads from the snapshot.
+        """
+        from hetzner.robot import Robot
+        return Robot.from_connection(self.connection())
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class SnapshotConnection(object):
+    """
+    Connection object answering GET requests the same way as the Robot API
+    would, but from a Snapshot. All other requests raise a RobotError.
+    """
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.user = None
+        self.logger = logging.getLogger("Snapshot connection")
+        self.scraper = None
+
+    def _one(self, resource, column, value):
+        result = self.snapshot.query(resource, column + ' = ?', (value,))
+        if len(result) == 0:
+            raise RobotError("{0} {1} not found in snapshot."
+                             .format(resource, value), 404)
+        return result[0]
+
+    def _collection(self, resource, server_ip=None):
+        if self.snapshot.fetched_at(resource) is None:
+            raise RobotError("No {0} data in snapshot, please refresh it"
+                             " first.".format(resource))
+        if server_ip is None:
+            result = self.snapshot.query(resource)
+        else:
+            result = self.snapshot.query(resource, 'server_ip = ?',
+                                         (server_ip,))
+        if len(result) == 0:
+            raise RobotError("No {0} found in snapshot.".format(resource),
+                             404)
+        return result
+
+    def _rdns_of_server(self, server_ip):
+        where = ('server_ip = ?', (server_ip,))
+        amap = AddressMap(self.snapshot.query('ip', *where),
+                          self.snapshot.query('subnet', *where))
+        result = [item for item in self._collection('rdns')
+                  if amap.server_ip(item['rdns']['ip']) == server_ip]
+        if len(result) == 0:
+            raise RobotError("No rdns found in snapshot.", 404)
+        return result
+
+    def get(self, path):
+        url = urlsplit(path)
+        parts = url.path.strip('/').split('/')
+        server_ip = parse_qs(url.query).get('server_ip', [None])[0]
+        resource = parts[0]
+
+        if resource not in RESOURCES or len(parts) > 2:
+            raise RobotError("Request for {0} can't be answered from"
+                             " snapshot.".format(path))
+
+        if len(parts) == 1:
+            if resource == 'rdns' and server_ip is not None:
+                return self._rdns_of_server(server_ip)
+            return self._collection(resource, server_ip)
+
+        key = parts[1]
+        if resource == 'server':
+            column = 'server_number' if key.isdigit() else 'server_ip'
+            return self._one('server', column, key)
+        elif resource == 'reset':
+            column = 'server_number' if key.isdigit() else 'server_ip'
+            result = self._one('reset', column, key)
+            # The collection doesn't contain the operating status.
+            result['reset'].setdefault('operating_status', None)
+            return result
+        return self._one(resource, TABLES[resource][1][0], key)
+
+    def get_iter(self, path):
+        return iter(self.get(path))
+
+    def request(self, method, path, data=None, allow_empty=False):
+        if method.upper() == 'GET':
+            return self.get(path)
+        raise RobotError("Snapshots are read-only, can't send {0} request"
+                         " for {1}.".format(method.upper(), path))
+
+    def post(self, path, data):
+        return self.request('POST', path, data)
+
+    def put(self, path, data):
+        return self.request('PUT', path, data)
+
+    def delete(self, path, data=None):
+        return self.request('DELETE', path, data)
+
+    def connect(self):
+        pass
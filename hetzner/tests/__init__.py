@@ -1 +1,21 @@
+from hetzner.tests.test_exporter import *  # NOQA
+from hetzner.tests.test_failover import *  # NOQA
+from hetzner.tests.test_firewall import *  # NOQA
+from hetzner.tests.test_hetznerctl import *  # NOQA
+from hetzner.tests.test_inventory import *  # NOQA
+from hetzner.tests.test_model import *  # NOQA
+from hetzner.tests.test_multi import *  # NOQA
+from hetzner.tests.test_provision import *  # NOQA
+from hetzner.tests.test_rdns import *  # NOQA
+from hetzner.tests.test_snapshot import *  # NOQA
+from hetzner.tests.test_startup import *  # NOQA
 from hetzner.tests.test_util_addr import *  # NOQA
+from hetzner.tests.test_util_circuit import *  # NOQA
+from hetzner.tests.test_util_compression import *  # NOQA
+from hetzner.tests.test_util_deadline import *  # NOQA
+from hetzner.tests.test_util_hedge import *  # NOQA
+from hetzner.tests.test_util_scraping import *  # NOQA
+from hetzner.tests.test_util_singleflight import *  # NOQA
+from hetzner.tests.test_vswitch import *  # NOQA
+from hetzner.tests.test_watch import *  # NOQA
+from hetzner.tests.test_webinterface import *  # NOQA
@@ -0,0 +1,71 @@
+import unittest
+
+from hetzner import RobotError
+from hetzner.exporter import MetricsPoller
+
+COLLECTIONS = {
+    '/server': [
+        {'server': {'server_ip': '1.0.0.1', 'server_number': 321,
+                    'server_name': 'foo', 'product': 'EX', 'dc': 'FSN1',
+                    'status': 'ready', 'cancelled': False,
+                    'paid_until': '2030-01-01'}},
+    ],
+    '/ip': [
+        {'ip': {'ip': '1.0.0.1', 'server_ip': '1.0.0.1', 'locked': True,
+                'traffic_warnings': True, 'traffic_hourly': 200,
+                'traffic_daily': None, 'traffic_monthly': 2}},
+    ],
+    '/failover': [
+        {'failover': {'ip': '9.9.9.9', 'server_ip': '1.0.0.1',
+                      'active_server_ip': '1.0.0.2'}},
+    ],
+}
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.requests = []
+
+    def get(self, path):
+        self.requests.append(path)
+        return {'reset': {'operating_status': 'running'}}
+
+    def get_iter(self, path):
+        self.requests.append(path)
+        if path not in COLLECTIONS:
+            raise RobotError("Not found", 404)
+        return iter(COLLECTIONS[path])
+
+
+class MetricsPollerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.poller = MetricsPoller(self.conn, reset_interval=300)
+
+    def test_no_output_before_poll(self):
+        self.assertIsNone(self.poller.output)
+
+    def test_metrics(self):
+        self.poller.poll()
+        lines = self.poller.output.decode('utf-8').splitlines()
+        for expected in [
+            'hetzner_server_status{server_ip="1.0.0.1",status="ready"} 1',
+            'hetzner_server_cancelled{server_ip="1.0.0.1"} 0',
+            'hetzner_server_paid_until_timestamp_seconds'
+            '{server_ip="1.0.0.1"} 1893456000',
+            'hetzner_server_running{server_ip="1.0.0.1"} 1',
+            'hetzner_failover_routed_home{ip="9.9.9.9"} 0',
+            'hetzner_ip_locked{ip="1.0.0.1",server_ip="1.0.0.1"} 1',
+            'hetzner_ip_traffic_warning_threshold_bytes'
+            '{ip="1.0.0.1",period="monthly",server_ip="1.0.0.1"} 2147483648',
+            '# TYPE hetzner_exporter_errors_total counter',
+        ]:
+            self.assertIn(expected, lines)
+
+    def test_collection_requests(self):
+        self.poller.poll()
+        self.poller.poll()
+        self.assertEqual(sorted(self.conn.requests),
+                         ['/failover', '/failover', '/ip', '/ip',
+                          '/reset/321', '/server', '/server', '/subnet',
+                          '/subnet'])
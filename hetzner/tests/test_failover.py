@@ -0,0 +1,140 @@
+import unittest
+
+from hetzner import RateLimitError, RobotError
+from hetzner.failover import Failover, FailoverController
+from hetzner.robot import RobotConnection
+
+
+class FakeFailoverManager(object):
+    def __init__(self, active):
+        self.active = active
+        self.switches = []
+        self.fetched = []
+        self.rate_limited = False
+
+    def get(self, ip):
+        self.fetched.append(ip)
+        if ip != '9.9.9.9':
+            raise RobotError("Not found", 404)
+        return Failover({'ip': ip, 'active_server_ip': self.active})
+
+    def switch(self, ip, new_destination, validate=True):
+        if self.rate_limited:
+            raise RateLimitError("rate limited", 403, 10, 100)
+        self.switches.append(new_destination)
+        self.active = new_destination
+        return Failover({'ip': ip, 'active_server_ip': self.active}), 0.1
+
+
+class FailoverControllerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.manager = FakeFailoverManager('1.0.0.1')
+        self.up = {'1.0.0.1': True, '1.0.0.2': True}
+        self.controller = FailoverController(
+            self.manager, '9.9.9.9', ['1.0.0.1', '1.0.0.2'],
+            lambda dest: self.up[dest], rise=2, fall=2, hold_time=0
+        )
+
+    def run_steps(self, count):
+        return [self.controller.step() for _ in range(count)]
+
+    def test_switch_on_failure(self):
+        self.run_steps(2)
+        self.up['1.0.0.1'] = False
+        self.assertEqual(self.run_steps(3), [False, True, False])
+        self.assertEqual(self.manager.switches, ['1.0.0.2'])
+        self.assertEqual(self.controller.active, '1.0.0.2')
+        self.assertIsNotNone(self.controller.stats['last_failover_latency'])
+        # The failover IP is only fetched once per refresh interval.
+        self.assertEqual(self.manager.fetched, ['9.9.9.9'])
+
+    def test_check_raises(self):
+        def check(dest):
+            if not self.up[dest]:
+                raise ValueError("broken check")
+            return True
+
+        self.controller.check = check
+        self.run_steps(2)
+        self.up['1.0.0.1'] = False
+        self.assertEqual(self.run_steps(3), [False, True, False])
+        self.assertEqual(self.manager.switches, ['1.0.0.2'])
+
+    def test_not_a_failover_ip(self):
+        self.controller.ip = '8.8.8.8'
+        self.assertRaises(RobotError, self.controller.refresh)
+
+    def test_no_preempt(self):
+        self.run_steps(2)
+        self.up['1.0.0.1'] = False
+        self.run_steps(2)
+        self.up['1.0.0.1'] = True
+        self.run_steps(3)
+        self.assertEqual(self.manager.switches, ['1.0.0.2'])
+
+    def test_preempt(self):
+        self.controller.preempt = True
+        self.run_steps(2)
+        self.up['1.0.0.1'] = False
+        self.run_steps(2)
+        self.up['1.0.0.1'] = True
+        self.run_steps(2)
+        self.assertEqual(self.manager.switches, ['1.0.0.2', '1.0.0.1'])
+
+    def test_no_usable_destination(self):
+        self.up = {'1.0.0.1': False, '1.0.0.2': False}
+        self.assertEqual(self.run_steps(3), [False, False, False])
+        self.assertEqual(self.manager.switches, [])
+
+    def test_rate_limited(self):
+        self.run_steps(2)
+        self.manager.rate_limited = True
+        self.up['1.0.0.1'] = False
+        self.run_steps(3)
+        self.assertEqual(self.controller.stats['rate_limited'], 1)
+        self.manager.rate_limited = False
+        self.run_steps(1)
+        self.assertEqual(self.manager.switches, [])
+
+
+class DroppingConnection(object):
+    """
+    A connection which is dropped by the server while the first request is
+    sent, like a keep-alive connection the server has just closed.
+    """
+    sock = None
+    timeout = None
+
+    def __init__(self):
+        self.sent = []
+
+    def request(self, method, path, data, headers):
+        self.sent.append(method)
+        if len(self.sent) == 1:
+            raise ConnectionResetError("Connection reset by peer")
+
+    def getresponse(self):
+        return 'response'
+
+    def close(self):
+        pass
+
+    def connect(self):
+        pass
+
+
+class RequestRetryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.robot = RobotConnection('user', 'passwd')
+        self.conn = DroppingConnection()
+
+    def test_retry_idempotent(self):
+        result = self.robot._request(self.conn, 'get', '/failover', None, {})
+        self.assertEqual(result, 'response')
+        self.assertEqual(self.conn.sent, ['GET', 'GET'])
+
+    def test_no_retry_post(self):
+        # Switching a failover IP must not happen twice.
+        self.assertRaises(ConnectionError, self.robot._request, self.conn,
+                          'post', '/failover/9.9.9.9', 'x=y', {})
+        self.assertEqual(self.conn.sent, ['POST'])
@@ -0,0 +1,128 @@
+import copy
+import pickle
+import threading
+import unittest
+
+from hetzner import RobotError
+from hetzner.robot import Robot, RobotConnection
+
+SSH = {'ip_version': 'ipv4', 'name': 'ssh', 'dst_ip': None, 'src_ip': None,
+       'dst_port': '22', 'src_port': None, 'protocol': 'tcp',
+       'tcp_flags': None, 'action': 'accept'}
+WEB = dict(SSH, name='web', dst_port='443')
+
+TEMPLATE = {'id': 7, 'name': 'webserver', 'filter_ipv6': False,
+            'whitelist_hos': True, 'is_default': False,
+            'rules': {'input': [SSH, WEB], 'output': []}}
+
+
+def firewall_result(ip, status='active', rules=None):
+    return {'firewall': {
+        'server_ip': ip, 'server_number': int(ip.rsplit('.', 1)[1]),
+        'status': status, 'filter_ipv6': False, 'whitelist_hos': True,
+        'port': 'main',
+        'rules': {'input': [SSH] if rules is None else rules, 'output': []},
+    }}
+
+
+class FakeConnection(object):
+    def __init__(self, firewalls):
+        self.firewalls = firewalls
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            self.requests.append(('GET', path))
+        parts = path.strip('/').split('/')
+        if parts[1] == 'template':
+            if len(parts) == 2:
+                summary = dict(TEMPLATE)
+                del summary['rules']
+                return [{'firewall_template': summary}]
+            return {'firewall_template': copy.deepcopy(TEMPLATE)}
+        if parts[1] not in self.firewalls:
+            raise RobotError("Server not found", 404)
+        return copy.deepcopy(self.firewalls[parts[1]])
+
+    def post(self, path, data):
+        with self.lock:
+            self.requests.append(('POST', path, data))
+        ip = path.rsplit('/', 1)[1]
+        if 'template_id' in data:
+            rules = TEMPLATE['rules']['input']
+            self.firewalls[ip] = firewall_result(ip, 'in process', rules)
+        else:
+            result = firewall_result(ip, 'in process')
+            result['firewall']['rules'] = data['rules']
+            self.firewalls[ip] = result
+        return copy.deepcopy(self.firewalls[ip])
+
+
+class FirewallTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ips = ['1.0.0.{0}'.format(n) for n in range(1, 6)]
+        firewalls = dict((ip, firewall_result(ip)) for ip in self.ips)
+        # This one already matches the template.
+        firewalls['1.0.0.2'] = firewall_result('1.0.0.2', rules=[SSH, WEB])
+        self.conn = FakeConnection(firewalls)
+        self.robot = Robot.from_connection(self.conn)
+
+    def posts(self):
+        return [r for r in self.conn.requests if r[0] == 'POST']
+
+    def test_get(self):
+        firewall = self.robot.firewall.get('1.0.0.1')
+        self.assertEqual((firewall.status, firewall.port), ('active', 'main'))
+        self.assertEqual(firewall.config['rules']['input'],
+                         [{'ip_version': 'ipv4', 'name': 'ssh',
+                           'dst_port': '22', 'protocol': 'tcp',
+                           'action': 'accept'}])
+        copy = pickle.loads(pickle.dumps(firewall))
+        self.assertEqual(copy.config, firewall.config)
+
+    def test_templates(self):
+        templates = self.robot.firewall.templates()
+        self.assertEqual([t.name for t in templates], ['webserver'])
+        self.assertIsNone(templates[0].rules)
+        self.assertEqual(len(templates[0].config['rules']['input']), 2)
+
+    def test_rollout_template(self):
+        template = self.robot.firewall.template(7)
+        seen = []
+        rollout = self.robot.firewall.rollout(self.ips, template, jobs=3,
+                                              progress=seen.append)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual([r.server for r in rollout.unchanged], ['1.0.0.2'])
+        self.assertEqual(sorted(r.server for r in rollout.updated),
+                         ['1.0.0.1', '1.0.0.3', '1.0.0.4', '1.0.0.5'])
+        self.assertEqual(rollout.updated[0].changes,
+                         ["input rule 2 ('web'): added"])
+        self.assertEqual(len(self.posts()), 4)
+        self.assertTrue(all(r[2] == {'template_id': 7} for r in self.posts()))
+        self.assertIsNotNone(rollout.latency(95))
+
+    def test_rollout_config_dry_run(self):
+        config = {'filter_ipv6': False, 'whitelist_hos': True,
+                  'rules': {'input': [SSH, WEB]}}
+        rollout = self.robot.firewall.rollout(self.ips + ['1.0.0.9'], config,
+                                              dry_run=True)
+        self.assertEqual(len(rollout.updated), 4)
+        self.assertEqual([r.server for r in rollout.failed], ['1.0.0.9'])
+        self.assertEqual(self.posts(), [])
+
+    def test_apply_config(self):
+        firewall = self.robot.firewall.get('1.0.0.1')
+        firewall.apply({'whitelist_hos': True, 'rules': {'input': [WEB]}})
+        data = self.posts()[0][2]
+        self.assertEqual(data['status'], 'active')
+        self.assertEqual(data['rules']['input'][0]['dst_port'], '443')
+        self.assertEqual(firewall.status, 'in process')
+
+    def test_encoding(self):
+        config = self.robot.firewall.get('1.0.0.1').config
+        encoded = RobotConnection(None, None)._encode_phpargs(config)
+        self.assertEqual(encoded['filter_ipv6'], 'false')
+        self.assertEqual(encoded['whitelist_hos'], 'true')
+        self.assertEqual(encoded['rules[input][0][dst_port]'], '22')
+        self.assertNotIn('rules[input][0][src_ip]', encoded)
@@ -0,0 +1,153 @@
+import io
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import unittest
+
+from contextlib import redirect_stdout, redirect_stderr
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+
+from hetzner import RobotError
+from hetzner.snapshot import SnapshotConnection
+
+HETZNERCTL = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__
+    )))),
+    'hetznerctl'
+)
+
+
+def load_hetznerctl():
+    loader = SourceFileLoader('hetznerctl', HETZNERCTL)
+    module = module_from_spec(spec_from_loader('hetznerctl', loader))
+    loader.exec_module(module)
+    return module
+
+
+class FakeServers(object):
+    def __init__(self, failing):
+        self.failing = failing
+
+    def get(self, ip):
+        if ip in self.failing:
+            raise RobotError("Server not found", 404)
+        return ip
+
+    def __iter__(self):
+        return iter([])
+
+
+class FakeRobot(object):
+    def __init__(self, failing=()):
+        self.servers = FakeServers(failing)
+
+
+@unittest.skipUnless(os.path.exists(HETZNERCTL),
+                     "hetznerctl is not available in the source tree")
+class HetznerctlTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ctl = load_hetznerctl()
+
+    def run_command(self, cmdclass, robot, **options):
+        args = argparse.Namespace(jobs=None, **options)
+        command = cmdclass(os.devnull)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = 0
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                command.execute(robot, None, args)
+            except SystemExit as exc:
+                status = exc.code
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_show_failing_ip(self):
+        class ShowServer(self.ctl.ShowServer):
+            def get_record(self, server):
+                return {'ip': server}
+
+        robot = FakeRobot(failing=['1.0.0.2'])
+        ips = ['1.0.0.1', '1.0.0.2', '1.0.0.3']
+        for fmt in ('json', 'ndjson'):
+            status, out, err = self.run_command(ShowServer, robot,
+                                                format=fmt, ip=ips)
+            self.assertEqual(status, 1)
+            self.assertIn("Error for 1.0.0.2", err)
+            if fmt == 'json':
+                records = json.loads(out)
+            else:
+                records = [json.loads(line) for line in out.splitlines()]
+            self.assertEqual(records, [{'ip': '1.0.0.1'}, {'ip': '1.0.0.3'}])
+
+        status, out, err = self.run_command(ShowServer, robot,
+                                            format='json', ip=['1.0.0.2'])
+        self.assertEqual((status, out), (1, "[]\n"))
+
+    def test_daemon_declines_other_options(self):
+        parser = self.ctl.build_parser()
+        options = parser.parse_args(['daemon', '-c', os.devnull,
+                                     '--request-timeout', '5'])
+        daemon = self.ctl.Daemon(options.configfile)
+        daemon.configfile = options.configfile
+        daemon.options = options
+
+        def handle(*extra):
+            argv = ['config', '-c', os.devnull] + list(extra) + ['a.b']
+            request = {'argv': argv, 'configfile': os.devnull}
+            return daemon.handle(None, parser, request, io.StringIO(),
+                                 io.StringIO())
+
+        self.assertIsNotNone(handle('--request-timeout', '5'))
+        self.assertIsNone(handle())
+        self.assertIsNone(handle('--request-timeout', '5', '--hedge'))
+        self.assertIsNone(handle('--request-timeout', '5', '--debug'))
+        options.debug = True
+        self.assertIsNotNone(handle('--request-timeout', '5', '--debug'))
+
+    def test_batch_declines_other_options(self):
+        parser = self.ctl.build_parser()
+        options = parser.parse_args(['batch', '-c', os.devnull,
+                                     '--request-timeout', '5'])
+        batch = self.ctl.Batch(options.configfile)
+        batch.options = options
+        batch.defaults = parser.parse_args([])
+
+        def run(line):
+            with redirect_stderr(io.StringIO()):
+                return batch.run_command(FakeRobot(), parser, line)
+
+        self.assertEqual(run('list'), 0)
+        self.assertEqual(run('list --request-timeout 5 -c /dev/null'), 0)
+        self.assertEqual(run('list -c /tmp/other.conf'), 2)
+        self.assertEqual(run('list --snapshot s.db'), 2)
+        self.assertEqual(run('list --request-timeout 1'), 2)
+        self.assertEqual(run('list --hedge'), 2)
+        self.assertEqual(run('list --debug'), 2)
+
+    def test_snapshot_only_offline(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'snapshot.sqlite')
+        parser = self.ctl.build_parser()
+
+        def make_robot(*argv):
+            args = parser.parse_args(list(argv) + ['-c', os.devnull,
+                                                   '--snapshot', path])
+            subcommand = args.cmdclass(args.configfile)
+            stderr = io.StringIO()
+            try:
+                with redirect_stderr(stderr):
+                    return self.ctl.make_robot(subcommand, parser, args)
+            except SystemExit:
+                self.assertIn("can't be used", stderr.getvalue())
+                return None
+
+        for argv in (['list'], ['show', '1.0.0.1'], ['rdns'], ['failover']):
+            robot = make_robot(*argv)
+            self.assertIsInstance(robot.conn, SnapshotConnection)
+
+        for argv in (['reboot', '1.0.0.1'], ['daemon'], ['watch']):
+            self.assertIsNone(make_robot(*argv))
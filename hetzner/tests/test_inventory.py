@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from hetzner.inventory import InventoryCache, build_inventory
+
+TRAFFIC = {'traffic_warnings': False, 'traffic_hourly': 200,
+           'traffic_daily': 2000, 'traffic_monthly': 20}
+
+
+def server(ip, name, product='EX', dc='FSN1-DC1', status='ready'):
+    return {'server': {'server_ip': ip, 'server_number': int(ip[-1]),
+                       'server_name': name, 'product': product, 'dc': dc,
+                       'status': status}}
+
+
+COLLECTIONS = {
+    'server': [
+        server('1.0.0.1', 'web1'),
+        server('1.0.0.2', 'web2', product='AX', dc='HEL1-DC2'),
+        server('1.0.0.3', 'db', status='in process'),
+        server('1.0.0.4', 'db'),
+        server('1.0.0.5', ''),
+    ],
+    'ip': [
+        {'ip': dict(TRAFFIC, ip='1.0.0.1', server_ip='1.0.0.1')},
+        {'ip': dict(TRAFFIC, ip='9.9.9.1', server_ip='1.0.0.1')},
+        {'ip': dict(TRAFFIC, ip='1.0.0.2', server_ip='1.0.0.2')},
+    ],
+    'subnet': [
+        {'subnet': dict(TRAFFIC, ip='2a01:4f8::', mask=64,
+                        gateway='2a01:4f8::1', server_ip='1.0.0.2')},
+    ],
+    'rdns': [
+        {'rdns': {'ip': '9.9.9.1', 'ptr': 'web1.example.com'}},
+        {'rdns': {'ip': '2a01:4f8::2', 'ptr': 'web2.example.com'}},
+        {'rdns': {'ip': '8.8.8.8', 'ptr': 'unknown.example.com'}},
+    ],
+}
+
+
+class BuildInventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.inventory = build_inventory(COLLECTIONS, {'web': 'web*'})
+        self.hostvars = self.inventory['_meta']['hostvars']
+
+    def test_groups(self):
+        self.assertEqual(self.inventory['dc_fsn1_dc1']['hosts'],
+                         ['1.0.0.3', '1.0.0.4', '1.0.0.5', 'web1'])
+        self.assertEqual(self.inventory['product_ax']['hosts'], ['web2'])
+        self.assertEqual(self.inventory['status_in_process']['hosts'],
+                         ['1.0.0.3'])
+        self.assertEqual(self.inventory['web']['hosts'], ['web1', 'web2'])
+        self.assertEqual(self.inventory['all']['hosts'],
+                         ['1.0.0.3', '1.0.0.4', '1.0.0.5', 'web1', 'web2'])
+        self.assertIn('web', self.inventory['all']['children'])
+
+    def test_duplicate_names(self):
+        # Both servers are named 'db', so they are named after their IP.
+        self.assertNotIn('db', self.hostvars)
+        self.assertEqual(self.hostvars['1.0.0.3']['hetzner_name'], 'db')
+        self.assertEqual(self.hostvars['1.0.0.4']['ansible_host'], '1.0.0.4')
+
+    def test_addresses(self):
+        web1, web2 = self.hostvars['web1'], self.hostvars['web2']
+        self.assertEqual(web1['hetzner_ips'], ['1.0.0.1', '9.9.9.1'])
+        self.assertEqual(web1['hetzner_rdns'],
+                         {'9.9.9.1': 'web1.example.com'})
+        self.assertEqual(web2['hetzner_subnets'],
+                         [{'ip': '2a01:4f8::', 'mask': 64,
+                           'gateway': '2a01:4f8::1'}])
+        self.assertEqual(web2['hetzner_rdns'],
+                         {'2a01:4f8::2': 'web2.example.com'})
+        self.assertEqual(self.hostvars['1.0.0.5']['hetzner_rdns'], {})
+
+
+class InventoryCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache', 'inventory.json')
+        self.cache = InventoryCache(self.path, ttl=10, max_stale=100,
+                                    key={'groups': {}})
+        self.fetched = 0
+        self.revalidated = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fetch(self):
+        self.fetched += 1
+        return {'fetch': self.fetched}
+
+    def revalidate(self):
+        self.revalidated += 1
+
+    def get(self):
+        return self.cache.get(self.fetch, self.revalidate)
+
+    def age_cache(self, seconds):
+        with open(self.path, 'r') as fp:
+            data = json.load(fp)
+        data['fetched_at'] -= seconds
+        with open(self.path, 'w') as fp:
+            json.dump(data, fp)
+
+    def test_ttl(self):
+        self.assertEqual(self.get(), {'fetch': 1})
+        self.assertEqual(self.get(), {'fetch': 1})
+        self.assertEqual((self.fetched, self.revalidated), (1, 0))
+
+    def test_stale_while_revalidate(self):
+        self.get()
+        self.age_cache(50)
+        self.assertEqual(self.get(), {'fetch': 1})
+        self.assertEqual((self.fetched, self.revalidated), (1, 1))
+
+        # No other refresh is started while one is in progress.
+        self.assertTrue(self.cache.lock())
+        self.assertEqual(self.get(), {'fetch': 1})
+        self.assertEqual(self.revalidated, 1)
+
+    def test_expired(self):
+        self.get()
+        self.age_cache(200)
+        self.assertEqual(self.get(), {'fetch': 2})
+        self.assertEqual(self.revalidated, 0)
+
+    def test_other_key(self):
+        self.get()
+        other = InventoryCache(self.path, ttl=10, max_stale=100,
+                               key={'groups': {'web': 'web*'}})
+        self.assertEqual(other.get(self.fetch), {'fetch': 2})
+        self.assertEqual(self.get(), {'fetch': 3})
+
+    def test_lock(self):
+        self.assertTrue(self.cache.lock())
+        self.assertTrue(self.cache.is_locked())
+        self.assertFalse(self.cache.lock())
+        self.cache.unlock()
+        self.assertFalse(self.cache.is_locked())
+
+        # Locks of refreshes which apparently died are broken.
+        self.assertTrue(self.cache.lock())
+        mtime = time.time() - self.cache.lock_timeout - 1
+        os.utime(self.cache.lockfile, (mtime, mtime))
+        self.assertFalse(self.cache.is_locked())
+        self.assertTrue(self.cache.lock())
+
+    def test_refresh_unlocks(self):
+        def failing_fetch():
+            raise RuntimeError("fetch failed")
+
+        self.assertRaises(RuntimeError, self.cache.refresh, failing_fetch)
+        self.assertFalse(os.path.exists(self.cache.lockfile))
+        self.assertEqual(self.cache.refresh(self.fetch), {'fetch': 1})
+        self.assertFalse(os.path.exists(self.cache.lockfile))
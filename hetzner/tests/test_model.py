@@ -0,0 +1,100 @@
+import json
+import pickle
+import unittest
+
+from hetzner import RobotError
+from hetzner.rdns import ReverseDNS
+from hetzner.robot import Robot
+from hetzner.model import DETACHED
+from hetzner.server import AdminAccount, IpAddress, Server, Subnet
+from hetzner.tests.test_snapshot import COLLECTIONS
+
+
+class FakeConnection(object):
+    scraper = None
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, path):
+        self.requests.append(path)
+        if path == '/server/1.0.0.1':
+            return COLLECTIONS['/server'][0]
+        if path == '/rdns/1.0.0.1':
+            return COLLECTIONS['/rdns'][0]
+        raise RobotError("Not found", 404)
+
+
+class ModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.robot = Robot.from_connection(self.conn)
+        self.server = Server(self.conn, COLLECTIONS['/server'][0])
+
+    def roundtrip(self, obj):
+        copy = pickle.loads(pickle.dumps(obj))
+        self.assertTrue(copy.detached)
+        self.assertEqual(copy.to_dict(), obj.to_dict())
+        from_json = type(obj).from_dict(json.loads(json.dumps(obj.to_dict())))
+        self.assertEqual(from_json.to_dict(), obj.to_dict())
+        return copy
+
+    def test_server(self):
+        server = self.roundtrip(self.server)
+        self.assertEqual((server.number, server.name), (321, 'foo'))
+        self.assertEqual(server.paid_until.year, 2030)
+        self.assertNotIn(b'FakeConnection', pickle.dumps(self.server))
+
+    def test_detached(self):
+        server = self.server.detach()
+        self.assertFalse(self.server.detached)
+        self.assertRaises(RobotError, server.update_info)
+        self.assertRaises(RobotError, server.rdns.get, '1.0.0.1')
+
+    def test_detached_connection(self):
+        self.assertRaises(RobotError, DETACHED.get, '/server')
+        self.assertRaises(RobotError, DETACHED.scraper.login)
+        self.assertFalse(hasattr(DETACHED, 'timeout'))
+        self.assertIsNone(getattr(DETACHED, 'hedger', None))
+
+    def test_admin_account(self):
+        admin = AdminAccount.from_dict({'admin': {
+            'server_number': 321, 'exists': True, 'login': '#321+abc',
+        }})
+        admin.passwd = 'secret'
+        self.assertNotIn('passwd', admin.to_dict()['admin'])
+        self.assertNotIn(b'secret', pickle.dumps(admin))
+        data = admin.to_dict(include_passwd=True)
+        self.assertEqual(AdminAccount.from_dict(data).passwd, 'secret')
+        self.assertIsNone(self.roundtrip(admin).passwd)
+        self.assertRaises(RobotError, admin.update_info)
+        admin.attach(self.conn)
+        self.assertEqual(admin.passwd, 'secret')
+
+    def test_attach(self):
+        server = pickle.loads(pickle.dumps(self.server)).attach(self.robot)
+        self.assertFalse(server.detached)
+        self.assertIs(server.rdns.conn, self.conn)
+        server.update_info()
+        self.assertEqual(self.conn.requests, ['/server/1.0.0.1'])
+
+    def test_ip(self):
+        ip = self.roundtrip(IpAddress(self.conn, COLLECTIONS['/ip'][0]))
+        self.assertEqual((ip.ip, ip.subnet_ip), ('1.0.0.1', None))
+
+    def test_subnet_ip(self):
+        result = COLLECTIONS['/subnet'][0]
+        ip = self.roundtrip(IpAddress(self.conn, result, '2a01:4f8::2'))
+        self.assertEqual((ip.ip, ip.subnet_ip), ('2a01:4f8::2', '2a01:4f8::2'))
+        self.assertEqual(ip.to_dict()['subnet']['ip'], '2a01:4f8::')
+        self.assertEqual(result['subnet']['ip'], '2a01:4f8::')
+
+    def test_subnet(self):
+        subnet = self.roundtrip(Subnet(self.conn, COLLECTIONS['/subnet'][0]))
+        self.assertEqual(subnet.get_ip_range()[0], '2a01:4f8::')
+
+    def test_rdns(self):
+        rdns = self.roundtrip(ReverseDNS(self.conn, '1.0.0.1'))
+        self.assertEqual(rdns.ptr, 'foo.example.com')
+        rdns.attach(self.conn)
+        self.assertIs(rdns.conn, self.conn)
@@ -0,0 +1,129 @@
+import copy
+import unittest
+
+from hetzner import RateLimitError, RobotError
+from hetzner.multi import MultiRobot
+from hetzner.robot import Robot
+from hetzner.tests.test_snapshot import COLLECTIONS
+
+
+def account_collections(prefix, number):
+    """
+    Return the collections of test_snapshot with the addresses of the server
+    moved to the network 'prefix' and all other addresses to networks of
+    their own, so that no two accounts share an address.
+    """
+    networks = {'1.0.0.': prefix, '9.9.9.': '9.9.{0}.'.format(number),
+                '2a01:4f8::': '2a01:4f8:{0}::'.format(number)}
+    result = copy.deepcopy(COLLECTIONS)
+    for path, items in result.items():
+        for item in items:
+            data = list(item.values())[0]
+            for field in ('ip', 'server_ip'):
+                for old, new in networks.items():
+                    if data.get(field, '').startswith(old):
+                        data[field] = new + data[field][len(old):]
+            if 'server_number' in data:
+                data['server_number'] = number
+    result['/failover'] = [
+        {'failover': {'ip': prefix + '100', 'netmask': '255.255.255.255',
+                      'server_ip': prefix + '1', 'server_number': number,
+                      'active_server_ip': prefix + '1'}},
+    ]
+    return result
+
+
+class FakeConnection(object):
+    def __init__(self, collections):
+        self.collections = collections
+        self.requests = []
+        self.error = None
+
+    def get_iter(self, path):
+        self.requests.append(path)
+        if self.error is not None:
+            raise self.error
+        if path not in self.collections:
+            raise RobotError("Not found", 404)
+        return iter(copy.deepcopy(self.collections[path]))
+
+
+class MultiRobotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conns = {
+            'one': FakeConnection(account_collections('1.0.0.', 1)),
+            'two': FakeConnection(account_collections('2.0.0.', 2)),
+        }
+        self.robots = MultiRobot(
+            [(name, Robot.from_connection(self.conns[name]))
+             for name in ('one', 'two')],
+            jobs=4, max_requests=12, window=3600
+        )
+
+    def test_merged_view(self):
+        fleet = self.robots.fetch()
+        self.assertTrue(fleet.complete)
+        servers = [(account, server.ip) for account, server in fleet.servers()]
+        self.assertEqual(sorted(servers),
+                         [('one', '1.0.0.1'), ('two', '2.0.0.1')])
+        self.assertEqual(fleet.account_of('2.0.0.100'), 'two')
+        self.assertEqual(fleet.account_of('2a01:4f8:1::5'), 'one')
+        self.assertIsNone(fleet.account_of('3.0.0.1'))
+        self.assertEqual(fleet.server('2.0.0.1').number, 2)
+        self.assertIs(fleet.server('2.0.0.1').conn, self.conns['two'])
+        self.assertEqual(sorted(self.conns['one'].requests),
+                         ['/failover', '/ip', '/rdns', '/server', '/subnet'])
+
+    def test_duplicate_item(self):
+        # The failover IP of account one shows up in account two as well.
+        moved = self.conns['one'].collections['/failover'][0]
+        self.conns['two'].collections['/failover'].append(moved)
+        fleet = self.robots.fetch(['failover', 'server'])
+        self.assertFalse(fleet.complete)
+        self.assertEqual(sorted(fleet.errors),
+                         [('one', 'failover'), ('two', 'failover')])
+        self.assertIn('1.0.0.100', str(fleet.errors[('two', 'failover')]))
+        self.assertIsNone(fleet.get('failover', '1.0.0.100'))
+        self.assertIsNone(fleet.account_of('1.0.0.100'))
+        self.assertEqual(fleet.get('failover', '1.0.0.100', 'two')[0], 'two')
+        self.assertEqual(fleet.account_of('2.0.0.100'), 'two')
+
+    def test_failing_account(self):
+        self.robots.fetch(['server'])
+        self.conns['two'].error = RobotError("Internal error", 500)
+        fleet = self.robots.fetch(['server'])
+        self.assertFalse(fleet.complete)
+        self.assertEqual(list(fleet.errors), [('two', 'server')])
+        self.assertEqual(fleet.stale, set([('two', 'server')]))
+        self.assertEqual(len(list(fleet.servers())), 2)
+
+    def test_failing_without_previous_fetch(self):
+        self.conns['one'].error = RobotError("Internal error", 500)
+        fleet = self.robots.fetch(['server'])
+        self.assertEqual([account for account, _ in fleet.servers()],
+                         ['two'])
+        self.assertEqual(fleet.stale, set())
+
+    def test_budget(self):
+        self.robots.fetch()
+        self.robots.fetch()
+        fleet = self.robots.fetch()
+        self.assertEqual(len(self.conns['one'].requests), 12)
+        self.assertEqual(len(fleet.errors), 6)
+        self.assertTrue(all(isinstance(err, RateLimitError)
+                            for err in fleet.errors.values()))
+        self.assertEqual(len(list(fleet.servers())), 2)
+
+    def test_rate_limit_blocks_account(self):
+        self.conns['one'].error = RateLimitError("Rate limit", 403, 10, 600)
+        self.robots.fetch(['server'])
+        self.conns['one'].error = None
+        self.robots.fetch(['server'])
+        self.assertEqual(self.conns['one'].requests, ['/server'])
+        self.assertEqual(self.robots.budgets['two'].remaining(), 10)
+
+    def test_max_age(self):
+        self.robots.fetch(['server'])
+        fleet = self.robots.fetch(['server'], max_age=60)
+        self.assertEqual(self.conns['one'].requests, ['/server'])
+        self.assertEqual(len(list(fleet.servers())), 2)
@@ -0,0 +1,145 @@
+import copy
+import threading
+import unittest
+
+from hetzner import ConnectError, RobotError
+from hetzner.provision import Provisioner
+from hetzner.server import Server
+from hetzner.tests.test_snapshot import COLLECTIONS
+
+
+def server_result(number):
+    result = copy.deepcopy(COLLECTIONS['/server'][0])
+    result['server']['server_number'] = number
+    result['server']['server_ip'] = '1.0.0.{0}'.format(number)
+    return result
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.requests = []
+        self.boot = {}
+        self.failing = set()
+        self.lock = threading.Lock()
+
+    def _config(self, number, name):
+        return self.boot.setdefault((number, name), {
+            'server_number': number, 'active': False, 'password': None,
+            'dist': ['Debian 12 base', 'Ubuntu 24.04 base'],
+            'lang': ['en', 'de'],
+        })
+
+    def get(self, path):
+        self.requests.append(('GET', path))
+        parts = path.strip('/').split('/')
+        number = int(parts[1])
+        if len(parts) == 2:
+            return {'boot': dict((name, self._config(number, name))
+                                 for name in ('rescue', 'linux', 'vnc'))}
+        return {parts[2]: self._config(number, parts[2])}
+
+    def post(self, path, data):
+        with self.lock:
+            self.requests.append(('POST', path, data))
+        parts = path.strip('/').split('/')
+        number = int(parts[1])
+        if number in self.failing:
+            raise RobotError("Server is being cancelled", 409)
+        if parts[0] == 'reset':
+            return {'reset': {'type': data['type']}}
+        config = self._config(number, parts[2])
+        config.update(data, active=True, password='pw{0}'.format(number))
+        return {parts[2]: config}
+
+    def request(self, method, path, data=None):
+        self.requests.append((method.upper(), path))
+        parts = path.strip('/').split('/')
+        config = self._config(int(parts[1]), parts[2])
+        config.update(active=False, password=None)
+        return {parts[2]: config}
+
+
+class BootManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.server = Server(self.conn, server_result(1))
+
+    def test_activate(self):
+        linux = self.server.boot.linux
+        self.assertEqual(linux.choices('dist'),
+                         ['Debian 12 base', 'Ubuntu 24.04 base'])
+        password = linux.activate(dist='Debian 12 base', lang='en',
+                                  authorized_keys=['aa:bb'])
+        self.assertEqual(password, 'pw1')
+        self.assertEqual(self.conn.requests[-1],
+                         ('POST', '/boot/1/linux',
+                          {'dist': 'Debian 12 base', 'lang': 'en',
+                           'authorized_key': ['aa:bb']}))
+        self.assertIs(self.server.boot.active, linux)
+        linux.deactivate()
+        self.assertFalse(linux.active)
+        self.assertIsNone(self.server.boot.active)
+
+    def test_active_single_request(self):
+        self.conn.boot[(1, 'vnc')] = {'active': True, 'password': 'x'}
+        self.assertIs(self.server.boot.active, self.server.boot['vnc'])
+        self.assertEqual(self.conn.requests, [('GET', '/boot/1')])
+        self.assertRaises(KeyError, lambda: self.server.boot['windows'])
+
+
+class ProvisionerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.servers = [Server(self.conn, server_result(number))
+                        for number in range(1, 6)]
+        self.checks = {}
+
+    def ready(self, server):
+        # Down on the first check after the reset, up afterwards.
+        count = self.checks[server.ip] = self.checks.get(server.ip, 0) + 1
+        return count > 1
+
+    def provision(self, **kwargs):
+        options = dict(options={'dist': 'Debian 12 base', 'lang': 'en'},
+                       wave_size=2, ready=self.ready, poll_interval=0.01)
+        options.update(kwargs)
+        provisioner = Provisioner(self.servers, **options)
+        return provisioner, list(provisioner.run())
+
+    def test_waves(self):
+        provisioner, events = self.provision()
+        stages = dict((event.server.ip, []) for event in events)
+        for event in events:
+            stages[event.server.ip].append(event.stage)
+        for ip, server_stages in stages.items():
+            self.assertEqual(server_stages, ['activated', 'reset', 'ready'])
+
+        waves = sorted(event.detail for event in events
+                       if event.stage == 'reset')
+        self.assertEqual(waves, [1, 1, 2, 2, 3])
+        passwords = set(event.detail for event in events
+                        if event.stage == 'activated')
+        self.assertEqual(passwords, set('pw{0}'.format(n)
+                                        for n in range(1, 6)))
+        resets = [r for r in self.conn.requests if r[1].startswith('/reset')]
+        self.assertEqual(len(resets), 5)
+        self.assertEqual(resets[0][2], {'type': 'hw'})
+        timings = provisioner.timings['1.0.0.1']
+        self.assertLessEqual(timings['activated'], timings['reset'])
+        self.assertLessEqual(timings['reset'], timings['ready'])
+
+    def test_failed_activation(self):
+        self.conn.failing.add(3)
+        provisioner, events = self.provision()
+        failed = [event for event in events if event.stage == 'failed']
+        self.assertEqual([event.server.number for event in failed], [3])
+        self.assertIsInstance(failed[0].error, RobotError)
+        self.assertEqual(len([event for event in events
+                              if event.stage == 'ready']), 4)
+
+    def test_never_ready(self):
+        provisioner, events = self.provision(ready=lambda server: True,
+                                             patience=0.05)
+        failed = [event for event in events if event.stage == 'failed']
+        self.assertEqual(len(failed), 5)
+        self.assertIsInstance(failed[0].error, ConnectError)
@@ -0,0 +1,108 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from hetzner import RobotError
+from hetzner.rdns import ReverseDNSManager, write_records
+
+RECORDS = [('1.0.0.{0}'.format(n), 'host{0}.example.com'.format(n))
+           for n in range(1, 8)] + [('1.0.0.8', None)]
+
+
+class FakeConnection(object):
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.requests = []
+
+    def _record(self, request):
+        if self.fail_after is not None and \
+           len(self.requests) >= self.fail_after:
+            raise RobotError("Internal error", 500)
+        self.requests.append(request)
+
+    def post(self, path, data):
+        self._record(('POST', path, data['ptr']))
+
+    def delete(self, path):
+        self._record(('DELETE', path))
+        raise RobotError("Not found", 404)
+
+    def get_iter(self, path):
+        for ip, ptr in RECORDS:
+            yield {'rdns': {'ip': ip, 'ptr': ptr}}
+
+
+class ReverseDNSImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.tmpdir, 'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_input(self, records, name='records.jsonl', fmt='jsonl'):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w', newline='') as fp:
+            write_records(records, fp, fmt)
+        return path
+
+    def run_import(self, conn, path, fmt='jsonl'):
+        with open(path, 'r', newline='') as fp:
+            return ReverseDNSManager(conn).import_records(
+                fp, fmt, batch_size=3, checkpoint=self.checkpoint
+            )
+
+    def test_export_import(self):
+        exported = io.StringIO()
+        ReverseDNSManager(FakeConnection()).export_records(exported, 'csv')
+        path = os.path.join(self.tmpdir, 'records.csv')
+        with open(path, 'w', newline='') as fp:
+            fp.write(exported.getvalue())
+
+        conn = FakeConnection()
+        self.assertEqual(self.run_import(conn, path, 'csv'), 8)
+        self.assertEqual(conn.requests[0],
+                         ('POST', '/rdns/1.0.0.1', 'host1.example.com'))
+        self.assertEqual(conn.requests[-1], ('DELETE', '/rdns/1.0.0.8'))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume(self):
+        path = self.write_input(RECORDS)
+        conn = FakeConnection(fail_after=4)
+        self.assertRaises(RobotError, self.run_import, conn, path)
+        with open(self.checkpoint) as fp:
+            state = json.load(fp)
+        self.assertEqual(state['done'], 3)
+        self.assertEqual(state['input']['path'], path)
+
+        conn = FakeConnection()
+        self.assertEqual(self.run_import(conn, path), 8)
+        self.assertEqual([request[1] for request in conn.requests],
+                         ['/rdns/1.0.0.{0}'.format(n) for n in range(4, 9)])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_other_input(self):
+        path = self.write_input(RECORDS)
+        self.assertRaises(RobotError, self.run_import,
+                          FakeConnection(fail_after=4), path)
+        other = self.write_input(RECORDS, 'other.jsonl')
+        conn = FakeConnection()
+        self.assertRaises(ValueError, self.run_import, conn, other)
+        self.assertEqual(conn.requests, [])
+
+    def test_resume_changed_input(self):
+        path = self.write_input(RECORDS)
+        self.assertRaises(RobotError, self.run_import,
+                          FakeConnection(fail_after=4), path)
+        self.write_input([('1.0.0.9', 'new.example.com')] + RECORDS[1:])
+        conn = FakeConnection()
+        self.assertRaises(ValueError, self.run_import, conn, path)
+        self.assertEqual(conn.requests, [])
+
+        # A truncated input doesn't match either.
+        self.write_input(RECORDS[:2])
+        self.assertRaises(ValueError, self.run_import, conn, path)
+        self.assertEqual(conn.requests, [])
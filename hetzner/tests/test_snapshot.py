@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hetzner import RobotError
+from hetzner.snapshot import Snapshot
+
+TRAFFIC = {'traffic_warnings': False, 'traffic_hourly': 200,
+           'traffic_daily': 2000, 'traffic_monthly': 20}
+
+COLLECTIONS = {
+    '/server': [
+        {'server': {'server_ip': '1.0.0.1', 'server_number': 321,
+                    'server_name': 'foo', 'product': 'EX', 'dc': 'FSN1',
+                    'traffic': '5 TB', 'status': 'ready', 'cancelled': False,
+                    'paid_until': '2030-01-01'}},
+    ],
+    '/ip': [
+        {'ip': dict(TRAFFIC, ip='1.0.0.1', server_ip='1.0.0.1',
+                    locked=False, separate_mac=None)},
+    ],
+    '/subnet': [
+        {'subnet': dict(TRAFFIC, ip='2a01:4f8::', mask=64,
+                        gateway='2a01:4f8::1', server_ip='1.0.0.1',
+                        failover=False, locked=False)},
+    ],
+    '/rdns': [
+        {'rdns': {'ip': '1.0.0.1', 'ptr': 'foo.example.com'}},
+        {'rdns': {'ip': '2a01:4f8::2', 'ptr': 'bar.example.com'}},
+        {'rdns': {'ip': '9.9.9.9', 'ptr': 'other.example.com'}},
+    ],
+    '/reset': [
+        {'reset': {'server_ip': '1.0.0.1', 'server_number': 321,
+                   'type': ['sw', 'hw']}},
+    ],
+}
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.requests = []
+
+    def get_iter(self, path):
+        self.requests.append(path)
+        if path not in COLLECTIONS:
+            raise RobotError("Not found", 404)
+        return iter(COLLECTIONS[path])
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.snapshot = Snapshot(os.path.join(self.tmpdir, 'snap.sqlite'))
+        self.conn = FakeConnection()
+        self.snapshot.refresh(self.conn, jobs=1)
+        self.robot = self.snapshot.robot()
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_one_request_per_collection(self):
+        self.assertEqual(sorted(self.conn.requests),
+                         ['/failover', '/ip', '/rdns', '/reset', '/server',
+                          '/subnet'])
+
+    def test_refresh_max_age(self):
+        self.assertEqual(self.snapshot.refresh(self.conn, max_age=60), {})
+        result = self.snapshot.refresh(self.conn, ['rdns'], max_age=0)
+        self.assertEqual(result, {'rdns': 3})
+
+    def test_server(self):
+        servers = list(self.robot.servers)
+        self.assertEqual([s.number for s in servers], [321])
+        server = self.robot.servers.get('1.0.0.1')
+        self.assertEqual(server.name, 'foo')
+        self.assertEqual([ip.ip for ip in server.ips], ['1.0.0.1'])
+        self.assertEqual([net.net_ip for net in server.subnets],
+                         ['2a01:4f8::'])
+        self.assertIsNone(server.reset.is_running)
+
+    def test_rdns_of_server(self):
+        server = self.robot.servers.get('1.0.0.1')
+        self.assertEqual(sorted(rdns.ptr for rdns in server.rdns),
+                         ['bar.example.com', 'foo.example.com'])
+
+    def test_missing(self):
+        with self.assertRaises(RobotError) as ctx:
+            self.robot.servers.get('1.0.0.2')
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertEqual(list(self.robot.failover), [])
+
+    def test_read_only(self):
+        server = self.robot.servers.get('1.0.0.1')
+        self.assertRaises(RobotError, server.set_name, 'bar')
@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+HETZNERCTL = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__
+    )))),
+    'hetznerctl'
+)
+
+# Modules which are only needed by commands talking to the Robot.
+HEAVY_MODULES = [
+    'concurrent.futures',
+    'hetzner.robot',
+    'hetzner.server',
+    'hetzner.failover',
+    'hetzner.util.scraping',
+    'html.parser',
+    'http.client',
+    'ssl',
+    'subprocess',
+    'tempfile',
+]
+
+# Maximum number of seconds hetznerctl may spend importing modules the bare
+# interpreter doesn't import, as a multiple of the seconds the interpreter
+# spends for its own imports, so that the budget holds on slow machines.
+IMPORT_BUDGET = 10
+
+
+def measure_imports(args):
+    """
+    Run the Python interpreter with the given arguments and return a
+    dictionary mapping the name of every imported module to the number of
+    seconds spent for importing the module itself.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(HETZNERCTL)] + sys.path
+    )
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime'] + args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            env=env)
+    _, stderr = proc.communicate()
+    result = {}
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selftime, _, name = line[len('import time:'):].split('|')
+        result[name.strip()] = int(selftime) / 1000000.0
+    return result
+
+
+@unittest.skipUnless(os.path.exists(HETZNERCTL),
+                     "hetznerctl is not available in the source tree")
+class StartupTestCase(unittest.TestCase):
+    def measure_hetznerctl(self, *args):
+        baseline = measure_imports(['-c', 'pass'])
+        imported = measure_imports([HETZNERCTL] + list(args))
+        return dict((name, selftime) for name, selftime in imported.items()
+                    if name not in baseline)
+
+    def test_no_heavy_imports(self):
+        for args in [['--help'], ['config', '-c', os.devnull]]:
+            imported = self.measure_hetznerctl(*args)
+            self.assertIn('hetzner.util.control', imported)
+            for module in HEAVY_MODULES:
+                self.assertNotIn(module, imported,
+                                 "hetznerctl {0} imports {1}"
+                                 .format(' '.join(args), module))
+
+    def test_cached_inventory(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = os.path.join(tmpdir, 'inventory.json')
+            with open(cache, 'w') as fp:
+                json.dump({'fetched_at': time.time(),
+                           'key': {'configfile': os.devnull, 'groups': {}},
+                           'inventory': {'_meta': {'hostvars': {}}}}, fp)
+            imported = self.measure_hetznerctl('inventory', '-c', os.devnull,
+                                               '--cache', cache)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertIn('hetzner.inventory', imported)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, imported)
+
+    def test_import_budget(self):
+        baseline = sum(measure_imports(['-c', 'pass']).values())
+        for args in [['--help'], ['config', '-c', os.devnull]]:
+            # Use the fastest of a few runs, so that a single hiccup of a
+            # busy machine doesn't exceed the budget.
+            spent = min(sum(self.measure_hetznerctl(*args).values())
+                        for _ in range(3))
+            self.assertLess(spent, IMPORT_BUDGET * baseline,
+                            "hetznerctl {0} spends {1:.3f}s on imports"
+                            .format(' '.join(args), spent))
+
+    def test_lazy_package_attributes(self):
+        code = ("import sys, hetzner;"
+                " assert 'hetzner.robot' not in sys.modules;"
+                " assert hetzner.Robot.__module__ == 'hetzner.robot'")
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        subprocess.check_call([sys.executable, '-c', code], env=env)
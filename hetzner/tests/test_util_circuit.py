@@ -0,0 +1,101 @@
+import time
+import socket
+import unittest
+
+try:
+    from httplib import HTTPConnection
+except ImportError:
+    from http.client import HTTPConnection
+
+from hetzner import CircuitOpen, RobotError
+from hetzner.robot import ROBOT_WEBHOST, RobotConnection, RobotWebInterface
+from hetzner.util.circuit import CircuitBreaker, CircuitBreakers
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('test', failures=2, reset_timeout=0.05,
+                                      slow_call=1)
+
+    def test_half_open_probe(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.assertRaises(CircuitOpen, self.breaker.before)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.breaker.before()
+        # Only a single probe is allowed at a time.
+        self.assertRaises(CircuitOpen, self.breaker.before)
+        self.breaker.success(0.1)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_failed_probe(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        time.sleep(0.06)
+        self.breaker.before()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.stats['trips'], 2)
+
+    def test_slow_calls(self):
+        self.breaker.success(2)
+        self.breaker.success(2)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.stats['slow_calls'], 2)
+
+    def test_client_errors(self):
+        for _ in range(3):
+            with self.assertRaises(RobotError):
+                with self.breaker.guard():
+                    raise RobotError("Not found", 404)
+        self.assertEqual(self.breaker.state, 'closed')
+
+
+class RobotConnectionCircuitTestCase(unittest.TestCase):
+    def setUp(self):
+        # Find a port nobody is listening on.
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        breakers = CircuitBreakers(failures=2, reset_timeout=60)
+        self.conn = RobotConnection('user', 'passwd', breakers=breakers)
+        self.conn.pool.factory = lambda: HTTPConnection('127.0.0.1', port)
+
+    def test_fail_fast(self):
+        for _ in range(2):
+            self.assertRaises(socket.error, self.conn.get, '/server')
+        self.assertRaises(CircuitOpen, self.conn.get, '/server/1.2.3.4')
+        self.assertRaises(CircuitOpen, list, self.conn.get_iter('/server'))
+        status = self.conn.breakers.status()
+        self.assertEqual(status['robot-ws.your-server.de/server']['state'],
+                         'open')
+        self.assertTrue(self.conn.breakers.is_open())
+        # Other endpoint classes are tracked separately.
+        self.assertRaises(socket.error, self.conn.get, '/failover')
+
+
+class RobotWebInterfaceCircuitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.breakers = CircuitBreakers(failures=1, reset_timeout=0.05)
+        self.web = RobotWebInterface('user', 'passwd', self.breakers)
+        self.breaker = self.breakers.for_request(ROBOT_WEBHOST,
+                                                 '/server')
+
+    def test_connect_error_while_half_open(self):
+        self.breaker.failure()
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, 'half-open')
+
+        def connect(force=False):
+            raise socket.error("Network is unreachable")
+
+        self.web.connect = connect
+        self.assertRaises(socket.error, self.web.request, '/server')
+        # The probe has never been sent, so the next call may still probe.
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.breaker.before()
+        self.breaker.success(0.1)
+        self.assertEqual(self.breaker.state, 'closed')
@@ -0,0 +1,84 @@
+import io
+import gzip
+import json
+import zlib
+import unittest
+
+from hetzner.util.compression import DecodingReader, decoding_reader
+from hetzner.util.jsonstream import iter_chunks, iter_json_array
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body, encoding=None):
+        super(FakeResponse, self).__init__(body)
+        self.headers = {}
+        if encoding is not None:
+            self.headers['content-encoding'] = encoding
+        self.reads = []
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self, size=-1):
+        data = super(FakeResponse, self).read(size)
+        self.reads.append(len(data))
+        return data
+
+    def read1(self, size=-1):
+        data = super(FakeResponse, self).read1(size)
+        self.reads.append(len(data))
+        return data
+
+
+class DecodingReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.items = [{'server': {'server_number': num,
+                                  'server_name': 'server{0}'.format(num)}}
+                      for num in range(500)]
+        self.body = json.dumps(self.items).encode('utf-8')
+
+    def decode(self, response, size=1024):
+        reader = decoding_reader(response)
+        reader.chunk_size = 512
+        items = list(iter_json_array(iter_chunks(reader, size)))
+        return reader, items
+
+    def test_identity(self):
+        reader, items = self.decode(FakeResponse(self.body))
+        self.assertEqual(items, self.items)
+        self.assertEqual(reader.encoding, 'identity')
+        self.assertEqual(reader.wire_bytes, len(self.body))
+        self.assertEqual(reader.ratio, 1.0)
+
+    def test_gzip(self):
+        compressed = gzip.compress(self.body)
+        reader, items = self.decode(FakeResponse(compressed, 'gzip'))
+        self.assertEqual(items, self.items)
+        self.assertEqual(reader.wire_bytes, len(compressed))
+        self.assertEqual(reader.decoded_bytes, len(self.body))
+        self.assertGreater(reader.ratio, 5)
+
+    def test_deflate(self):
+        reader, items = self.decode(FakeResponse(zlib.compress(self.body),
+                                                 'deflate'))
+        self.assertEqual(items, self.items)
+
+    def test_raw_deflate(self):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = compressor.compress(self.body) + compressor.flush()
+        reader, items = self.decode(FakeResponse(raw, 'Deflate'))
+        self.assertEqual(items, self.items)
+
+    def test_streaming(self):
+        response = FakeResponse(gzip.compress(self.body), 'gzip')
+        reader = DecodingReader(response, 'gzip', chunk_size=64)
+        self.assertEqual(reader.read(10), self.body[:10])
+        self.assertLess(sum(response.reads), len(response.getvalue()))
+
+    def test_corrupt(self):
+        response = FakeResponse(b'not compressed at all', 'gzip')
+        self.assertRaises(ValueError, decoding_reader(response).read)
+
+    def test_unsupported(self):
+        response = FakeResponse(self.body, 'br')
+        self.assertRaises(ValueError, decoding_reader, response)
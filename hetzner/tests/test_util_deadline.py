@@ -0,0 +1,134 @@
+import time
+import socket
+import threading
+import unittest
+
+try:
+    from httplib import HTTPConnection
+except ImportError:
+    from http.client import HTTPConnection
+
+from hetzner import DeadlineExceeded
+from hetzner.robot import RobotConnection
+from hetzner.util import deadline
+from hetzner.util.parallel import run_parallel
+
+
+class DeadlineTestCase(unittest.TestCase):
+    def test_nested(self):
+        with deadline.deadline(10):
+            with deadline.deadline(None):
+                self.assertLessEqual(deadline.remaining(), 10)
+            with deadline.deadline(0):
+                self.assertRaises(DeadlineExceeded, deadline.check)
+        self.assertIsNone(deadline.current())
+
+    def test_worker_threads(self):
+        with deadline.deadline(10):
+            results = list(run_parallel(lambda _: deadline.remaining(),
+                                        range(2), 2))
+        self.assertTrue(all(0 < r.value <= 10 for r in results))
+
+
+class HungServerTestCase(unittest.TestCase):
+    """
+    Requests to a server which accepts connections but never answers.
+    """
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.clients = []
+        self.thread = threading.Thread(target=self.accept)
+        self.thread.daemon = True
+        self.thread.start()
+
+        port = self.server.getsockname()[1]
+        self.conn = RobotConnection('user', 'passwd')
+        self.conn.pool.factory = lambda: HTTPConnection('127.0.0.1', port)
+
+    def accept(self):
+        while True:
+            try:
+                self.clients.append(self.server.accept()[0])
+            except socket.error:
+                return
+
+    def tearDown(self):
+        self.server.close()
+        for client in self.clients:
+            client.close()
+
+    def assertFailsFast(self, func, limit=0.2):
+        start = time.monotonic()
+        self.assertRaises(DeadlineExceeded, func)
+        self.assertLess(time.monotonic() - start, limit)
+
+    def test_timeout_argument(self):
+        self.assertFailsFast(lambda: self.conn.get('/server', timeout=0.05))
+
+    def test_deadline(self):
+        def nested():
+            with deadline.deadline(0.05):
+                self.conn.get('/server', timeout=10)
+        self.assertFailsFast(nested)
+
+    def test_streaming(self):
+        self.assertFailsFast(
+            lambda: list(self.conn.get_iter('/server', timeout=0.05))
+        )
+
+    def test_connection_timeout(self):
+        self.conn.timeout = 0.05
+        self.assertFailsFast(lambda: self.conn.post('/server', {}))
+
+
+class TricklingServerTestCase(HungServerTestCase):
+    """
+    Requests to a server which sends the response headers right away but
+    the body only a byte at a time, each one well within the timeout of a
+    single read.
+    """
+    def accept(self):
+        while True:
+            try:
+                client = self.server.accept()[0]
+            except socket.error:
+                return
+            self.clients.append(client)
+            thread = threading.Thread(target=self.trickle, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def trickle(self, client):
+        try:
+            client.recv(65536)
+            client.sendall(b"HTTP/1.1 200 OK\r\n"
+                           b"Content-Type: application/json\r\n"
+                           b"Content-Length: 100000\r\n\r\n[")
+            for _ in range(100000):
+                client.sendall(b" ")
+                time.sleep(0.01)
+        except socket.error:
+            pass
+
+    def assertFailsFast(self, func, limit=1):
+        super(TricklingServerTestCase, self).assertFailsFast(func, limit)
+
+    def test_timeout_argument(self):
+        self.assertFailsFast(lambda: self.conn.get('/server', timeout=0.2))
+
+    def test_deadline(self):
+        def nested():
+            with deadline.deadline(0.2):
+                self.conn.get('/server', timeout=10)
+        self.assertFailsFast(nested)
+
+    def test_streaming(self):
+        self.assertFailsFast(
+            lambda: list(self.conn.get_iter('/server', timeout=0.2))
+        )
+
+    def test_connection_timeout(self):
+        self.conn.timeout = 0.2
+        self.assertFailsFast(lambda: self.conn.get('/server'))
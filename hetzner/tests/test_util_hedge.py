@@ -0,0 +1,49 @@
+import time
+import threading
+import unittest
+
+from hetzner.util.hedge import Hedger
+
+
+class HedgerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hedger = Hedger(max_ratio=0.5, min_samples=2,
+                             initial_delay=0.05)
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def tearDown(self):
+        self.hedger.shutdown()
+
+    def func(self):
+        with self.lock:
+            latency = self.latencies.pop(0)
+        time.sleep(latency)
+        return latency
+
+    def test_fast_call_not_hedged(self):
+        self.latencies = [0]
+        self.assertEqual(self.hedger.call(self.func), 0)
+        self.assertEqual(self.hedger.stats['hedges'], 0)
+
+    def test_hedge_wins(self):
+        self.latencies = [0, 0, 2, 0]
+        self.hedger.call(self.func)
+        self.hedger.call(self.func)
+        start = time.monotonic()
+        self.assertEqual(self.hedger.call(self.func), 0)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.hedger.stats['hedges'], 1)
+        self.assertEqual(self.hedger.stats['wins'], 1)
+
+    def test_hedge_rate_capped(self):
+        self.latencies = [0.2, 0.2, 0.2, 0.2]
+        self.hedger.call(self.func)
+        self.hedger.call(self.func)
+        self.assertEqual(self.hedger.stats['hedges'], 1)
+        self.assertEqual(self.hedger.stats['suppressed'], 1)
+
+    def test_hedge_error(self):
+        def fail():
+            raise ValueError("nope")
+        self.assertRaises(ValueError, self.hedger.call, fail)
@@ -0,0 +1,92 @@
+import io
+import unittest
+
+from hetzner.util.scraping import (StreamingExtractor, InputValue,
+                                   ClassPresent, LabelledValue, ListItems)
+
+ADMIN_PAGE = b'''
+<html><body>
+<div class="box">
+  <p class="label_req">Login:</p>
+  <div class="element">#123456+AbCdE</div>
+  <p class="label_req">Password:</p>
+  <div class="element"><input type="password" name="password[new]"/></div>
+  <input type="hidden" name="password[_csrf_token]" value="tok3n"/>
+</div>
+''' + b'<p>padding</p>\n' * 10000 + b'</body></html>'
+
+ERROR_PAGE = b'''
+<div class="msgbox_error">
+  <ul class="error_list">
+    <li> Password too short </li>
+    <li>Passwords don't match</li>
+  </ul>
+</div>
+'''
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, body):
+        io.BytesIO.__init__(self, body)
+        self.reads = 0
+        self.closed_early = False
+
+    def read(self, size=-1):
+        self.reads += 1
+        return io.BytesIO.read(self, size)
+
+    def close(self):
+        self.closed_early = True
+
+
+class StreamingExtractorTestCase(unittest.TestCase):
+    def test_early_termination(self):
+        response = FakeResponse(ADMIN_PAGE)
+        extractor = StreamingExtractor(
+            login=LabelledValue('Login'),
+            token=InputValue('password[_csrf_token]'),
+        )
+        result = extractor.extract(response, drain=False, chunk_size=512)
+        self.assertEqual(result, {'login': '#123456+AbCdE',
+                                  'token': 'tok3n'})
+        self.assertTrue(response.closed_early)
+        self.assertLess(response.tell(), 1024)
+
+    def test_split_chunks(self):
+        def extract(chunk_size):
+            extractor = StreamingExtractor(
+                login=LabelledValue('Login'),
+                token=InputValue('password[_csrf_token]'),
+                success=ClassPresent('msgbox_success'),
+            )
+            return extractor.extract(FakeResponse(ADMIN_PAGE),
+                                     chunk_size=chunk_size)
+
+        whole = extract(len(ADMIN_PAGE))
+        self.assertEqual(whole['login'], '#123456+AbCdE')
+        self.assertEqual(extract(1), whole)
+
+    def test_drain(self):
+        response = FakeResponse(ADMIN_PAGE)
+        extractor = StreamingExtractor(login=LabelledValue('Login'))
+        extractor.extract(response, chunk_size=512)
+        self.assertEqual(response.tell(), len(ADMIN_PAGE))
+        self.assertFalse(response.closed_early)
+
+    def test_missing(self):
+        extractor = StreamingExtractor(
+            login=LabelledValue('Login'),
+            success=ClassPresent('msgbox_success'),
+        )
+        result = extractor.extract(FakeResponse(ERROR_PAGE))
+        self.assertEqual(result, {'login': None, 'success': False})
+
+    def test_list_items(self):
+        extractor = StreamingExtractor(
+            success=ClassPresent('msgbox_success'),
+            errors=ListItems('error_list'),
+        )
+        result = extractor.extract(FakeResponse(ERROR_PAGE), chunk_size=7)
+        self.assertEqual(result['errors'], ['Password too short',
+                                            "Passwords don't match"])
+        self.assertFalse(result['success'])
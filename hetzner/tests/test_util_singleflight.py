@@ -0,0 +1,100 @@
+import socket
+import threading
+import unittest
+
+from hetzner import DeadlineExceeded
+from hetzner.util.singleflight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.executions = 0
+
+    def slow(self, value):
+        def call():
+            self.executions += 1
+            self.started.set()
+            self.release.wait(5)
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return call
+
+    def run_concurrently(self, count, func, key='/server'):
+        results = [None] * count
+
+        def run(index):
+            try:
+                results[index] = self.flight.do(key, func)
+            except Exception as err:
+                results[index] = err
+
+        threads = [threading.Thread(target=run, args=(0,))]
+        threads[0].start()
+        self.started.wait(5)
+        for index in range(1, count):
+            threads.append(threading.Thread(target=run, args=(index,)))
+            threads[-1].start()
+        while self.flight.stats['calls'] < count:
+            threading.Event().wait(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_collapse(self):
+        results = self.run_concurrently(4, self.slow({'a': [1]}))
+        self.assertEqual(self.executions, 1)
+        self.assertEqual(results, [{'a': [1]}] * 4)
+        self.assertEqual(self.flight.stats['collapsed'], 3)
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_results_are_independent(self):
+        results = self.run_concurrently(3, self.slow({'a': [1]}))
+        results[0]['a'].append(2)
+        self.assertEqual(results[1], {'a': [1]})
+        self.assertIsNot(results[1], results[2])
+
+    def test_errors_are_shared(self):
+        error = ValueError("nope")
+        results = self.run_concurrently(3, self.slow(error))
+        self.assertEqual(results, [error] * 3)
+        self.assertEqual(self.executions, 1)
+
+    def test_leader_deadline_not_shared(self):
+        error = DeadlineExceeded("Request exceeded its deadline.")
+        leader = self.slow(error)
+
+        def call():
+            # Only the first execution runs into the leader's deadline.
+            if self.executions == 0:
+                return leader()
+            self.executions += 1
+            return 'ok'
+
+        results = self.run_concurrently(3, call)
+        self.assertIs(results[0], error)
+        self.assertEqual(results[1:], ['ok', 'ok'])
+        self.assertEqual(self.flight.stats['retries'], 2)
+        self.assertLessEqual(self.executions, 3)
+
+    def test_follower_timeout(self):
+        self.started.clear()
+        thread = threading.Thread(target=self.flight.do,
+                                  args=('/server', self.slow(1)))
+        thread.start()
+        self.started.wait(5)
+        try:
+            self.assertRaises(socket.timeout, self.flight.do, '/server',
+                              self.slow(2), 0.01)
+        finally:
+            self.release.set()
+            thread.join()
+
+    def test_sequential_calls_not_collapsed(self):
+        self.flight.do('/server', lambda: 1)
+        self.flight.do('/server', lambda: 2)
+        self.assertEqual(self.flight.stats['executions'], 2)
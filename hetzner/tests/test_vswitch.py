@@ -0,0 +1,142 @@
+import pickle
+import threading
+import unittest
+
+from hetzner import RobotError
+from hetzner.robot import Robot
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.requests = []
+        self.vswitches = {}
+        self.failing = set()
+        self.lock = threading.Lock()
+
+    def _vswitch(self, vid):
+        return self.vswitches.setdefault(vid, {
+            'id': vid, 'name': 'net{0}'.format(vid), 'vlan': 4000 + vid,
+            'cancelled': False, 'server': [], 'subnet': [],
+            'cloud_network': [],
+        })
+
+    def _member(self, ip, status):
+        number = int(ip.rsplit('.', 1)[1])
+        return {'server_ip': ip, 'server_ipv6_net': '2a01:4f8:{0}::'
+                .format(number), 'server_number': number, 'status': status}
+
+    def get(self, path):
+        with self.lock:
+            self.requests.append(('GET', path))
+            if path == '/vswitch':
+                return [dict((key, value) for key, value in vs.items()
+                             if key in ('id', 'name', 'vlan', 'cancelled'))
+                        for vs in self.vswitches.values()]
+            vswitch = self._vswitch(int(path.rsplit('/', 1)[1]))
+            result = dict(vswitch, server=[dict(s)
+                                           for s in vswitch['server']])
+            # Every poll brings the servers in process one step further.
+            for server in vswitch['server']:
+                if server['status'] == 'in process':
+                    server['status'] = 'ready'
+            return result
+
+    def post(self, path, data):
+        with self.lock:
+            self.requests.append(('POST', path, data))
+            vid = len(self.vswitches) + 1
+            return dict(self._vswitch(vid), **data)
+
+    def request(self, method, path, data=None, allow_empty=False):
+        with self.lock:
+            self.requests.append((method, path, data))
+            if self.failing.intersection((data or {}).get('server', [])):
+                raise RobotError("Server is being changed", 409)
+            vswitch = self._vswitch(int(path.split('/')[2]))
+            if not path.endswith('/server'):
+                vswitch.update(data)
+                return None
+            ips = data['server']
+            if method == 'POST':
+                vswitch['server'] += [self._member(ip, 'in process')
+                                      for ip in ips]
+            else:
+                vswitch['server'] = [s for s in vswitch['server']
+                                     if s['server_ip'] not in ips]
+
+
+class VSwitchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.robot = Robot.from_connection(self.conn)
+
+    def membership_requests(self):
+        return [r for r in self.conn.requests
+                if r[0] != 'GET' and r[1].endswith('/server')]
+
+    def test_create_and_list(self):
+        vswitch = self.robot.vswitch.create('backend', 4001)
+        self.assertEqual((vswitch.id, vswitch.name, vswitch.vlan),
+                         (1, 'backend', 4001))
+        self.assertEqual([vs.id for vs in self.robot.vswitch], [1])
+        copy = pickle.loads(pickle.dumps(vswitch))
+        self.assertEqual(copy.to_dict(), vswitch.to_dict())
+
+    def test_batch(self):
+        ips = ['10.0.0.{0}'.format(n) for n in range(1, 101)]
+        with self.robot.vswitch.batch() as batch:
+            batch.add(1, ips[:50])
+            batch.add(2, ips[50:])
+            batch.remove(2, ips[-1:])
+        self.assertEqual(len(self.membership_requests()), 2)
+        statuses = self.robot.vswitch.wait([1, 2], interval=0.01)
+        self.assertEqual(len(statuses[1]), 50)
+        self.assertEqual(len(statuses[2]), 49)
+        self.assertEqual(set(statuses[1].values()), set(['ready']))
+
+    def test_batch_max_servers(self):
+        batch = self.robot.vswitch.batch(max_servers=30)
+        batch.add(1, ['10.0.0.{0}'.format(n) for n in range(1, 101)])
+        self.assertEqual(batch.apply(), [1])
+        self.assertEqual([len(r[2]['server'])
+                          for r in self.membership_requests()],
+                         [30, 30, 30, 10])
+
+    def test_batch_failure(self):
+        batch = self.robot.vswitch.batch(max_servers=2)
+        batch.add(1, ['10.0.0.1'])
+        batch.add(2, ['10.0.0.2', '10.0.0.3', '10.0.0.4'])
+        batch.remove(2, ['10.0.0.5'])
+        batch.add(3, ['10.0.0.6'])
+        # The removal and the first chunk of additions succeed.
+        self.conn.failing.update(['10.0.0.4', '10.0.0.6'])
+        with self.assertRaises(RobotError) as ctx:
+            batch.apply()
+        self.assertIn('vSwitch 2', str(ctx.exception))
+        self.assertIn('vSwitch 3', str(ctx.exception))
+        self.assertEqual(sorted(batch.errors), [2, 3])
+        self.assertEqual(batch.plan(), [(2, ['10.0.0.4'], []),
+                                        (3, ['10.0.0.6'], [])])
+
+        self.conn.failing.clear()
+        self.assertEqual(batch.apply(), [2, 3])
+        self.assertEqual(batch.plan(), [])
+        self.assertEqual(batch.errors, {})
+        self.assertEqual(sorted(self.robot.vswitch.get(2).members()),
+                         ['10.0.0.2', '10.0.0.3', '10.0.0.4'])
+
+    def test_set_servers(self):
+        vswitch = self.robot.vswitch.get(1)
+        vswitch.add_servers(['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        # Servers can be given by their number as well.
+        added, removed = vswitch.set_servers(['10.0.0.2', 3, '10.0.0.5'])
+        self.assertEqual(added, ['10.0.0.5'])
+        self.assertEqual(removed, ['10.0.0.1'])
+        self.assertEqual(len(self.membership_requests()), 3)
+        self.assertEqual(sorted(vswitch.members()),
+                         ['10.0.0.2', '10.0.0.3', '10.0.0.5'])
+
+    def test_wait_failed(self):
+        self.robot.vswitch.get(1).add_servers(['10.0.0.1'])
+        self.conn.vswitches[1]['server'][0]['status'] = 'failed'
+        self.assertRaises(RobotError, self.robot.vswitch.wait, [1])
@@ -0,0 +1,73 @@
+import copy
+import unittest
+
+from hetzner import RateLimitError
+from hetzner.watch import (Watcher, FailoverMoved, PtrChanged, IpLockChanged,
+                           Added)
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.collections = {
+            '/failover': [{'failover': {'ip': '9.9.9.9',
+                                        'active_server_ip': '1.0.0.1'}}],
+            '/rdns': [{'rdns': {'ip': '1.0.0.1', 'ptr': 'a.example.com'}}],
+            '/ip': [{'ip': {'ip': '1.0.0.1', 'locked': False}}],
+        }
+        self.rate_limited = False
+
+    def get_iter(self, path):
+        if self.rate_limited:
+            raise RateLimitError("rate limited", 403, 100, 3600)
+        return iter(copy.deepcopy(self.collections[path]))
+
+
+class WatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.watcher = Watcher(self.conn, ['failover', 'ip', 'rdns'],
+                               min_interval=10, max_interval=100,
+                               max_requests=1000)
+
+    def test_initial_poll(self):
+        self.assertEqual(self.watcher.poll(now=0), [])
+        self.assertEqual(self.watcher.stats['requests'], 3)
+
+    def test_typed_changes(self):
+        self.watcher.poll(now=0)
+        self.conn.collections['/failover'][0]['failover'][
+            'active_server_ip'] = '1.0.0.2'
+        self.conn.collections['/rdns'].append(
+            {'rdns': {'ip': '1.0.0.2', 'ptr': 'b.example.com'}}
+        )
+        self.conn.collections['/rdns'][0]['rdns']['ptr'] = 'c.example.com'
+        self.conn.collections['/ip'][0]['ip']['locked'] = True
+
+        changes = self.watcher.poll(now=20)
+        self.assertEqual([type(c) for c in changes],
+                         [FailoverMoved, IpLockChanged, PtrChanged, Added])
+        self.assertEqual(changes[0].new, '1.0.0.2')
+        self.assertTrue(changes[1].locked)
+        self.assertEqual(changes[2].key, '1.0.0.1')
+        self.assertEqual(changes[3].key, '1.0.0.2')
+
+    def test_adaptive_interval(self):
+        self.watcher.poll(now=0)
+        self.assertEqual(self.watcher.intervals()['rdns'], 15)
+        self.watcher.poll(now=15)
+        self.assertEqual(self.watcher.intervals()['rdns'], 22.5)
+        self.assertEqual(self.watcher.poll(now=30), [])
+        self.assertEqual(self.watcher.stats['polls'], 2)
+
+        self.conn.collections['/rdns'][0]['rdns']['ptr'] = 'c.example.com'
+        self.watcher.poll(now=40)
+        self.assertEqual(self.watcher.intervals()['rdns'], 11.25)
+        self.assertEqual(self.watcher.intervals()['ip'], 33.75)
+
+    def test_rate_limit(self):
+        self.watcher.poll(now=0)
+        self.conn.rate_limited = True
+        self.watcher.poll(now=15)
+        self.assertEqual(self.watcher.stats['rate_limited'], 3)
+        # Two of the 100 requests per hour learned from the error are used.
+        self.assertAlmostEqual(self.watcher.next_poll(now=15), 3600 / 98.0)
@@ -0,0 +1,135 @@
+import threading
+import unittest
+
+from hetzner.robot import (ROBOT_LOGINHOST, RobotConnection,
+                           RobotWebInterface, RobotWebInterfacePool)
+
+
+class FakeSession(RobotWebInterface):
+    def login(self, user=None, passwd=None, force=False):
+        if self.logged_in and not force:
+            return
+        self.logins = getattr(self, 'logins', 0) + 1
+        self.logged_in = True
+
+
+class FakePool(RobotWebInterfacePool):
+    session_class = FakeSession
+
+
+class FakeResponse(object):
+    def __init__(self, status, location=None):
+        self.status = status
+        self.location = location
+
+    def getheader(self, name, default=None):
+        if name.lower() == 'location' and self.location is not None:
+            return self.location
+        return default
+
+    def read(self):
+        return b''
+
+
+class FakeConnection(object):
+    sock = None
+    timeout = None
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def request(self, method, path, data, headers):
+        self.sent.append(path)
+
+    def getresponse(self):
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+class WebInterfacePoolTestCase(unittest.TestCase):
+    def test_size(self):
+        pool = FakePool('user', 'passwd', size=2)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertIsNot(first, second)
+
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(
+            pool.acquire()
+        ))
+        waiter.start()
+        waiter.join(0.1)
+        # The pool is exhausted, so the third caller has to wait.
+        self.assertTrue(waiter.is_alive())
+        pool.release(second)
+        waiter.join(5)
+        self.assertEqual(acquired, [second])
+        self.assertEqual(pool._created, 2)
+
+    def test_map(self):
+        pool = FakePool('user', 'passwd', size=3)
+        lock = threading.Lock()
+        barrier = threading.Barrier(3, timeout=5)
+        sessions = set()
+
+        def func(session, item):
+            self.assertTrue(session.logged_in)
+            with lock:
+                sessions.add(session)
+            # Only passes if three items are processed at the same time.
+            barrier.wait()
+            return item * 2
+
+        results = list(pool.map(func, range(6), ordered=True))
+        self.assertEqual([result.value for result in results],
+                         [0, 2, 4, 6, 8, 10])
+        self.assertEqual(len(sessions), 3)
+        self.assertEqual([session.logins for session in sessions], [1] * 3)
+
+    def test_default_scraper(self):
+        conn = RobotConnection('user', 'passwd')
+        conn.scrapers.session_class = FakeSession
+        sessions = [conn.scrapers.acquire() for _ in range(4)]
+        self.assertIs(sessions[0], conn.scraper)
+        self.assertEqual(len(set(sessions)), 4)
+        self.assertEqual(conn.scrapers._created, conn.scrapers.size)
+
+
+class SessionExpiryTestCase(unittest.TestCase):
+    def request(self, *responses):
+        session = FakeSession('user', 'passwd')
+        session.logged_in = True
+        session.logins = 0
+        session.conn = FakeConnection(responses)
+        response = session.request('/server')
+        return session, response
+
+    def test_redirect_to_login(self):
+        location = 'https://{0}/login'.format(ROBOT_LOGINHOST)
+        session, response = self.request(FakeResponse(302, location),
+                                         FakeResponse(200))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(session.logins, 1)
+        self.assertEqual(session.conn.sent, ['/server', '/server'])
+
+    def test_unauthorized(self):
+        session, response = self.request(FakeResponse(401),
+                                         FakeResponse(200))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(session.logins, 1)
+
+    def test_relogin_once(self):
+        session, response = self.request(FakeResponse(401),
+                                         FakeResponse(401))
+        self.assertEqual(response.status, 401)
+        self.assertEqual(session.logins, 1)
+        self.assertEqual(session.conn.sent, ['/server', '/server'])
+
+    def test_other_redirect(self):
+        session, response = self.request(
+            FakeResponse(302, 'https://example.com/')
+        )
+        self.assertEqual(response.status, 302)
+        self.assertEqual(session.logins, 0)
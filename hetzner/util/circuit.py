@@ -0,0 +1,247 @@
+import time
+import socket
+import threading
+
+from contextlib import contextmanager
+
+try:
+    from httplib import HTTPException
+except ImportError:
+    from http.client import HTTPException
+
+from hetzner import CircuitOpen, DeadlineExceeded, RateLimitError, RobotError
+
+__all__ = ['CircuitBreaker', 'CircuitBreakers', 'endpoint_class',
+           'is_outage']
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def endpoint_class(path):
+    """
+    Return the class of endpoint the request 'path' belongs to, which is
+    its first path component.
+
+    >>> endpoint_class('/server/1.2.3.4'), endpoint_class('/rdns?x=y')
+    ('server', 'rdns')
+    """
+    return path.split('?', 1)[0].strip('/').split('/', 1)[0]
+
+
+def is_outage(err):
+    """
+    Whether the exception 'err' indicates that the Robot is unavailable as
+    opposed to rejecting a particular request.
+    """
+    if isinstance(err, (CircuitOpen, RateLimitError)):
+        return False
+    if isinstance(err, (DeadlineExceeded, socket.error, HTTPException)):
+        return True
+    if isinstance(err, RobotError):
+        return err.status is not None and err.status >= 500
+    return False
+
+
+class CircuitBreaker(object):
+    """
+    Stop sending requests to an endpoint after 'failures' consecutive
+    failures, where calls taking longer than 'slow_call' seconds count as
+    failures as well. While the breaker is open, calls fail immediately
+    with CircuitOpen. After 'reset_timeout' seconds a single probe call is
+    let through (half-open), whose outcome decides whether to close the
+    breaker again or to keep it open for another 'reset_timeout' seconds.
+
+    >>> breaker = CircuitBreaker('api', failures=2, reset_timeout=30)
+    >>> breaker.failure(); breaker.failure(); breaker.state
+    'open'
+    >>> breaker.before()
+    Traceback (most recent call last):
+      ...
+    hetzner.CircuitOpen: Circuit for api is open, retry in 30.0 seconds.
+    """
+    def __init__(self, name, failures=5, reset_timeout=30, slow_call=None):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.stats = {
+            'calls': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'rejected': 0,
+            'trips': 0,
+        }
+        self._state = CLOSED
+        self._streak = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _current_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def retry_after(self):
+        """
+        Return the number of seconds until the next probe is allowed.
+        """
+        with self._lock:
+            if self._state != OPEN:
+                return 0
+            return max(0, self._opened_at + self.reset_timeout -
+                       time.monotonic())
+
+    def before(self):
+        """
+        Raise CircuitOpen if no call may be made right now.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                self.stats['calls'] += 1
+                return
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self.stats['calls'] += 1
+                return
+            self.stats['rejected'] += 1
+            if state == OPEN:
+                retry = self._opened_at + self.reset_timeout - \
+                    time.monotonic()
+            else:
+                retry = 0
+        raise CircuitOpen("Circuit for {0} is open, retry in {1:.1f}"
+                          " seconds.".format(self.name, retry),
+                          self.name, retry)
+
+    def _trip(self, now):
+        if self._state != OPEN:
+            self.stats['trips'] += 1
+        self._state = OPEN
+        self._opened_at = now
+        self._probing = False
+
+    def success(self, latency=None):
+        """
+        Record a successful call, which took 'latency' seconds.
+        """
+        if self.slow_call is not None and latency is not None and \
+           latency > self.slow_call:
+            with self._lock:
+                self.stats['slow_calls'] += 1
+            self.failure()
+            return
+        with self._lock:
+            # Calls which were already in progress when the breaker opened
+            # don't close it again, only a probe does.
+            if self._current_state(time.monotonic()) == OPEN:
+                return
+            self._streak = 0
+            self._state = CLOSED
+            self._probing = False
+
+    def failure(self):
+        """
+        Record a failed call.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.stats['failures'] += 1
+            self._streak += 1
+            if self._current_state(now) == HALF_OPEN or \
+               self._streak >= self.failures:
+                self._trip(now)
+
+    def release(self):
+        """
+        Record a call without a meaningful outcome, for example one that
+        has been cancelled.
+        """
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def guard(self, is_failure=is_outage):
+        """
+        Context manager for making a call through this breaker, which
+        counts exceptions for which 'is_failure' returns True as failures.
+        """
+        self.before()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as err:
+            if is_failure(err):
+                self.failure()
+            else:
+                self.success(time.monotonic() - started)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.success(time.monotonic() - started)
+
+    def status(self):
+        """
+        Return a dictionary describing the state of this breaker.
+        """
+        state = self.state
+        return {
+            'state': state,
+            'consecutive_failures': self._streak,
+            'retry_after': self.retry_after(),
+            'stats': dict(self.stats),
+        }
+
+
+class CircuitBreakers(object):
+    """
+    Circuit breakers per host and endpoint class, which are created on
+    demand using the keyword arguments of CircuitBreaker.
+    """
+    def __init__(self, **options):
+        self.options = options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, endpoint):
+        key = "{0}/{1}".format(host, endpoint)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(key, **self.options)
+                self._breakers[key] = breaker
+            return breaker
+
+    def for_request(self, host, path):
+        """
+        Return the breaker responsible for a request of 'path' on 'host'.
+        """
+        return self.get(host, endpoint_class(path))
+
+    def is_open(self, host=None):
+        """
+        Whether any breaker (of the given host) is not closed.
+        """
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return any(breaker.state != CLOSED for key, breaker in breakers
+                   if host is None or key.startswith(host + '/'))
+
+    def status(self):
+        """
+        Return a dictionary mapping the names of all breakers to their
+        status.
+        """
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return dict((key, breaker.status()) for key, breaker in breakers)
@@ -0,0 +1,124 @@
+import zlib
+
+__all__ = ['ACCEPT_ENCODING', 'DecodingReader', 'decoding_reader']
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class DecodingReader(object):
+    """
+    File-like object decompressing the body of an HTTP 'response' with the
+    given content 'encoding' ("gzip", "deflate" or "identity") while it is
+    being read, so that neither the compressed nor the decompressed body
+    needs to be kept in memory as a whole.
+
+    The number of bytes received and returned so far are available in
+    'wire_bytes' and 'decoded_bytes'. If the response has a read1() method,
+    it's used so that only data which has already arrived is received.
+
+    >>> import io
+    >>> body = io.BytesIO(zlib.compress(b'[1, 2, 3]' * 100))
+    >>> reader = DecodingReader(body, 'deflate')
+    >>> reader.read(9), len(reader.read())
+    (b'[1, 2, 3]', 891)
+    >>> reader.wire_bytes < reader.decoded_bytes
+    True
+    """
+    def __init__(self, response, encoding='identity', chunk_size=16384):
+        self.response = response
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self._read = getattr(response, 'read1', response.read)
+        self._decompressor = None
+        self._header = bytearray()
+        self._buffer = bytearray()
+        self._eof = False
+
+    def _create_decompressor(self, first_chunk):
+        if self.encoding == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Some servers send raw deflate data instead of the zlib format
+        # required by the specification, so check for a zlib header.
+        if len(first_chunk) >= 2 and first_chunk[0] & 0x0f == 8 and \
+           (first_chunk[0] << 8 | first_chunk[1]) % 31 == 0:
+            return zlib.decompressobj(zlib.MAX_WBITS)
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def _fill(self):
+        chunk = self._read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            if self._decompressor is None and len(self._header) > 0:
+                self._decompress(b'')
+            if self._decompressor is not None:
+                self._buffer += self._decompressor.flush()
+            return
+        self.wire_bytes += len(chunk)
+        if self.encoding == 'identity':
+            self._buffer += chunk
+        else:
+            self._decompress(chunk)
+
+    def _decompress(self, chunk):
+        if self._decompressor is None:
+            # The first two bytes tell zlib and raw deflate data apart.
+            self._header += chunk
+            if len(self._header) < 2 and not self._eof:
+                return
+            chunk, self._header = bytes(self._header), bytearray()
+            self._decompressor = self._create_decompressor(bytearray(chunk))
+        try:
+            self._buffer += self._decompressor.decompress(chunk)
+        except zlib.error as err:
+            raise ValueError("Unable to decompress {0} response: {1}"
+                             .format(self.encoding, err))
+
+    def _take(self, size):
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.decoded_bytes += len(data)
+        return data
+
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or
+                                 len(self._buffer) < size):
+            self._fill()
+        return self._take(size)
+
+    def read1(self, size=-1):
+        """
+        Return up to 'size' bytes, but only receive more data if nothing is
+        left from previous reads. Returns an empty result at the end.
+        """
+        while not self._eof and len(self._buffer) == 0:
+            self._fill()
+        return self._take(size)
+
+    @property
+    def ratio(self):
+        """
+        The ratio of decoded to received bytes so far, or None if nothing
+        has been received.
+        """
+        if self.wire_bytes == 0:
+            return None
+        return float(self.decoded_bytes) / self.wire_bytes
+
+
+def decoding_reader(response):
+    """
+    Return a DecodingReader for the body of 'response' according to its
+    Content-Encoding header. Raises ValueError for unsupported encodings.
+    """
+    encoding = (response.getheader('content-encoding') or 'identity')
+    encoding = encoding.strip().lower()
+    if encoding == 'x-gzip':
+        encoding = 'gzip'
+    if encoding not in ('gzip', 'deflate', 'identity'):
+        raise ValueError("Unsupported content encoding {0!r}."
+                         .format(encoding))
+    return DecodingReader(response, encoding)
@@ -0,0 +1,167 @@
+import os
+import json
+import socket
+import logging
+
+__all__ = ['ControlServer', 'default_socket_path', 'forward']
+
+
+def default_socket_path():
+    """
+    Return the default location of the control socket, which is within
+    $XDG_RUNTIME_DIR if set and within the home directory otherwise.
+    """
+    runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+    if runtime_dir is not None and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, 'hetznerctl.sock')
+    return os.path.expanduser('~/.hetznerctl.sock')
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b"\n")
+
+
+def _receive(fp):
+    line = fp.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+class StreamWriter(object):
+    """
+    File-like object sending everything written to it to the client as
+    messages for the given 'stream' ("stdout" or "stderr").
+    """
+    def __init__(self, sock, stream):
+        self.sock = sock
+        self.stream = stream
+
+    def write(self, data):
+        if len(data) > 0:
+            _send(self.sock, {'stream': self.stream, 'data': data})
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class ControlServer(object):
+    """
+    Accept requests on the Unix socket at 'path' and pass them to 'handler',
+    one at a time.
+
+    The handler is called with the request dictionary sent by forward() and
+    two file-like objects for standard output and standard error of the
+    client. Its return value is sent back to the client as the exit status,
+    or it returns None without writing anything to decline the request.
+    If 'idle_timeout' is set, serve_forever() returns after that many
+    seconds without a request.
+    """
+    def __init__(self, path, handler, idle_timeout=None):
+        self.path = path
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.logger = logging.getLogger("Control server at {0}".format(path))
+        self.sock = None
+
+    def bind(self):
+        if os.path.exists(self.path):
+            # Only remove the socket if nobody is listening anymore.
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except socket.error:
+                os.unlink(self.path)
+            else:
+                probe.close()
+                raise RuntimeError("Another daemon is already listening on"
+                                   " {0}.".format(self.path))
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        self.sock.listen(16)
+        self.sock.settimeout(self.idle_timeout)
+
+    def handle(self, client):
+        fp = client.makefile('rb')
+        try:
+            request = _receive(fp)
+            if request is None:
+                return
+            out = StreamWriter(client, 'stdout')
+            err = StreamWriter(client, 'stderr')
+            try:
+                status = self.handler(request, out, err)
+            except Exception as exc:
+                self.logger.exception("Error while handling %r.", request)
+                err.write("Error: {0}\n".format(exc))
+                status = 1
+            _send(client, {'exit': status})
+        finally:
+            fp.close()
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.bind()
+        try:
+            while True:
+                try:
+                    client, _ = self.sock.accept()
+                except socket.timeout:
+                    self.logger.info("Idle timeout reached, exiting.")
+                    return
+                client.settimeout(None)
+                try:
+                    self.handle(client)
+                except socket.error as err:
+                    self.logger.warning("Lost connection to client: %s", err)
+                finally:
+                    client.close()
+        finally:
+            self.sock.close()
+            self.sock = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def forward(path, request, stdout, stderr):
+    """
+    Send 'request' to the daemon listening on 'path' and copy its output to
+    the file objects 'stdout' and 'stderr'. Returns the exit status sent by
+    the daemon or None if there is no daemon or it declined the request, in
+    which case nothing has been written to 'stdout' or 'stderr'.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+
+    fp = sock.makefile('rb')
+    written = False
+    try:
+        _send(sock, request)
+        while True:
+            message = _receive(fp)
+            if message is None:
+                # The daemon went away while handling the request, so we
+                # can't tell whether it has been carried out.
+                return 1 if written else None
+            elif 'exit' in message:
+                return message['exit']
+            written = True
+            if message.get('stream') == 'stderr':
+                stderr.write(message['data'])
+                stderr.flush()
+            else:
+                stdout.write(message['data'])
+                stdout.flush()
+    finally:
+        fp.close()
+        sock.close()
@@ -0,0 +1,114 @@
+import time
+import threading
+
+from contextlib import contextmanager
+
+from hetzner import DeadlineExceeded
+
+__all__ = ['apply', 'bind', 'check', 'current', 'deadline', 'expiry',
+           'remaining']
+
+_local = threading.local()
+
+
+def current():
+    """
+    Return the deadline of the current thread as a time.monotonic() value or
+    None if there is no deadline.
+    """
+    return getattr(_local, 'expiry', None)
+
+
+def expiry(timeout=None):
+    """
+    Return the earlier of the current deadline and 'timeout' seconds from
+    now, or None if neither is set.
+    """
+    result = current()
+    if timeout is not None:
+        candidate = time.monotonic() + timeout
+        if result is None or candidate < result:
+            result = candidate
+    return result
+
+
+def remaining(until=None):
+    """
+    Return the number of seconds left until the deadline 'until' (the
+    current one by default) or None if there is no deadline. The result is
+    negative if the deadline has passed already.
+    """
+    if until is None:
+        until = current()
+    if until is None:
+        return None
+    return until - time.monotonic()
+
+
+def check(until=None, what="Request"):
+    """
+    Raise DeadlineExceeded if the deadline 'until' (the current one by
+    default) has passed, otherwise return the remaining seconds or None.
+    """
+    left = remaining(until)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("{0} exceeded its deadline.".format(what))
+    return left
+
+
+@contextmanager
+def deadline(timeout):
+    """
+    Context manager limiting everything within to 'timeout' seconds, unless
+    an enclosing deadline of the current thread ends earlier. If 'timeout'
+    is None, the enclosing deadline is kept as is.
+
+    >>> with deadline(10):
+    ...     with deadline(3600):
+    ...         remaining() <= 10
+    True
+    >>> current() is None
+    True
+    """
+    previous = current()
+    _local.expiry = expiry(timeout)
+    try:
+        yield _local.expiry
+    finally:
+        _local.expiry = previous
+
+
+def bind(func):
+    """
+    Return a wrapper of 'func' which runs it with the deadline of the
+    calling thread, so that the deadline carries over to worker threads.
+    """
+    until = current()
+    if until is None:
+        return func
+
+    def wrapper(*args, **kwargs):
+        previous = current()
+        _local.expiry = until
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.expiry = previous
+    return wrapper
+
+
+def apply(conn, default=None, until=None):
+    """
+    Set the timeout of the HTTP connection 'conn' to the time left until the
+    deadline 'until' (the current one by default) or to 'default' seconds,
+    whichever is shorter, so that connecting, the TLS handshake, sending and
+    every read can't block any longer. Raises DeadlineExceeded if the
+    deadline has passed already.
+    """
+    timeout = check(until)
+    if default is not None and (timeout is None or default < timeout):
+        timeout = default
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return timeout
@@ -0,0 +1,142 @@
+import math
+import time
+import socket
+
+try:
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+except ImportError:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+
+
+class TCPCheck(object):
+    """
+    Health check which succeeds if a TCP connection to 'port' on the checked
+    host can be established within 'timeout' seconds.
+    """
+    def __init__(self, port, timeout=0.5):
+        self.port = port
+        self.timeout = timeout
+
+    def __call__(self, host):
+        try:
+            sock = socket.create_connection((host, self.port), self.timeout)
+            sock.close()
+        except (socket.error, socket.timeout):
+            return False
+        return True
+
+    def __repr__(self):
+        return "<TCPCheck port {0}>".format(self.port)
+
+
+class HTTPCheck(object):
+    """
+    Health check which succeeds if a GET request for 'path' on the checked
+    host returns a status code in 'expect' within 'timeout' seconds.
+    """
+    def __init__(self, path='/', port=None, https=False, timeout=0.5,
+                 expect=range(200, 400), hostname=None):
+        self.path = path
+        self.port = port
+        self.https = https
+        self.timeout = timeout
+        self.expect = expect
+        self.hostname = hostname
+
+    def __call__(self, host):
+        cls = HTTPSConnection if self.https else HTTPConnection
+        conn = cls(host, self.port, timeout=self.timeout)
+        headers = {}
+        if self.hostname is not None:
+            headers['Host'] = self.hostname
+        try:
+            conn.request('GET', self.path, None, headers)
+            status = conn.getresponse().status
+        except (socket.error, socket.timeout, IOError, HTTPException):
+            return False
+        finally:
+            conn.close()
+        return status in self.expect
+
+    def __repr__(self):
+        scheme = "https" if self.https else "http"
+        return "<HTTPCheck {0} {1}>".format(scheme, self.path)
+
+
+class HealthState(object):
+    """
+    Track the health of a destination with hysteresis: it only becomes
+    healthy after 'rise' consecutive successful checks and only becomes
+    unhealthy after 'fall' consecutive failures.
+
+    >>> state = HealthState(rise=2, fall=2, healthy=False)
+    >>> [state.update(ok) for ok in [True, False, True, True, False, False]]
+    [False, False, False, True, True, False]
+    """
+    def __init__(self, rise=3, fall=2, healthy=False):
+        self.rise = rise
+        self.fall = fall
+        self.healthy = healthy
+        self._streak = 0
+
+    def update(self, success):
+        """
+        Record the result of a check and return the resulting health.
+        """
+        if success == self.healthy:
+            self._streak = 0
+            return self.healthy
+
+        self._streak += 1
+        if self._streak >= (self.rise if success else self.fall):
+            self.healthy = success
+            self._streak = 0
+        return self.healthy
+
+
+class FlapDamper(object):
+    """
+    Suppress a flapping destination similar to BGP route flap damping: every
+    health transition adds 'penalty', which decays exponentially with the
+    given 'half_life' in seconds. The destination is suppressed once the
+    accumulated penalty exceeds 'suppress' and reused again as soon as it
+    has decayed below 'reuse'.
+
+    >>> damper = FlapDamper(half_life=10, penalty=1000, suppress=2500,
+    ...                     reuse=1000)
+    >>> [damper.flap(now=0), damper.flap(now=0), damper.flap(now=0)]
+    [False, False, True]
+    >>> damper.is_suppressed(now=10), damper.is_suppressed(now=20)
+    (True, False)
+    """
+    def __init__(self, half_life=60, penalty=1000, suppress=2500, reuse=750):
+        self.half_life = half_life
+        self.penalty = penalty
+        self.suppress = suppress
+        self.reuse = reuse
+        self.suppressed = False
+        self._value = 0.0
+        self._updated = None
+
+    def _decay(self, now):
+        if self._updated is not None:
+            elapsed = max(0, now - self._updated)
+            self._value *= math.pow(0.5, elapsed / float(self.half_life))
+        self._updated = now
+
+    def flap(self, now=None):
+        """
+        Record a health transition and return whether the destination is
+        suppressed now.
+        """
+        self._decay(time.monotonic() if now is None else now)
+        self._value += self.penalty
+        if self._value > self.suppress:
+            self.suppressed = True
+        return self.suppressed
+
+    def is_suppressed(self, now=None):
+        self._decay(time.monotonic() if now is None else now)
+        if self.suppressed and self._value < self.reuse:
+            self.suppressed = False
+        return self.suppressed
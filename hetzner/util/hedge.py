@@ -0,0 +1,120 @@
+import math
+import time
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from hetzner.util import deadline
+
+__all__ = ['Hedger', 'percentile']
+
+
+def percentile(samples, pct):
+    """
+    Return the 'pct' percentile of the sorted list 'samples' using the
+    nearest-rank method.
+
+    >>> percentile([0.1, 0.2, 0.3, 0.4, 5.0], 80)
+    0.4
+    >>> percentile([0.1, 0.2, 0.3, 0.4, 5.0], 99)
+    5.0
+    """
+    rank = int(math.ceil(pct / 100.0 * len(samples)))
+    return samples[max(rank, 1) - 1]
+
+
+class Hedger(object):
+    """
+    Run idempotent calls so that a duplicate is started if the first one
+    hasn't finished after the 'pct' percentile of the latencies observed so
+    far (or 'initial_delay' seconds until there are 'min_samples' of them),
+    using whichever result arrives first.
+
+    At most 'max_ratio' of all calls are hedged, so that a general slowdown
+    doesn't double the load. Counters are available in 'stats', where
+    'wins' is the number of hedges which have been faster than the
+    original call.
+    """
+    def __init__(self, pct=95, max_ratio=0.1, min_samples=20, window=500,
+                 initial_delay=1.0, max_workers=16):
+        self.pct = pct
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.max_workers = max_workers
+        self.stats = {
+            'calls': 0,
+            'hedges': 0,
+            'wins': 0,
+            'suppressed': 0,
+        }
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def delay(self):
+        """
+        Return the number of seconds after which a call is hedged.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return percentile(samples, self.pct)
+
+    def _submit(self, func):
+        started = time.monotonic()
+
+        def record(future):
+            if future.exception() is None:
+                with self._lock:
+                    self._samples.append(time.monotonic() - started)
+
+        future = self._executor.submit(func)
+        future.add_done_callback(record)
+        return future
+
+    def _may_hedge(self):
+        with self._lock:
+            if self.stats['hedges'] + 1 > \
+               self.max_ratio * self.stats['calls']:
+                self.stats['suppressed'] += 1
+                return False
+            self.stats['hedges'] += 1
+            return True
+
+    def call(self, func):
+        """
+        Return the result of calling 'func', which may be called a second
+        time concurrently. If all calls fail, the exception of the first one
+        is raised.
+        """
+        with self._lock:
+            self.stats['calls'] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+
+        func = deadline.bind(func)
+        primary = self._submit(func)
+        done, _ = wait([primary], timeout=self.delay())
+        if done or not self._may_hedge():
+            return primary.result()
+
+        hedge = self._submit(func)
+        pending = set([primary, hedge])
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in (primary, hedge):
+                if future in done and future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.stats['wins'] += 1
+                    return future.result()
+        return primary.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -1,8 +1,10 @@
 import os
 import ssl
 import socket
+import threading
 
 from tempfile import NamedTemporaryFile
+from contextlib import contextmanager
 
 try:
     from httplib import HTTPSConnection
@@ -68,3 +70,61 @@ class ValidatedHTTPSConnection(HTTPSConnection):
                                     ca_certs=cafile)
         if bundle is None:
             ca_certs.close()
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of connections created by calling 'factory'. At most
+    'maxsize' idle connections are kept around for reuse; connections
+    released while the pool is full are closed.
+    """
+    def __init__(self, factory, maxsize=8):
+        self.factory = factory
+        self.maxsize = maxsize
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Return an idle connection or create a new one if there is none.
+        """
+        with self._lock:
+            if len(self._idle) > 0:
+                return self._idle.pop()
+        return self.factory()
+
+    def release(self, conn):
+        """
+        Give back a connection previously returned by acquire().
+        """
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager for acquiring and releasing a connection. If an
+        exception occurs, the connection is closed before it's released, so
+        it's reconnected on next use.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except GeneratorExit:
+            # A generator holding the connection has been closed early, which
+            # doesn't mean that the connection itself is broken.
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,92 @@
+import re
+import json
+import codecs
+
+RE_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_chunks(response, size=16384, encoding='utf-8'):
+    """
+    Read the body of the given HTTP 'response' in chunks of 'size' bytes and
+    yield them as decoded text. If the response has a read1() method, chunks
+    are yielded as soon as data has arrived, even if it's less than 'size'.
+    """
+    read = getattr(response, 'read1', response.read)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = read(size)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decode a JSON array given as an iterable of text chunks and
+    yield its elements as soon as they have been fully received, so that only
+    a single element needs to be kept in memory at a time.
+
+    >>> list(iter_json_array(['[{"a": 1}, {', '"b"', ': 2}, 3', '4]']))
+    [{'a': 1}, {'b': 2}, 34]
+    >>> list(iter_json_array(['  [ ]  ']))
+    []
+    >>> list(iter_json_array(['{"error": {}}']))
+    Traceback (most recent call last):
+        ...
+    ValueError: Expected JSON array, got '{' instead.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, pos, eof = '', 0, False
+    state = 'start'
+
+    while True:
+        pos = RE_WHITESPACE.match(buf, pos).end()
+        if pos >= len(buf) and not eof:
+            buf, pos = buf[pos:], 0
+            try:
+                buf += next(chunks)
+            except StopIteration:
+                eof = True
+            continue
+
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of JSON array.")
+
+        char = buf[pos]
+        if state == 'start':
+            if char != '[':
+                raise ValueError(
+                    "Expected JSON array, got {0!r} instead.".format(char)
+                )
+            pos += 1
+            state = 'first'
+        elif state == 'sep' or (state == 'first' and char == ']'):
+            if char == ']':
+                return
+            elif char != ',':
+                raise ValueError("Expected ',' or ']' at {0!r}.".format(char))
+            pos += 1
+            state = 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                end = None
+            # A number at the very end of the buffer might be truncated, so
+            # wait until there is more data to be sure it's complete.
+            if end is None or (end >= len(buf) and not eof):
+                buf, pos = buf[pos:], 0
+                try:
+                    buf += next(chunks)
+                except StopIteration:
+                    eof = True
+                continue
+            yield value
+            pos = end
+            state = 'sep'
@@ -0,0 +1,68 @@
+import time
+
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from hetzner.util import deadline
+
+__all__ = ['TaskResult', 'run_parallel']
+
+TaskResult = namedtuple('TaskResult', ['item', 'value', 'error', 'latency'])
+
+
+def _timed(func, item):
+    start = time.monotonic()
+    try:
+        value = func(item)
+    except Exception as err:
+        return TaskResult(item, None, err, time.monotonic() - start)
+    return TaskResult(item, value, None, time.monotonic() - start)
+
+
+def run_parallel(func, items, jobs=4, ordered=False):
+    """
+    Call 'func' for every element of 'items' using up to 'jobs' threads and
+    yield a TaskResult for each of them as soon as it's done. Exceptions
+    raised by 'func' are stored in the 'error' field of the result instead
+    of being propagated.
+
+    The deadline of the calling thread (see hetzner.util.deadline) applies
+    to the calls in the worker threads as well.
+
+    If 'ordered' is True, the results are yielded in the same order as
+    'items', otherwise in order of completion. Only a bounded number of
+    items is consumed ahead of time, so 'items' may be a lazy iterable.
+
+    >>> [r.value for r in run_parallel(lambda x: x * 2, range(5), 2, True)]
+    [0, 2, 4, 6, 8]
+    >>> [type(r.error) for r in run_parallel(lambda x: 1 // x, [0], 1)]
+    [<class 'ZeroDivisionError'>]
+    """
+    func = deadline.bind(func)
+    if jobs <= 1:
+        for item in items:
+            yield _timed(func, item)
+        return
+
+    items = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        def submit():
+            for item in items:
+                pending.append(executor.submit(_timed, func, item))
+                return True
+            return False
+
+        while len(pending) < jobs * 2 and submit():
+            pass
+
+        while len(pending) > 0:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                submit()
+                yield future.result()
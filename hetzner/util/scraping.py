@@ -3,6 +3,8 @@ try:
 except ImportError:
     from html.parser import HTMLParser
 
+from hetzner.util.jsonstream import iter_chunks
+
 
 class CSRFParser(HTMLParser):
     def __init__(self, field_name):
@@ -17,3 +19,226 @@ class CSRFParser(HTMLParser):
         if attrdict.get('name', '') == self.field_name:
             self.csrf_token = attrdict.get('value', None)
     handle_startendtag = handle_starttag
+
+
+# Elements which never have an end tag.
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                           'input', 'link', 'meta', 'param', 'source',
+                           'track', 'wbr'])
+
+
+def has_class(attrs, cls):
+    return cls in (dict(attrs).get('class') or '').split()
+
+
+class Field(object):
+    """
+    Base class for a value to be extracted by a StreamingExtractor. A field
+    is considered complete as soon as 'found' is True.
+    """
+    found = False
+    value = None
+
+    def start(self, tag, attrs):
+        pass
+
+    def end(self, tag):
+        pass
+
+    def data(self, text):
+        pass
+
+
+class InputValue(Field):
+    """
+    The value of the <input/> element with the given name, for example a
+    CSRF token.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def start(self, tag, attrs):
+        if tag == 'input' and dict(attrs).get('name') == self.name:
+            self.value = dict(attrs).get('value')
+            self.found = True
+
+
+class ClassPresent(Field):
+    """
+    Whether there is an element with the given class, like a message box.
+    """
+    value = False
+
+    def __init__(self, cls):
+        self.cls = cls
+
+    def start(self, tag, attrs):
+        if has_class(attrs, self.cls):
+            self.value = self.found = True
+
+
+class LabelledValue(Field):
+    """
+    The text of the first element with class 'value_class' after an element
+    with class 'label_class' whose text starts with 'label'.
+
+    The text of both elements is collected until their end tag, because the
+    parser may split it at any point where the document has been fed.
+    """
+    def __init__(self, label, label_class='label_req', value_class='element'):
+        self.label = label
+        self.label_class = label_class
+        self.value_class = value_class
+        self._state = None
+        self._depth = 0
+        self._text = []
+
+    def _enter(self, state):
+        self._state = state
+        self._depth = 0
+        self._text = []
+
+    def start(self, tag, attrs):
+        if self._state in ('label', 'value'):
+            pass
+        elif has_class(attrs, self.label_class):
+            self._enter('label')
+        elif self._state == 'labelled' and has_class(attrs, self.value_class):
+            self._enter('value')
+        else:
+            return
+        if tag not in VOID_ELEMENTS:
+            self._depth += 1
+
+    def end(self, tag):
+        if self._state not in ('label', 'value') or tag in VOID_ELEMENTS:
+            return
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        text = ''.join(self._text).strip()
+        if self._state == 'label':
+            self._state = 'labelled' if text.startswith(self.label) else None
+        else:
+            self.value = text or None
+            self.found = True
+            self._state = None
+
+    def data(self, text):
+        if self._state in ('label', 'value'):
+            self._text.append(text)
+
+
+class ListItems(Field):
+    """
+    The texts of all <li/> elements within the first <ul/> having the given
+    class, for example a list of errors.
+    """
+    def __init__(self, cls):
+        self.cls = cls
+        self._in_list = False
+        self._item = None
+
+    def start(self, tag, attrs):
+        if tag == 'ul' and has_class(attrs, self.cls):
+            self._in_list = True
+            self.value = []
+        elif self._in_list and tag == 'li':
+            self._item = []
+
+    def data(self, text):
+        if self._item is not None:
+            self._item.append(text)
+
+    def end(self, tag):
+        if not self._in_list:
+            return
+        if tag == 'li' and self._item is not None:
+            self.value.append(''.join(self._item).strip())
+            self._item = None
+        elif tag == 'ul':
+            self._in_list = False
+            self.found = True
+
+
+class StreamingExtractor(HTMLParser):
+    """
+    Extract several named fields in a single pass over an HTML document,
+    which is fed incrementally. Every keyword argument maps the name of a
+    field to a Field instance.
+
+    >>> extractor = StreamingExtractor(
+    ...     token=InputValue('_csrf_token'),
+    ...     login=LabelledValue('Login'),
+    ... )
+    >>> for chunk in ['<p class="label_req">Login', ':</p><div class="el',
+    ...               'ement">#ws+abc</div><input name="_csrf_token" ',
+    ...               'value="xyz"/><p>never looked at</p>']:
+    ...     if extractor.done:
+    ...         break
+    ...     extractor.feed(chunk)
+    >>> sorted(extractor.results.items())
+    [('login', '#ws+abc'), ('token', 'xyz')]
+    """
+    def __init__(self, **fields):
+        HTMLParser.__init__(self)
+        self.fields = fields
+
+    @property
+    def results(self):
+        return dict((name, field.value) for name, field in self.fields.items())
+
+    @property
+    def done(self):
+        """
+        Whether all fields have been found.
+        """
+        return all(field.found for field in self.fields.values())
+
+    def handle_starttag(self, tag, attrs):
+        for field in self.fields.values():
+            if not field.found:
+                field.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for field in self.fields.values():
+            if not field.found:
+                field.end(tag)
+
+    def handle_data(self, data):
+        for field in self.fields.values():
+            if not field.found:
+                field.data(data)
+
+    def extract(self, response, until=None, drain=True, chunk_size=8192):
+        """
+        Feed the body of the HTTP 'response' into the parser chunk by chunk
+        and stop reading as soon as all fields have been found or the
+        callable 'until', which gets this extractor as its argument, returns
+        True. Returns the dictionary of results.
+
+        If 'drain' is True, the remainder of the response is read and
+        discarded without parsing it, so that a keep-alive connection can be
+        reused. Otherwise the response is closed.
+        """
+        if until is None:
+            until = lambda extractor: extractor.done  # NOQA
+
+        for chunk in iter_chunks(response, chunk_size):
+            self.feed(chunk)
+            if until(self):
+                break
+        else:
+            self.close()
+            return self.results
+
+        if drain:
+            while response.read(chunk_size):
+                pass
+        else:
+            response.close()
+        return self.results
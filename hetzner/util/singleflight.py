@@ -0,0 +1,117 @@
+import copy
+import time
+import socket
+import threading
+
+from hetzner import DeadlineExceeded
+
+__all__ = ['SingleFlight']
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Collapse concurrent calls with the same key into a single call, whose
+    result is handed to all callers. Callers joining a call in progress get
+    a deep copy of the result, so they can't interfere with each other by
+    modifying it. Nothing is kept once the call has finished.
+
+    >>> flight = SingleFlight()
+    >>> flight.do('/server', lambda: [1, 2])
+    [1, 2]
+    >>> flight.stats['calls'], flight.stats['collapsed']
+    (1, 0)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {
+            'calls': 0,
+            'executions': 0,
+            'collapsed': 0,
+            'retries': 0,
+        }
+
+    def do(self, key, func, timeout=None):
+        """
+        Return the result of calling 'func' or wait for the result of a
+        call with the same 'key' which is already in progress. Exceptions
+        are raised in all waiting callers, except for the ones caused by the
+        calling thread's own context (see is_shared()), in which case the
+        waiting callers try again on their own. If waiting takes longer than
+        'timeout' seconds, socket.timeout is raised.
+        """
+        until = None if timeout is None else time.monotonic() + timeout
+        first = True
+        while True:
+            with self._lock:
+                if first:
+                    self.stats['calls'] += 1
+                else:
+                    self.stats['retries'] += 1
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    leader = True
+                    self.stats['executions'] += 1
+                else:
+                    call.waiters += 1
+                    leader = False
+                    if first:
+                        self.stats['collapsed'] += 1
+            first = False
+
+            if leader:
+                return self._lead(key, call, func)
+
+            left = None if until is None else max(until - time.monotonic(), 0)
+            if not call.done.wait(left):
+                raise socket.timeout("Timed out waiting for {0!r}."
+                                     .format(key))
+            if call.error is None:
+                return copy.deepcopy(call.value)
+            if self.is_shared(call.error):
+                raise call.error
+
+    def _lead(self, key, call, func):
+        value = None
+        try:
+            value = func()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            # Keep an untouched copy for the waiters, because our caller
+            # might modify the value as soon as we have returned it.
+            if call.waiters > 0 and call.error is None:
+                call.value = copy.deepcopy(value)
+            call.done.set()
+        return value
+
+    @staticmethod
+    def is_shared(err):
+        """
+        Whether the exception 'err' raised by a call is passed on to the
+        callers waiting for it. Timeouts and deadlines are specific to the
+        thread making the call, as are exceptions like KeyboardInterrupt, so
+        waiting callers with more time left retry instead.
+        """
+        if not isinstance(err, Exception):
+            return False
+        return not isinstance(err, (DeadlineExceeded, socket.timeout))
+
+    def in_flight(self):
+        """
+        Return the number of calls currently in progress.
+        """
+        with self._lock:
+            return len(self._calls)
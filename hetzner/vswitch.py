@@ -0,0 +1,318 @@
+import copy
+import time
+import logging
+
+from hetzner import RobotError
+from hetzner.model import Model
+from hetzner.util import deadline
+from hetzner.util.parallel import run_parallel
+
+__all__ = ['MembershipBatch', 'VSwitch', 'VSwitchManager']
+
+# Membership status of a server while it is being added to or removed from
+# a vSwitch, see VSwitchManager.wait().
+IN_PROCESS = 'in process'
+FAILED = 'failed'
+
+
+def server_id(server):
+    """
+    Return the value identifying 'server' in requests, which is either a
+    Server object, a server number or an IP address.
+
+    >>> server_id(321), server_id('1.2.3.4')
+    ('321', '1.2.3.4')
+    """
+    return str(getattr(server, 'ip', server))
+
+
+class VSwitch(Model):
+    def __init__(self, conn, result):
+        self.conn = conn
+        self.update_info(result)
+
+    def to_dict(self):
+        return copy.deepcopy(self._result)
+
+    def _restore(self, data):
+        self.update_info(data)
+
+    def update_info(self, result=None):
+        """
+        Update the information of the vSwitch either by sending a new GET
+        request or by using the response given by 'result'. The list of
+        vSwitches only contains the ID, name, VLAN and cancellation state,
+        so 'servers' and 'subnets' are None until this has been called
+        without 'result'.
+        """
+        if result is None:
+            result = self.conn.get('/vswitch/{0}'.format(self.id))
+        self._result = result
+        self.id = result['id']
+        self.name = result['name']
+        self.vlan = result['vlan']
+        self.cancelled = result['cancelled']
+        self.servers = result.get('server')
+        self.subnets = result.get('subnet')
+        self.cloud_networks = result.get('cloud_network')
+
+    def members(self):
+        """
+        Return a dictionary mapping the main IPs of the servers connected to
+        the vSwitch to their membership status.
+        """
+        if self.servers is None:
+            self.update_info()
+        return dict((server['server_ip'], server['status'])
+                    for server in self.servers)
+
+    def _matches(self, ident, member):
+        return ident in (member['server_ip'], member.get('server_ipv6_net'),
+                         str(member['server_number']))
+
+    def add_servers(self, servers):
+        """
+        Connect all 'servers' to the vSwitch with a single request.
+        """
+        idents = [server_id(server) for server in servers]
+        if len(idents) > 0:
+            self.conn.request('POST', '/vswitch/{0}/server'.format(self.id),
+                              {'server': idents}, allow_empty=True)
+            self.servers = None
+
+    def remove_servers(self, servers):
+        """
+        Disconnect all 'servers' from the vSwitch with a single request.
+        """
+        idents = [server_id(server) for server in servers]
+        if len(idents) > 0:
+            self.conn.request('DELETE', '/vswitch/{0}/server'.format(self.id),
+                              {'server': idents}, allow_empty=True)
+            self.servers = None
+
+    def set_servers(self, servers):
+        """
+        Make 'servers' the only servers connected to the vSwitch, using at
+        most one request for adding and one for removing servers. Returns a
+        tuple of the lists of added and removed server identifiers.
+        """
+        self.update_info()
+        current = self.servers
+        wanted = [server_id(server) for server in servers]
+        added = [ident for ident in wanted
+                 if not any(self._matches(ident, m) for m in current)]
+        removed = [m['server_ip'] for m in current
+                   if not any(self._matches(ident, m) for ident in wanted)]
+        self.remove_servers(removed)
+        self.add_servers(added)
+        return added, removed
+
+    def set(self, name=None, vlan=None):
+        """
+        Change the name and/or the VLAN ID of the vSwitch.
+        """
+        data = {'name': self.name if name is None else name,
+                'vlan': self.vlan if vlan is None else vlan}
+        self.conn.request('POST', '/vswitch/{0}'.format(self.id), data,
+                          allow_empty=True)
+        self.name, self.vlan = data['name'], data['vlan']
+
+    def cancel(self, date='now'):
+        """
+        Cancel the vSwitch at the given 'date' (YYYY-MM-DD or 'now').
+        """
+        self.conn.delete('/vswitch/{0}'.format(self.id),
+                         {'cancellation_date': date})
+
+    def __repr__(self):
+        return "<VSwitch {0} {1!r} (VLAN {2})>".format(
+            self.id, self.name, self.vlan
+        )
+
+
+class MembershipBatch(object):
+    """
+    Collect membership changes of vSwitches and apply them with as few
+    requests as possible: one for all servers to add and one for all
+    servers to remove per vSwitch, where adding and removing the same
+    server cancel each other out.
+
+    >>> batch = MembershipBatch(None)
+    >>> batch.add(1, ['1.0.0.1', '1.0.0.2']); batch.remove(1, ['1.0.0.2'])
+    >>> batch.remove(2, ['1.0.0.3'])
+    >>> batch.plan()
+    [(1, ['1.0.0.1'], []), (2, [], ['1.0.0.3'])]
+    """
+    def __init__(self, manager, max_servers=None):
+        self.manager = manager
+        self.max_servers = max_servers
+        self.errors = {}
+        self._changes = {}
+
+    def _change(self, vswitch, servers, member):
+        vswitch_id = getattr(vswitch, 'id', vswitch)
+        changes = self._changes.setdefault(vswitch_id, {})
+        for server in servers:
+            ident = server_id(server)
+            if changes.get(ident) == (not member):
+                del changes[ident]
+            else:
+                changes[ident] = member
+
+    def add(self, vswitch, servers):
+        self._change(vswitch, servers, True)
+
+    def remove(self, vswitch, servers):
+        self._change(vswitch, servers, False)
+
+    def plan(self):
+        """
+        Return a list of (vswitch id, servers to add, servers to remove)
+        tuples of all pending changes.
+        """
+        result = []
+        for vswitch_id, changes in sorted(self._changes.items()):
+            added = sorted(ident for ident, member in changes.items()
+                           if member)
+            removed = sorted(ident for ident, member in changes.items()
+                             if not member)
+            if added or removed:
+                result.append((vswitch_id, added, removed))
+        return result
+
+    def _chunks(self, idents):
+        size = self.max_servers or max(len(idents), 1)
+        return [idents[i:i + size] for i in range(0, len(idents), size)]
+
+    def apply(self, jobs=4):
+        """
+        Send all pending changes, with the changes of different vSwitches
+        being sent concurrently using up to 'jobs' threads. Returns the IDs
+        of the changed vSwitches.
+
+        Changes which couldn't be sent are kept pending, so apply() can be
+        called again to retry them, and the errors are stored in 'errors'
+        by vSwitch ID. If a single vSwitch has failed its error is raised,
+        otherwise a RobotError listing all of them.
+        """
+        plan = self.plan()
+        self._changes = {}
+        self.errors = {}
+        # The changes which haven't been sent yet, by vSwitch ID.
+        unsent = dict((vswitch_id, (added, removed))
+                      for vswitch_id, added, removed in plan)
+
+        def send(item):
+            vswitch_id, added, removed = item
+            vswitch = self.manager.get(vswitch_id, fetch=False)
+            for chunk in self._chunks(removed):
+                vswitch.remove_servers(chunk)
+                removed = removed[len(chunk):]
+                unsent[vswitch_id] = (added, removed)
+            for chunk in self._chunks(added):
+                vswitch.add_servers(chunk)
+                added = added[len(chunk):]
+                unsent[vswitch_id] = (added, removed)
+
+        for result in run_parallel(send, plan, jobs):
+            if result.error is not None:
+                vswitch_id = result.item[0]
+                self.errors[vswitch_id] = result.error
+                added, removed = unsent[vswitch_id]
+                self.remove(vswitch_id, removed)
+                self.add(vswitch_id, added)
+
+        if len(self.errors) == 1:
+            raise list(self.errors.values())[0]
+        elif len(self.errors) > 1:
+            raise RobotError("Membership changes failed for {0}.".format(
+                ", ".join("vSwitch {0} ({1})".format(vswitch_id, err)
+                          for vswitch_id, err in sorted(self.errors.items()))
+            ))
+        return [vswitch_id for vswitch_id, added, removed in plan]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.apply()
+
+
+class VSwitchManager(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.logger = logging.getLogger("vSwitch manager")
+
+    def __iter__(self):
+        return iter([VSwitch(self.conn, vswitch)
+                     for vswitch in self.conn.get('/vswitch')])
+
+    def get(self, vswitch_id, fetch=True):
+        """
+        Return the vSwitch with the given ID, without sending a request if
+        'fetch' is False.
+        """
+        if not fetch:
+            return VSwitch(self.conn, {'id': vswitch_id, 'name': None,
+                                       'vlan': None, 'cancelled': None})
+        return VSwitch(self.conn,
+                       self.conn.get('/vswitch/{0}'.format(vswitch_id)))
+
+    def create(self, name, vlan):
+        """
+        Create a new vSwitch with the given 'name' and VLAN ID.
+        """
+        data = {'name': name, 'vlan': vlan}
+        return VSwitch(self.conn, self.conn.post('/vswitch', data))
+
+    def batch(self, max_servers=None):
+        """
+        Return a MembershipBatch collecting membership changes, which can
+        be used as a context manager applying the changes on exit. If
+        'max_servers' is set, no request contains more servers than that.
+        """
+        return MembershipBatch(self, max_servers)
+
+    def statuses(self, vswitch_ids, jobs=4):
+        """
+        Fetch the membership status of the given vSwitches concurrently and
+        return a dictionary mapping their IDs to dictionaries mapping the
+        server IPs to their status.
+        """
+        result = {}
+        for item in run_parallel(lambda vid: self.get(vid).members(),
+                                 vswitch_ids, jobs):
+            if item.error is not None:
+                raise item.error
+            result[item.item] = item.value
+        return result
+
+    def wait(self, vswitch_ids, interval=5, timeout=None, jobs=4):
+        """
+        Poll the membership status of the given vSwitches concurrently every
+        'interval' seconds until no server is in process anymore and return
+        the last result of statuses(). Raises a RobotError if a change has
+        failed and DeadlineExceeded after 'timeout' seconds.
+        """
+        with deadline.deadline(timeout):
+            while True:
+                statuses = self.statuses(vswitch_ids, jobs)
+                failed = sorted(
+                    "{0} on vSwitch {1}".format(ip, vid)
+                    for vid, members in statuses.items()
+                    for ip, status in members.items() if status == FAILED
+                )
+                if failed:
+                    raise RobotError("Membership change failed for {0}."
+                                     .format(", ".join(failed)))
+                pending = sum(1 for members in statuses.values()
+                              for status in members.values()
+                              if status == IN_PROCESS)
+                if pending == 0:
+                    return statuses
+                self.logger.debug("Waiting for %d servers to be connected.",
+                                  pending)
+                left = deadline.check(what="Waiting for vSwitches")
+                time.sleep(interval if left is None else
+                           max(min(interval, left), 0))
@@ -0,0 +1,295 @@
+import time
+import logging
+import threading
+
+from collections import deque
+
+from hetzner import RateLimitError, RobotError
+from hetzner.collection import RESOURCES, fetch_all, item_key
+
+__all__ = ['Change', 'Added', 'Removed', 'FieldChanged',
+           'ServerStatusChanged', 'FailoverMoved', 'PtrChanged',
+           'IpLockChanged', 'diff', 'Watcher']
+
+
+class Change(object):
+    """
+    Base class of all change events, which refer to the item identified by
+    'key' (see hetzner.collection.RESOURCES) of the given 'resource'.
+    """
+    kind = None
+
+    def __init__(self, resource, key, old=None, new=None, field=None):
+        self.resource = resource
+        self.key = key
+        self.old = old
+        self.new = new
+        self.field = field
+
+    def to_dict(self):
+        return {'kind': self.kind, 'resource': self.resource,
+                'key': self.key, 'field': self.field,
+                'old': self.old, 'new': self.new}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+            self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __str__(self):
+        if self.field is None:
+            return "{0} {1} {2}".format(self.resource, self.key, self.kind)
+        return "{0} {1}: {2} changed from {3!r} to {4!r}".format(
+            self.resource, self.key, self.field, self.old, self.new
+        )
+
+    def __repr__(self):
+        return "<{0} {1}>".format(self.__class__.__name__, self)
+
+
+class Added(Change):
+    """
+    A new item appeared, 'new' holds its data.
+    """
+    kind = 'added'
+
+
+class Removed(Change):
+    """
+    An item is gone, 'old' holds its last known data.
+    """
+    kind = 'removed'
+
+
+class FieldChanged(Change):
+    """
+    The value of 'field' changed from 'old' to 'new'.
+    """
+    kind = 'changed'
+
+
+class ServerStatusChanged(FieldChanged):
+    kind = 'server_status'
+
+
+class FailoverMoved(FieldChanged):
+    kind = 'failover_moved'
+
+
+class PtrChanged(FieldChanged):
+    kind = 'ptr'
+
+
+class IpLockChanged(FieldChanged):
+    kind = 'ip_lock'
+
+    @property
+    def locked(self):
+        return bool(self.new)
+
+
+# Event types for changes of specific fields, all other fields result in a
+# plain FieldChanged event.
+FIELD_EVENTS = {
+    ('server', 'status'): ServerStatusChanged,
+    ('failover', 'active_server_ip'): FailoverMoved,
+    ('rdns', 'ptr'): PtrChanged,
+    ('ip', 'locked'): IpLockChanged,
+    ('subnet', 'locked'): IpLockChanged,
+}
+
+
+def diff(resource, old, new):
+    """
+    Compare two states of a collection, each being a dictionary mapping the
+    keys of the items to their (unwrapped) data, and return a list of
+    change events.
+
+    >>> old = {'9.9.9.9': {'ip': '9.9.9.9', 'active_server_ip': '1.0.0.1'}}
+    >>> new = {'9.9.9.9': {'ip': '9.9.9.9', 'active_server_ip': '1.0.0.2'},
+    ...        '9.9.9.8': {'ip': '9.9.9.8', 'active_server_ip': None}}
+    >>> for change in diff('failover', old, new):
+    ...     print(type(change).__name__, change.key, change.new)
+    Added 9.9.9.8 {'ip': '9.9.9.8', 'active_server_ip': None}
+    FailoverMoved 9.9.9.9 1.0.0.2
+    """
+    changes = []
+    for key in sorted(set(old) | set(new)):
+        if key not in old:
+            changes.append(Added(resource, key, new=new[key]))
+        elif key not in new:
+            changes.append(Removed(resource, key, old=old[key]))
+        else:
+            before, after = old[key], new[key]
+            for field in sorted(set(before) | set(after)):
+                if before.get(field) == after.get(field):
+                    continue
+                event = FIELD_EVENTS.get((resource, field), FieldChanged)
+                changes.append(event(resource, key, before.get(field),
+                                     after.get(field), field))
+    return changes
+
+
+class ResourceState(object):
+    """
+    Polling state of a single collection within a Watcher.
+    """
+    def __init__(self, interval, max_requests, window):
+        self.interval = interval
+        self.max_requests = max_requests
+        self.window = window
+        self.items = None
+        self.next_due = 0
+        self.requests = deque()
+
+    def remaining(self, now):
+        """
+        Return the number of requests left within the current window.
+        """
+        while self.requests and self.requests[0] <= now - self.window:
+            self.requests.popleft()
+        return self.max_requests - len(self.requests)
+
+    def budget_interval(self, now):
+        """
+        Return the minimum interval to the next request, which grows as the
+        remaining budget shrinks.
+        """
+        return float(self.window) / max(self.remaining(now), 1)
+
+
+class Watcher(object):
+    """
+    Periodically fetch the given collections (see hetzner.collection) using
+    the RobotConnection 'conn' and report differences to the previous state
+    as change events.
+
+    Every collection is polled at its own interval between 'min_interval'
+    and 'max_interval' seconds, which is halved whenever a change has been
+    detected and grows by half otherwise. The interval is never shorter than
+    what the remaining request budget of 'max_requests' per 'window' seconds
+    allows, which is adjusted whenever the Robot reports a rate limit.
+    """
+    def __init__(self, conn, resources=None, min_interval=10,
+                 max_interval=600, max_requests=200, window=3600):
+        if resources is None:
+            resources = ['failover', 'ip', 'rdns', 'server', 'subnet']
+        self.conn = conn
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.states = dict(
+            (resource, ResourceState(min_interval, max_requests, window))
+            for resource in resources
+        )
+        self.logger = logging.getLogger("Watcher")
+        self.stats = {
+            'polls': 0,
+            'requests': 0,
+            'changes': 0,
+            'errors': 0,
+            'rate_limited': 0,
+        }
+
+    def intervals(self):
+        """
+        Return a dictionary of the current polling interval per resource.
+        """
+        return dict((resource, state.interval)
+                    for resource, state in self.states.items())
+
+    def next_poll(self, now=None):
+        """
+        Return the number of seconds until the next collection is due.
+        """
+        if now is None:
+            now = time.monotonic()
+        due = min(state.next_due for state in self.states.values())
+        return max(0, due - now)
+
+    def _adapt(self, state, changed, now):
+        if changed:
+            interval = state.interval / 2.0
+        else:
+            interval = state.interval * 1.5
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        state.interval = max(interval, state.budget_interval(now))
+        state.next_due = now + state.interval
+
+    def _rate_limited(self, resource, state, err, now):
+        self.stats['rate_limited'] += 1
+        if err.max_request and err.interval:
+            state.max_requests = err.max_request
+            state.window = err.interval
+        state.interval = min(max(state.interval, state.budget_interval(now)),
+                             max(self.max_interval, err.retry_after))
+        state.next_due = now + max(err.retry_after, state.interval)
+        self.logger.warning("Rate limit exceeded for %s, next poll in %.1f"
+                            " seconds.", resource, state.next_due - now)
+
+    def poll(self, now=None, force=False):
+        """
+        Fetch all collections which are due (or all of them if 'force' is
+        True) concurrently and return a list of change events. The first
+        fetch of a collection only records its state without reporting any
+        changes.
+        """
+        if now is None:
+            now = time.monotonic()
+        due = sorted(resource for resource, state in self.states.items()
+                     if force or state.next_due <= now)
+        if len(due) == 0:
+            return []
+
+        self.stats['polls'] += 1
+        self.stats['requests'] += len(due)
+        for resource in due:
+            self.states[resource].requests.append(now)
+
+        results, errors = fetch_all(self.conn, due)
+
+        changes = []
+        for resource in due:
+            state = self.states[resource]
+            if resource in errors:
+                err = errors[resource]
+                if isinstance(err, RateLimitError):
+                    self._rate_limited(resource, state, err, now)
+                    continue
+                self.stats['errors'] += 1
+                self.logger.error("Unable to fetch %s: %s", resource, err)
+                if not isinstance(err, (RobotError, IOError)):
+                    raise err
+                state.next_due = now + state.interval
+                continue
+
+            wrapper = RESOURCES[resource][1]
+            items = dict((item_key(resource, item), item[wrapper])
+                         for item in results[resource])
+            if state.items is not None:
+                found = diff(resource, state.items, items)
+                changes.extend(found)
+            else:
+                found = []
+            state.items = items
+            self._adapt(state, len(found) > 0, now)
+
+        self.stats['changes'] += len(changes)
+        return changes
+
+    def watch(self, stop=None):
+        """
+        Poll the collections whenever they're due and yield the change
+        events until the threading.Event 'stop' is set or forever if it's
+        None.
+        """
+        if stop is None:
+            stop = threading.Event()
+        while not stop.is_set():
+            for change in self.poll():
+                yield change
+            stop.wait(self.next_poll())
+
+    def __iter__(self):
+        return self.watch()
@@ -7,17 +7,57 @@ from doctest import DocTestSuite
 
 PYTHON_MODULES = [
     'hetzner',
+    'hetzner.boot',
+    'hetzner.collection',
+    'hetzner.exporter',
     'hetzner.failover',
+    'hetzner.firewall',
+    'hetzner.inventory',
+    'hetzner.model',
+    'hetzner.multi',
+    'hetzner.provision',
     'hetzner.rdns',
     'hetzner.reset',
     'hetzner.robot',
     'hetzner.server',
+    'hetzner.snapshot',
+    'hetzner.vswitch',
+    'hetzner.watch',
     'hetzner.util',
     'hetzner.util.addr',
+    'hetzner.util.circuit',
+    'hetzner.util.compression',
+    'hetzner.util.control',
+    'hetzner.util.deadline',
+    'hetzner.util.health',
+    'hetzner.util.hedge',
     'hetzner.util.http',
+    'hetzner.util.jsonstream',
+    'hetzner.util.parallel',
     'hetzner.util.scraping',
+    'hetzner.util.singleflight',
     'hetzner.tests',
+    'hetzner.tests.test_exporter',
+    'hetzner.tests.test_failover',
+    'hetzner.tests.test_firewall',
+    'hetzner.tests.test_hetznerctl',
+    'hetzner.tests.test_inventory',
+    'hetzner.tests.test_model',
+    'hetzner.tests.test_multi',
+    'hetzner.tests.test_provision',
+    'hetzner.tests.test_rdns',
+    'hetzner.tests.test_snapshot',
+    'hetzner.tests.test_startup',
     'hetzner.tests.test_util_addr',
+    'hetzner.tests.test_util_circuit',
+    'hetzner.tests.test_util_compression',
+    'hetzner.tests.test_util_deadline',
+    'hetzner.tests.test_util_hedge',
+    'hetzner.tests.test_util_scraping',
+    'hetzner.tests.test_util_singleflight',
+    'hetzner.tests.test_vswitch',
+    'hetzner.tests.test_watch',
+    'hetzner.tests.test_webinterface',
 ]
 
 